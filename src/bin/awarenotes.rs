@@ -8,19 +8,40 @@ mod macos_app {
     use std::path::{Path, PathBuf};
     use std::process::Command;
     use std::sync::Arc;
+    use std::time::Duration;
     use tao::event::{Event, StartCause};
     use tao::event_loop::{ControlFlow, EventLoopBuilder, EventLoopProxy};
     use tao::platform::macos::{ActivationPolicy, EventLoopExtMacOS};
-    use tracing_subscriber::{layer::SubscriberExt, util::SubscriberInitExt};
     use tray_icon::menu::{Menu, MenuEvent, MenuId, MenuItem, PredefinedMenuItem};
     use tray_icon::{Icon, TrayIconBuilder, TrayIconEvent};
 
+    /// 退出时等待后台服务处理完进行中请求的上限
+    const BACKEND_SHUTDOWN_TIMEOUT: Duration = Duration::from_secs(5);
+
     #[derive(Clone, Debug)]
     enum UserEvent {
         Menu(MenuId),
         Tray,
     }
 
+    /// 后台 HTTP 服务线程的句柄，退出菜单栏应用时用来通知服务器优雅关闭
+    struct BackendHandle {
+        shutdown: tokio::sync::oneshot::Sender<()>,
+        finished: std::sync::mpsc::Receiver<()>,
+    }
+
+    impl BackendHandle {
+        /// 通知服务器停止接受新连接，并最多等待 `timeout` 让进行中的请求完成
+        fn stop(self, timeout: Duration) {
+            let _ = self.shutdown.send(());
+            if let Err(std::sync::mpsc::RecvTimeoutError::Timeout) =
+                self.finished.recv_timeout(timeout)
+            {
+                tracing::warn!("backend did not shut down within {:?}", timeout);
+            }
+        }
+    }
+
     struct RuntimePaths {
         config_path: PathBuf,
         data_dir: PathBuf,
@@ -28,7 +49,7 @@ mod macos_app {
     }
 
     pub fn run() {
-        init_tracing();
+        let _log_guard = init_tracing();
 
         let runtime_paths = match prepare_runtime_paths() {
             Ok(paths) => paths,
@@ -47,7 +68,7 @@ mod macos_app {
             }
         };
 
-        start_backend(listener, config.clone());
+        let mut backend = start_backend(listener, config.clone());
 
         let mut event_loop = EventLoopBuilder::<UserEvent>::with_user_event().build();
         event_loop.set_activation_policy(ActivationPolicy::Accessory);
@@ -92,29 +113,31 @@ mod macos_app {
                         let _ = open_settings_helper(&settings_helper, &web_url);
                     } else if id == quit_id {
                         terminate_settings_helper();
+                        if let Some(backend) = backend.take() {
+                            backend.stop(BACKEND_SHUTDOWN_TIMEOUT);
+                        }
                         *control_flow = ControlFlow::Exit;
                     }
                 }
                 Event::UserEvent(UserEvent::Tray) => {}
                 Event::LoopDestroyed => {
                     terminate_settings_helper();
+                    if let Some(backend) = backend.take() {
+                        backend.stop(BACKEND_SHUTDOWN_TIMEOUT);
+                    }
                     drop(tray_icon.take());
+                    // 事件循环不会返回，守卫来不及析构，这里手动写完排队日志
+                    auxm::logging::flush();
                 }
                 _ => {}
             }
         });
     }
 
-    fn init_tracing() {
+    fn init_tracing() -> auxm::logging::LogGuard {
         let log_level = std::env::var("RUST_LOG").unwrap_or_else(|_| "info".to_string());
         let log_filter = format!("{},sqlx=off", log_level);
-        let env_filter = tracing_subscriber::EnvFilter::new(log_filter);
-        let fmt_layer = tracing_subscriber::fmt::layer();
-
-        tracing_subscriber::registry()
-            .with(env_filter)
-            .with(fmt_layer)
-            .init();
+        auxm::logging::init_tracing(&log_filter)
     }
 
     fn prepare_runtime_paths() -> Result<RuntimePaths, String> {
@@ -169,10 +192,14 @@ mod macos_app {
         Ok((listener, addr, probe_addr))
     }
 
-    fn start_backend(listener: StdTcpListener, config: Config) {
-        if let Err(err) = std::thread::Builder::new()
+    fn start_backend(listener: StdTcpListener, config: Config) -> Option<BackendHandle> {
+        let (shutdown, shutdown_rx) = tokio::sync::oneshot::channel::<()>();
+        let (finished_tx, finished) = std::sync::mpsc::channel::<()>();
+        match std::thread::Builder::new()
             .name("awarenotes-backend".to_string())
             .spawn(move || {
+                // 线程结束（包括提前返回）时 finished_tx 被 drop，等待方随即返回
+                let _finished_tx = finished_tx;
                 let runtime = match tokio::runtime::Builder::new_multi_thread()
                     .enable_all()
                     .build()
@@ -216,13 +243,21 @@ mod macos_app {
                         asset_cache,
                     };
                     let app = routes::create_router(state, &config);
-                    if let Err(err) = axum::serve(listener, app).await {
+                    if let Err(err) = axum::serve(listener, app)
+                        .with_graceful_shutdown(async move {
+                            let _ = shutdown_rx.await;
+                        })
+                        .await
+                    {
                         tracing::error!("backend server exited with error: {}", err);
                     }
                 });
-            })
-        {
-            tracing::error!("failed to spawn backend thread: {}", err);
+            }) {
+            Ok(_) => Some(BackendHandle { shutdown, finished }),
+            Err(err) => {
+                tracing::error!("failed to spawn backend thread: {}", err);
+                None
+            }
         }
     }
 
@@ -1,7 +1,19 @@
 use serde::{Deserialize, Serialize};
 use std::env;
 use std::fs;
-use std::path::Path;
+use std::path::{Path, PathBuf};
+use std::sync::Mutex;
+use std::time::SystemTime;
+
+/// 最近一次解析的配置文件，按路径、mtime 与大小判断是否失效
+static CONFIG_CACHE: Mutex<Option<CachedConfig>> = Mutex::new(None);
+
+struct CachedConfig {
+    path: PathBuf,
+    modified: SystemTime,
+    len: u64,
+    config: Config,
+}
 
 #[derive(Debug, Clone, Deserialize, Serialize)]
 pub struct Config {
@@ -23,6 +35,38 @@ impl Config {
         config
     }
 
+    /// 带缓存的加载：配置文件未变化时直接复用上次的解析结果
+    pub fn load_cached<P: AsRef<Path>>(path: P) -> Self {
+        let path = path.as_ref();
+        let Ok((modified, len)) =
+            fs::metadata(path).and_then(|meta| Ok((meta.modified()?, meta.len())))
+        else {
+            return Self::load(path);
+        };
+
+        let mut cache = match CONFIG_CACHE.lock() {
+            Ok(guard) => guard,
+            Err(err) => {
+                tracing::warn!("config cache lock poisoned, using inner value: {}", err);
+                err.into_inner()
+            }
+        };
+        if let Some(cached) = cache.as_ref().filter(|cached| {
+            cached.path == path && cached.modified == modified && cached.len == len
+        }) {
+            return cached.config.clone();
+        }
+
+        let config = Self::load(path);
+        *cache = Some(CachedConfig {
+            path: path.to_path_buf(),
+            modified,
+            len,
+            config: config.clone(),
+        });
+        config
+    }
+
     pub fn from_env() -> Self {
         Self {
             app_name: env::var("APP_NAME").unwrap_or_else(|_| "Auxm API".to_string()),
@@ -92,7 +136,9 @@ impl Config {
         };
         let content = toml::to_string_pretty(&config_file)
             .map_err(|err| std::io::Error::other(err.to_string()))?;
-        fs::write(path, content)
+        fs::write(path, content)?;
+        invalidate_config_cache();
+        Ok(())
     }
 
     fn apply_env_overrides(&mut self) {
@@ -135,6 +181,13 @@ impl Default for Config {
     }
 }
 
+fn invalidate_config_cache() {
+    match CONFIG_CACHE.lock() {
+        Ok(mut guard) => *guard = None,
+        Err(err) => *err.into_inner() = None,
+    }
+}
+
 #[derive(Debug, Clone, Deserialize, Serialize)]
 pub struct ScannerConfig {
     pub scan_paths: Vec<String>,
@@ -146,10 +199,8 @@ impl ScannerConfig {
     pub fn validate_scan_paths(&mut self) {
         use std::path::Path;
 
-        self.scan_paths.retain(|path| {
-            let p = Path::new(path);
-            p.exists() && p.is_dir()
-        });
+        // is_dir 对不存在的路径返回 false，一次 stat 即可
+        self.scan_paths.retain(|path| Path::new(path).is_dir());
 
         let mut to_remove = Vec::new();
 
@@ -310,6 +361,21 @@ mod tests {
         Ok(())
     }
 
+    #[test]
+    fn test_load_cached_sees_saved_changes() -> Result<(), Box<dyn std::error::Error>> {
+        let temp_dir = tempfile::tempdir()?;
+        let path = temp_dir.path().join("app_config.toml");
+
+        let mut config = Config::default();
+        config.save_to_file(&path)?;
+        assert_eq!(Config::load_cached(&path).cache.cover_width, 480);
+
+        config.cache.cover_width = 960;
+        config.save_to_file(&path)?;
+        assert_eq!(Config::load_cached(&path).cache.cover_width, 960);
+        Ok(())
+    }
+
     #[test]
     fn test_validate_scan_paths_multiple_valid() -> Result<(), Box<dyn std::error::Error>> {
         let temp_dir1 = tempfile::tempdir()?;
@@ -8,6 +8,7 @@ pub mod book_files;
 pub mod categories;
 pub mod libraries;
 
+use sea_orm::{DbErr, FromQueryResult, QueryResult};
 use serde::{Deserialize, Serialize};
 
 // ============== Library DTOs ==============
@@ -109,6 +110,74 @@ pub struct BookFileResponse {
     pub pages_json: Option<String>,
 }
 
+/// 书籍列表项：列表接口只需要的列，不含 `pages_json` 等大字段
+#[derive(Debug, Clone)]
+pub struct BookListItem {
+    pub id: i64,
+    pub path: String,
+    pub title: Option<String>,
+    pub kind: String,
+    pub size: i64,
+    pub mtime: i64,
+    pub page_count: i64,
+    pub is_favorite: bool,
+    pub cover_path: Option<String>,
+    pub created_at: Option<String>,
+    /// 图片文件夹的内容签名（16 位十六进制）；页图原地覆盖时目录 mtime 不变，靠它区分封面版本
+    pub content_signature: Option<String>,
+}
+
+/// 按列位置直接取值，不再逐列按列名查找
+///
+/// 查询必须按 `id, path, title, kind, size, mtime, page_count, is_favorite, cover_path,
+/// created_at, content_signature` 的顺序选列（见 `DatabaseService` 中的列表查询）。
+impl FromQueryResult for BookListItem {
+    fn from_query_result(row: &QueryResult, _pre: &str) -> Result<Self, DbErr> {
+        Ok(Self {
+            id: row.try_get_by_index(0)?,
+            path: row.try_get_by_index(1)?,
+            title: row.try_get_by_index(2)?,
+            kind: row.try_get_by_index(3)?,
+            size: row.try_get_by_index(4)?,
+            mtime: row.try_get_by_index(5)?,
+            page_count: row.try_get_by_index(6)?,
+            is_favorite: row.try_get_by_index(7)?,
+            cover_path: row.try_get_by_index(8)?,
+            created_at: row.try_get_by_index(9)?,
+            content_signature: row.try_get_by_index(10)?,
+        })
+    }
+}
+
+/// 读取单页图片所需的书籍字段；`page_path` 由 SQLite 从 `pages_json` 中直接取出
+#[derive(Debug, Clone)]
+pub struct BookPageSource {
+    pub path: String,
+    pub is_oversized: bool,
+    pub page_path: Option<String>,
+}
+
+/// 每次翻页都会执行，同样按列位置取值（列顺序见 `DatabaseService::get_book_page`）
+impl FromQueryResult for BookPageSource {
+    fn from_query_result(row: &QueryResult, _pre: &str) -> Result<Self, DbErr> {
+        Ok(Self {
+            path: row.try_get_by_index(0)?,
+            is_oversized: row.try_get_by_index(1)?,
+            page_path: row.try_get_by_index(2)?,
+        })
+    }
+}
+
+/// 封面预生成所需的书籍字段
+#[derive(Debug, Clone)]
+pub struct BookCoverSource {
+    pub path: String,
+    pub title: Option<String>,
+    pub kind: String,
+    /// 图片书的封面原图（`cover_path`，否则为第一页）；PDF 为 None
+    pub cover_image_path: Option<String>,
+}
+
 // ============== Book DTOs ==============
 
 /// 创建 Book 请求
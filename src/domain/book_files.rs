@@ -112,3 +112,58 @@ impl Related<super::categories::Entity> for Entity {
 }
 
 impl ActiveModelBehavior for ActiveModel {}
+
+impl Model {
+    /// 取出 `pages_json` 中第 `index` 页的路径
+    pub fn page_path(&self, index: usize) -> serde_json::Result<Option<String>> {
+        page_path_in(self.pages_json.as_deref(), index)
+    }
+}
+
+/// 从页列表 JSON 中取出第 `index` 页的路径
+///
+/// 图片书的页列表可能有上千项，而单页请求只需要其中一项：其余元素以
+/// `IgnoredAny` 跳过，不为整本书分配 `Vec<String>`。
+pub fn page_path_in(pages_json: Option<&str>, index: usize) -> serde_json::Result<Option<String>> {
+    use serde::de::{DeserializeSeed, IgnoredAny, SeqAccess, Visitor};
+
+    struct NthPage(usize);
+
+    impl<'de> DeserializeSeed<'de> for NthPage {
+        type Value = Option<String>;
+
+        fn deserialize<D>(self, deserializer: D) -> Result<Self::Value, D::Error>
+        where
+            D: serde::Deserializer<'de>,
+        {
+            deserializer.deserialize_seq(self)
+        }
+    }
+
+    impl<'de> Visitor<'de> for NthPage {
+        type Value = Option<String>;
+
+        fn expecting(&self, formatter: &mut std::fmt::Formatter) -> std::fmt::Result {
+            formatter.write_str("an array of page paths")
+        }
+
+        fn visit_seq<A>(self, mut seq: A) -> Result<Self::Value, A::Error>
+        where
+            A: SeqAccess<'de>,
+        {
+            for _ in 0..self.0 {
+                if seq.next_element::<IgnoredAny>()?.is_none() {
+                    return Ok(None);
+                }
+            }
+            let page = seq.next_element::<String>()?;
+            while seq.next_element::<IgnoredAny>()?.is_some() {}
+            Ok(page)
+        }
+    }
+
+    let mut deserializer = serde_json::Deserializer::from_str(pages_json.unwrap_or("[]"));
+    let page = NthPage(index).deserialize(&mut deserializer)?;
+    deserializer.end()?;
+    Ok(page)
+}
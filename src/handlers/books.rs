@@ -5,7 +5,7 @@
 use axum::{
     body::Body,
     extract::{Path, Query, State},
-    http::{header, HeaderValue, Request, Response, StatusCode},
+    http::{header, HeaderMap, HeaderName, HeaderValue, Request, Response, StatusCode},
     response::Json,
 };
 use serde::{Deserialize, Serialize};
@@ -13,16 +13,39 @@ use std::process::Command;
 use tower::ServiceExt;
 use tower_http::services::ServeFile;
 
-use crate::domain::book_files;
+use crate::domain::{book_files, BookListItem};
 use crate::service::assets::PdfPageSvgAsset;
+use crate::service::database::BookCursor;
 use crate::{AppError, AppState};
 
+/// 封面、页面图片等文件响应的缓存策略：过期后浏览器带 If-Modified-Since 协商，未变化时返回 304
+const ASSET_CACHE_CONTROL: &str = "public, max-age=3600";
+
+/// 带版本参数 `v` 的资源 URL 内容不会变（书籍更新后 URL 随之改变），浏览器缓存期内不再发请求
+const VERSIONED_ASSET_CACHE_CONTROL: &str = "public, max-age=604800, immutable";
+
+/// 转交给 `ServeFile` 的请求头：条件请求与 Range
+const FORWARDED_FILE_HEADERS: [HeaderName; 4] = [
+    header::IF_MODIFIED_SINCE,
+    header::IF_UNMODIFIED_SINCE,
+    header::RANGE,
+    header::IF_RANGE,
+];
+
 #[derive(Deserialize)]
 pub struct ListQuery {
     pub page: Option<usize>,
     pub page_size: Option<usize>,
     pub sort: Option<String>,
     pub all: Option<bool>,
+    /// 键集分页游标：传入上一页响应里的 `next_cursor`（空字符串表示第一页），不传则按 `page` 偏移分页
+    pub cursor: Option<String>,
+}
+
+#[derive(Deserialize)]
+pub struct CoverQuery {
+    /// 资源版本（前端传书籍列表项里的 `cover_version`）；与当前版本一致时才按不可变资源缓存
+    pub v: Option<String>,
 }
 
 #[derive(Deserialize)]
@@ -30,32 +53,109 @@ pub struct PageQuery {
     pub realsize: Option<bool>,
 }
 
-#[derive(Serialize, Clone)]
+/// 书籍列表项的响应
+///
+/// 直接包装数据库读出的 `BookListItem`，序列化时按前端需要的字段名写出：
+/// 不再逐行构造中间结构体，`id` 也直接格式化进输出，不为每行分配字符串。
+///
+/// `cover_version` 由书籍 mtime、内容签名与封面宽度组成，前端拼进封面 URL：书籍变化或封面宽度
+/// 调整后 URL 随之改变，浏览器不会继续使用旧封面。
+#[derive(Clone)]
 pub struct BookResponse {
-    pub id: String,
-    pub path: String,
-    pub title: Option<String>,
-    pub kind: String,
-    #[serde(rename = "type")]
-    pub book_type: String,
-    pub size: i64,
+    pub book: BookListItem,
+    pub cover_width: u32,
+}
+
+impl Serialize for BookResponse {
+    fn serialize<S: serde::Serializer>(&self, serializer: S) -> Result<S::Ok, S::Error> {
+        use serde::ser::SerializeStruct;
+
+        let book = &self.book;
+        let mut state = serializer.serialize_struct("BookResponse", 12)?;
+        state.serialize_field("id", &DisplayString(book.id))?;
+        state.serialize_field("path", &book.path)?;
+        state.serialize_field("title", &book.title)?;
+        state.serialize_field("kind", &book.kind)?;
+        state.serialize_field("type", frontend_book_type(&book.kind))?;
+        state.serialize_field("size", &book.size)?;
+        state.serialize_field("mtime", &book.mtime)?;
+        state.serialize_field("page_count", &book.page_count)?;
+        state.serialize_field("is_favorite", &book.is_favorite)?;
+        state.serialize_field("cover_path", &book.cover_path)?;
+        state.serialize_field("created_at", &book.created_at)?;
+        state.serialize_field(
+            "cover_version",
+            &DisplayString(CoverVersion {
+                mtime: book.mtime,
+                content_signature: book.content_signature.as_deref(),
+                cover_width: self.cover_width,
+            }),
+        )?;
+        state.end()
+    }
+}
+
+/// 封面 URL 的版本号：`{mtime}-{content_signature}-w{cover_width}`（无签名时省略中间一段）
+///
+/// 图片文件夹的 mtime 是目录的 mtime，原地覆盖某张图片不会改变它；内容签名覆盖每张图片的
+/// mtime 与大小，封面换了版本号一定跟着变。
+pub struct CoverVersion<'a> {
     pub mtime: i64,
-    pub page_count: i64,
-    pub is_favorite: bool,
-    pub cover_path: Option<String>,
-    pub created_at: Option<String>,
+    pub content_signature: Option<&'a str>,
+    pub cover_width: u32,
 }
 
-#[derive(Serialize)]
+impl std::fmt::Display for CoverVersion<'_> {
+    fn fmt(&self, f: &mut std::fmt::Formatter<'_>) -> std::fmt::Result {
+        write!(f, "{}-", self.mtime)?;
+        if let Some(signature) = self.content_signature {
+            write!(f, "{signature}-")?;
+        }
+        write!(f, "w{}", self.cover_width)
+    }
+}
+
+/// 以 `Display` 结果序列化为 JSON 字符串，不经过中间 `String`
+struct DisplayString<T>(T);
+
+impl<T: std::fmt::Display> Serialize for DisplayString<T> {
+    fn serialize<S: serde::Serializer>(&self, serializer: S) -> Result<S::Ok, S::Error> {
+        serializer.collect_str(&self.0)
+    }
+}
+
+/// 书籍列表响应
+///
+/// JSON 中 `items` 与 `data` 内容相同（兼容旧前端），序列化时由同一个 Vec 写出两次，
+/// 不再为 `data` 复制整份列表。
 pub struct BooksResponse {
     pub success: bool,
     pub message: String,
     pub items: Vec<BookResponse>,
-    pub data: Vec<BookResponse>,
     pub page: usize,
     pub page_size: usize,
     pub total: usize,
     pub total_pages: usize,
+    /// 键集分页时下一页的游标；已到末尾或使用偏移分页时为 `None`
+    pub next_cursor: Option<String>,
+}
+
+impl Serialize for BooksResponse {
+    fn serialize<S: serde::Serializer>(&self, serializer: S) -> Result<S::Ok, S::Error> {
+        use serde::ser::SerializeStruct;
+
+        let mut state = serializer.serialize_struct("BooksResponse", 9)?;
+        state.serialize_field("success", &self.success)?;
+        state.serialize_field("message", &self.message)?;
+        state.serialize_field("items", &self.items)?;
+        state.serialize_field("data", &self.items)?;
+        state.serialize_field("page", &self.page)?;
+        state.serialize_field("page_size", &self.page_size)?;
+        state.serialize_field("total", &self.total)?;
+        state.serialize_field("total_pages", &self.total_pages)?;
+        state.serialize_field("next_cursor", &self.next_cursor)?;
+        state.end()
+    }
 }
 
 #[derive(Serialize)]
@@ -64,7 +164,7 @@ pub struct BookDetailResponse {
     pub title: String,
     pub path: String,
     #[serde(rename = "type")]
-    pub book_type: String,
+    pub book_type: &'static str,
     pub page_count: i64,
     pub is_favorite: bool,
     pub description: Option<String>,
@@ -78,6 +178,18 @@ pub struct FavoriteMutationResponse {
     pub success: bool,
 }
 
+#[derive(Deserialize)]
+pub struct BatchFavoriteRequest {
+    pub book_ids: Vec<i64>,
+    pub is_favorite: bool,
+}
+
+#[derive(Serialize)]
+pub struct BatchFavoriteResponse {
+    pub success: bool,
+    pub updated: u64,
+}
+
 #[derive(Serialize)]
 pub struct LocalActionResponse {
     pub success: bool,
@@ -88,38 +200,92 @@ pub async fn list_books(
     Query(query): Query<ListQuery>,
 ) -> Result<Json<BooksResponse>, AppError> {
     let sort_desc = query.sort.as_deref() != Some("created_at_asc");
+    let cover_width = state.asset_cache.config().cover_width;
     if query.all.unwrap_or(false) {
         let books = state.db_service.list_all_books(sort_desc).await?;
         let total = books.len();
-        return Ok(Json(build_books_response(books, total, 1, total.max(1))));
+        return Ok(Json(build_books_response(
+            books,
+            total,
+            1,
+            total.max(1),
+            cover_width,
+        )));
     }
 
     let page = query.page.unwrap_or(1).max(1);
     let page_size = query.page_size.unwrap_or(10).clamp(1, 100);
+    if let Some(cursor) = query.cursor.as_deref() {
+        let after = parse_cursor(cursor)?;
+        let (books, total) = state
+            .db_service
+            .list_books_after(after.as_ref(), page_size, sort_desc)
+            .await?;
+        return Ok(Json(build_cursor_books_response(
+            books,
+            total,
+            page,
+            page_size,
+            cover_width,
+        )));
+    }
     let (books, total) = state
         .db_service
         .list_books(page, page_size, sort_desc)
         .await?;
-    Ok(Json(build_books_response(books, total, page, page_size)))
+    Ok(Json(build_books_response(
+        books,
+        total,
+        page,
+        page_size,
+        cover_width,
+    )))
 }
 
 pub async fn list_favorite_books(
     State(state): State<AppState>,
     Query(query): Query<ListQuery>,
 ) -> Result<Json<BooksResponse>, AppError> {
+    let cover_width = state.asset_cache.config().cover_width;
     if query.all.unwrap_or(false) {
         let books = state.db_service.list_all_favorite_books().await?;
         let total = books.len();
-        return Ok(Json(build_books_response(books, total, 1, total.max(1))));
+        return Ok(Json(build_books_response(
+            books,
+            total,
+            1,
+            total.max(1),
+            cover_width,
+        )));
     }
 
     let page = query.page.unwrap_or(1).max(1);
     let page_size = query.page_size.unwrap_or(100).clamp(1, 200);
+    if let Some(cursor) = query.cursor.as_deref() {
+        let after = parse_cursor(cursor)?;
+        let (books, total) = state
+            .db_service
+            .list_favorite_books_after(after.as_ref(), page_size)
+            .await?;
+        return Ok(Json(build_cursor_books_response(
+            books,
+            total,
+            page,
+            page_size,
+            cover_width,
+        )));
+    }
     let (books, total) = state
         .db_service
         .list_favorite_books(page, page_size)
         .await?;
-    Ok(Json(build_books_response(books, total, page, page_size)))
+    Ok(Json(build_books_response(
+        books,
+        total,
+        page,
+        page_size,
+        cover_width,
+    )))
 }
 
 pub async fn get_book(
@@ -156,21 +322,36 @@ pub async fn unfavorite_book(
     Ok(Json(FavoriteMutationResponse { success: true }))
 }
 
+pub async fn set_books_favorite(
+    State(state): State<AppState>,
+    Json(payload): Json<BatchFavoriteRequest>,
+) -> Result<Json<BatchFavoriteResponse>, AppError> {
+    let updated = state
+        .db_service
+        .set_books_favorite(&payload.book_ids, payload.is_favorite)
+        .await?;
+    Ok(Json(BatchFavoriteResponse {
+        success: true,
+        updated,
+    }))
+}
+
 pub async fn reveal_book_in_finder(
     State(state): State<AppState>,
     Path(book_id): Path<i64>,
 ) -> Result<Json<LocalActionResponse>, AppError> {
-    let book = state
+    let book_path = state
         .db_service
-        .get_book(book_id)
+        .get_book_path(book_id)
         .await?
         .ok_or_else(|| AppError::NotFound(format!("book {book_id}")))?;
 
-    let status = Command::new("open")
-        .arg("-R")
-        .arg(&book.path)
-        .status()
-        .map_err(|err| AppError::InternalServerError(format!("failed to open finder: {err}")))?;
+    let status = tokio::task::spawn_blocking(move || {
+        Command::new("open").arg("-R").arg(&book_path).status()
+    })
+    .await
+    .map_err(|err| AppError::InternalServerError(err.to_string()))?
+    .map_err(|err| AppError::InternalServerError(format!("failed to open finder: {err}")))?;
 
     if !status.success() {
         return Err(AppError::InternalServerError(
@@ -184,19 +365,34 @@ pub async fn reveal_book_in_finder(
 pub async fn book_cover(
     State(state): State<AppState>,
     Path(book_id): Path<i64>,
+    Query(query): Query<CoverQuery>,
+    headers: HeaderMap,
 ) -> Result<Response<Body>, AppError> {
     let book = state
         .db_service
         .get_book(book_id)
         .await?
         .ok_or_else(|| AppError::NotFound(format!("book {book_id}")))?;
+    let cover_width = state.asset_cache.config().cover_width;
+    // 只有与当前封面版本一致的 URL 才按不可变资源缓存；旧版本或缺省时用普通策略
+    let current_version = CoverVersion {
+        mtime: book.mtime,
+        content_signature: book.content_signature.as_deref(),
+        cover_width,
+    }
+    .to_string();
+    let cache_control = if query.v.as_deref() == Some(current_version.as_str()) {
+        VERSIONED_ASSET_CACHE_CONTROL
+    } else {
+        ASSET_CACHE_CONTROL
+    };
 
     if book.kind == "pdf" {
         let cached = state
             .asset_cache
-            .get_or_create_pdf_cover(&book.path)
+            .get_or_create_pdf_cover(&book.path, cover_width)
             .await?;
-        return file_response(&cached).await;
+        return file_response(&cached, &headers, cache_control).await;
     }
 
     let source_cover_path = book
@@ -206,63 +402,100 @@ pub async fn book_cover(
         .ok_or_else(|| AppError::NotFound("cover not found".to_string()))?;
     let cached = state
         .asset_cache
-        .get_or_create_image_cover(&book.path, &source_cover_path)
+        .get_or_create_image_cover(&book.path, &source_cover_path, cover_width)
         .await?;
-    file_response(&cached).await
+    file_response(&cached, &headers, cache_control).await
 }
 
 pub async fn image_book_page(
     State(state): State<AppState>,
     Path((book_id, page)): Path<(i64, usize)>,
     Query(query): Query<PageQuery>,
+    headers: HeaderMap,
 ) -> Result<Response<Body>, AppError> {
     let book = state
         .db_service
-        .get_book(book_id)
+        .get_book_page(book_id, page.saturating_sub(1))
         .await?
         .ok_or_else(|| AppError::NotFound(format!("book {book_id}")))?;
-    let pages = page_paths(&book)?;
-    let page_path = pages
-        .get(page.saturating_sub(1))
+    let page_path = book
+        .page_path
         .ok_or_else(|| AppError::NotFound(format!("page {page}")))?;
     if query.realsize.unwrap_or(false) || !book.is_oversized {
-        return file_response(std::path::Path::new(page_path)).await;
+        return file_response(
+            std::path::Path::new(&page_path),
+            &headers,
+            ASSET_CACHE_CONTROL,
+        )
+        .await;
     }
     let cached = state
         .asset_cache
-        .get_or_create_image_page_preview(&book.path, page.saturating_sub(1), page_path)
+        .get_or_create_image_page_preview(&book.path, page.saturating_sub(1), &page_path)
         .await?;
-    file_response(&cached).await
+    file_response(&cached, &headers, ASSET_CACHE_CONTROL).await
 }
 
 pub async fn pdf_book_page_svg(
     State(state): State<AppState>,
     Path((book_id, page)): Path<(i64, usize)>,
+    headers: HeaderMap,
 ) -> Result<Response<Body>, AppError> {
-    let book = state
+    let book_path = state
         .db_service
-        .get_book(book_id)
+        .get_book_path(book_id)
         .await?
         .ok_or_else(|| AppError::NotFound(format!("book {book_id}")))?;
     let asset = state
         .asset_cache
-        .get_pdf_page_svg(&book.path, page.saturating_sub(1))
+        .get_pdf_page_svg(&book_path, page.saturating_sub(1))
         .await?;
     match asset {
-        PdfPageSvgAsset::CachedFile(path) => file_response(&path).await,
+        PdfPageSvgAsset::CachedFile(path) => {
+            file_response(&path, &headers, ASSET_CACHE_CONTROL).await
+        }
         PdfPageSvgAsset::GeneratedBytes(bytes) => binary_response("image/svg+xml", bytes),
     }
 }
 
+/// 键集分页的响应：取满一页时用最后一行生成下一页游标
+fn build_cursor_books_response(
+    books: Vec<BookListItem>,
+    total: usize,
+    page: usize,
+    page_size: usize,
+    cover_width: u32,
+) -> BooksResponse {
+    let next_cursor = if books.len() == page_size {
+        books.last().map(|book| BookCursor::after(book).encode())
+    } else {
+        None
+    };
+    BooksResponse {
+        next_cursor,
+        ..build_books_response(books, total, page, page_size, cover_width)
+    }
+}
+
+fn parse_cursor(cursor: &str) -> Result<Option<BookCursor>, AppError> {
+    if cursor.is_empty() {
+        return Ok(None);
+    }
+    BookCursor::decode(cursor)
+        .map(Some)
+        .ok_or_else(|| AppError::BadRequest(format!("invalid cursor: {cursor}")))
+}
+
 fn build_books_response(
-    books: Vec<book_files::Model>,
+    books: Vec<BookListItem>,
     total: usize,
     page: usize,
     page_size: usize,
+    cover_width: u32,
 ) -> BooksResponse {
     let items: Vec<BookResponse> = books
         .into_iter()
-        .map(|book| to_book_response(&book))
+        .map(|book| BookResponse { book, cover_width })
         .collect();
     let total_pages = if total == 0 {
         0
@@ -272,28 +505,12 @@ fn build_books_response(
     BooksResponse {
         success: true,
         message: "查询成功".to_string(),
-        data: items.clone(),
         items,
         page,
         page_size,
         total,
         total_pages,
-    }
-}
-
-fn to_book_response(book: &book_files::Model) -> BookResponse {
-    BookResponse {
-        id: book.id.to_string(),
-        path: book.path.clone(),
-        title: book.title.clone(),
-        kind: book.kind.clone(),
-        book_type: frontend_book_type(book),
-        size: book.size,
-        mtime: book.mtime,
-        page_count: book.page_count,
-        is_favorite: book.is_favorite,
-        cover_path: book.cover_path.clone(),
-        created_at: book.created_at.clone(),
+        next_cursor: None,
     }
 }
 
@@ -302,7 +519,7 @@ fn to_book_detail_response(book: &book_files::Model) -> BookDetailResponse {
         id: book.id.to_string(),
         title: book.title.clone().unwrap_or_else(|| file_stem(&book.path)),
         path: book.path.clone(),
-        book_type: frontend_book_type(book),
+        book_type: frontend_book_type(&book.kind),
         page_count: book.page_count,
         is_favorite: book.is_favorite,
         description: None,
@@ -316,23 +533,16 @@ fn to_book_detail_response(book: &book_files::Model) -> BookDetailResponse {
     }
 }
 
-fn frontend_book_type(book: &book_files::Model) -> String {
-    if book.kind == "pdf" {
-        "pdf_book".to_string()
+fn frontend_book_type(kind: &str) -> &'static str {
+    if kind == "pdf" {
+        "pdf_book"
     } else {
-        "image_book".to_string()
+        "image_book"
     }
 }
 
-fn page_paths(book: &book_files::Model) -> Result<Vec<String>, AppError> {
-    serde_json::from_str::<Vec<String>>(book.pages_json.as_deref().unwrap_or("[]"))
-        .map_err(|err| AppError::InternalServerError(format!("invalid page json: {err}")))
-}
-
 fn first_image_path(book: &book_files::Model) -> Option<String> {
-    page_paths(book)
-        .ok()
-        .and_then(|pages| pages.into_iter().next())
+    book.page_path(0).ok().flatten()
 }
 
 fn file_stem(path: &str) -> String {
@@ -343,13 +553,32 @@ fn file_stem(path: &str) -> String {
         .to_string()
 }
 
-async fn file_response(path: &std::path::Path) -> Result<Response<Body>, AppError> {
-    let request = Request::builder().uri("/").body(Body::empty())?;
+/// 用 `ServeFile` 返回文件
+///
+/// 客户端的条件请求头会一并转交，文件未变化时直接返回不带正文的 304，
+/// 不再每次重新传输整张图片。成功响应带上 `cache_control` 指定的缓存策略。
+async fn file_response(
+    path: &std::path::Path,
+    headers: &HeaderMap,
+    cache_control: &'static str,
+) -> Result<Response<Body>, AppError> {
+    let mut request = Request::builder().uri("/").body(Body::empty())?;
+    for name in FORWARDED_FILE_HEADERS {
+        if let Some(value) = headers.get(&name) {
+            request.headers_mut().insert(name, value.clone());
+        }
+    }
     let response = ServeFile::new(path)
         .oneshot(request)
         .await
         .map_err(|err| AppError::InternalServerError(format!("failed to serve file: {err}")))?;
-    let (parts, body) = response.into_parts();
+    let (mut parts, body) = response.into_parts();
+    if parts.status.is_success() || parts.status == StatusCode::NOT_MODIFIED {
+        parts
+            .headers
+            .entry(header::CACHE_CONTROL)
+            .or_insert(HeaderValue::from_static(cache_control));
+    }
     Ok(Response::from_parts(parts, Body::new(body)))
 }
 
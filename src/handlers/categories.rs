@@ -1,103 +1,98 @@
 use axum::{
+    body::{Body, Bytes},
     extract::{Path, State},
-    response::Json,
+    http::header,
+    response::{IntoResponse, Response},
 };
 
-use crate::domain::book_files;
+use crate::handlers::books::BookResponse;
 use crate::service::database::CategoryNode;
 use crate::{AppError, AppState};
 use serde::Serialize;
+use std::sync::{Arc, Mutex};
 
-#[derive(Serialize)]
-pub struct CategoryBookResponse {
-    pub id: String,
-    pub path: String,
-    pub title: Option<String>,
-    pub kind: String,
-    #[serde(rename = "type")]
-    pub book_type: String,
-    pub size: i64,
-    pub mtime: i64,
-    pub page_count: i64,
-    pub is_favorite: bool,
-    pub cover_path: Option<String>,
-    pub created_at: Option<String>,
-}
+/// 分类书籍列表每次序列化、发送的条数
+const CATEGORY_BOOKS_CHUNK_SIZE: usize = 256;
 
-#[derive(Serialize)]
-pub struct CategoryNodeResponse {
-    pub id: i64,
-    pub name: String,
-    pub path: String,
-    pub book_count: usize,
-    pub total_book_count: usize,
-    pub sub_categories: Vec<CategoryNodeResponse>,
-}
+/// 最近一次序列化的分类树 JSON
+///
+/// 以分类树的 `Arc` 为键：数据库同步后缓存里换成新的树，指针不同即重新序列化；
+/// 同步之间的请求直接复用同一份字节。
+static CATEGORY_TREE_JSON: Mutex<Option<(Arc<Vec<CategoryNode>>, Bytes)>> = Mutex::new(None);
 
-pub async fn list_categories(
-    State(state): State<AppState>,
-) -> Result<Json<Vec<CategoryNodeResponse>>, AppError> {
+pub async fn list_categories(State(state): State<AppState>) -> Result<Response, AppError> {
     let categories = state.db_service.list_categories_tree().await?;
-    Ok(Json(
-        categories
-            .into_iter()
-            .map(to_category_node_response)
-            .collect(),
-    ))
+    let json = category_tree_json(categories)?;
+    Ok(([(header::CONTENT_TYPE, "application/json")], json).into_response())
+}
+
+fn category_tree_json(categories: Arc<Vec<CategoryNode>>) -> Result<Bytes, AppError> {
+    let mut cached = match CATEGORY_TREE_JSON.lock() {
+        Ok(guard) => guard,
+        Err(err) => err.into_inner(),
+    };
+    if let Some((tree, json)) = cached.as_ref() {
+        if Arc::ptr_eq(tree, &categories) {
+            return Ok(json.clone());
+        }
+    }
+    let json = Bytes::from(serde_json::to_vec(&*categories).map_err(|err| {
+        AppError::InternalServerError(format!("failed to serialize categories: {err}"))
+    })?);
+    *cached = Some((categories, json.clone()));
+    Ok(json)
 }
 
+/// 分类（含子孙分类）下的全部书籍
+///
+/// 书籍可能有上千本，响应按块边转换边序列化输出，不在内存中拼出整个 JSON 数组。
 pub async fn list_category_books(
     State(state): State<AppState>,
     Path(category_id): Path<i64>,
-) -> Result<Json<Vec<CategoryBookResponse>>, AppError> {
+) -> Result<Response, AppError> {
     let books = state.db_service.list_books_by_category(category_id).await?;
-    Ok(Json(
+    let cover_width = state.asset_cache.config().cover_width;
+    let chunks = json_array_chunks(
         books
             .into_iter()
-            .map(|book| to_book_response(&book))
-            .collect(),
-    ))
-}
-
-fn to_category_node_response(node: CategoryNode) -> CategoryNodeResponse {
-    let sub_categories: Vec<CategoryNodeResponse> = node
-        .sub_categories
-        .into_iter()
-        .map(to_category_node_response)
-        .collect();
-    let book_count = node.book_count;
-    let total_book_count = book_count
-        + sub_categories
-            .iter()
-            .map(|sub| sub.total_book_count)
-            .sum::<usize>();
-
-    CategoryNodeResponse {
-        id: node.id,
-        name: node.name,
-        path: node.path,
-        book_count,
-        total_book_count,
-        sub_categories,
-    }
+            .map(move |book| BookResponse { book, cover_width }),
+        CATEGORY_BOOKS_CHUNK_SIZE,
+    );
+    Ok((
+        [(header::CONTENT_TYPE, "application/json")],
+        Body::from_stream(tokio_stream::iter(chunks)),
+    )
+        .into_response())
 }
 
-fn to_book_response(book: &book_files::Model) -> CategoryBookResponse {
-    CategoryBookResponse {
-        id: book.id.to_string(),
-        path: book.path.clone(),
-        title: book.title.clone(),
-        kind: book.kind.clone(),
-        book_type: if book.kind == "pdf" {
-            "pdf_book".to_string()
-        } else {
-            "image_book".to_string()
-        },
-        size: book.size,
-        mtime: book.mtime,
-        page_count: book.page_count,
-        is_favorite: book.is_favorite,
-        cover_path: book.cover_path.clone(),
-        created_at: book.created_at.clone(),
-    }
+/// 把元素序列化为 JSON 数组，每块最多 `chunk_size` 个元素
+fn json_array_chunks<T: Serialize>(
+    items: impl IntoIterator<Item = T>,
+    chunk_size: usize,
+) -> impl Iterator<Item = Result<Vec<u8>, serde_json::Error>> {
+    let mut items = items.into_iter().peekable();
+    let mut started = false;
+    let mut finished = false;
+    std::iter::from_fn(move || {
+        if finished {
+            return None;
+        }
+        let mut buf = Vec::new();
+        for item in items.by_ref().take(chunk_size) {
+            buf.push(if started { b',' } else { b'[' });
+            started = true;
+            if let Err(err) = serde_json::to_writer(&mut buf, &item) {
+                finished = true;
+                return Some(Err(err));
+            }
+        }
+        if items.peek().is_none() {
+            if !started {
+                buf.push(b'[');
+            }
+            buf.push(b']');
+            finished = true;
+        }
+        Some(Ok(buf))
+    })
 }
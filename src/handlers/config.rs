@@ -73,8 +73,8 @@ pub struct ClearCacheResponse {
 }
 
 pub async fn get_config(State(state): State<AppState>) -> Result<Json<ConfigResponse>, AppError> {
-    let config = Config::load(runtime::config_path());
-    let snapshot = state.db_service.get_snapshot().await?;
+    let config = Config::load_cached(runtime::config_path());
+    let counts = state.db_service.count_rows().await?;
     let asset_stats = state.asset_cache.stats().await?;
     let cache_size_mb = asset_stats.cover_cache_size_mb
         + asset_stats.image_page_cache_size_mb
@@ -82,7 +82,7 @@ pub async fn get_config(State(state): State<AppState>) -> Result<Json<ConfigResp
 
     Ok(Json(ConfigResponse {
         stats: ConfigStats {
-            total_books: snapshot.book_files.len(),
+            total_books: counts.book_files,
             cache_size_mb,
             server_status: "healthy".to_string(),
             version: config.version.clone(),
@@ -119,7 +119,7 @@ pub async fn update_config(
     State(state): State<AppState>,
     Json(payload): Json<ConfigUpdateRequest>,
 ) -> Result<Json<ConfigResponse>, AppError> {
-    let mut config = Config::load(runtime::config_path());
+    let mut config = Config::load_cached(runtime::config_path());
     let mut scanner = config.scanner.clone();
 
     if let Some(app_name) = payload.app_name {
@@ -205,7 +205,7 @@ pub async fn update_config(
 }
 
 pub async fn get_root_path() -> Json<RootPathResponse> {
-    let config = Config::load(runtime::config_path());
+    let config = Config::load_cached(runtime::config_path());
     Json(RootPathResponse {
         root_path: config
             .scanner
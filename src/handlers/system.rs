@@ -2,13 +2,16 @@
 //!
 //! 提供系统相关的端点，包括健康检查和扫描功能。
 
-use crate::service::database::{BookChangeDetail, CategoryChangeDetail, LibraryChangeDetail};
+use crate::service::database::{
+    BookChangeDetail, CategoryChangeDetail, LibraryChangeDetail, ScanStatus, SyncReport,
+};
 use crate::{AppError, AppState};
 use axum::{
     extract::State,
+    http::HeaderName,
     response::{
         sse::{Event, KeepAlive, Sse},
-        Json,
+        IntoResponse, Json,
     },
 };
 use serde::Serialize;
@@ -17,6 +20,9 @@ use sysinfo::{Pid, ProcessesToUpdate, System};
 use tokio::sync::mpsc;
 use tokio_stream::{wrappers::UnboundedReceiverStream, StreamExt};
 
+/// 扫描 SSE 的心跳间隔，需短于常见反向代理的 60 秒空闲超时
+const SCAN_STREAM_HEARTBEAT_INTERVAL: std::time::Duration = std::time::Duration::from_secs(15);
+
 #[derive(Serialize)]
 pub struct HealthResponse {
     pub status: String,
@@ -56,15 +62,15 @@ pub struct MemoryReleaseResponse {
 }
 
 pub async fn health_check(State(state): State<AppState>) -> Json<HealthResponse> {
-    let snapshot = state.db_service.get_snapshot().await.ok();
+    let counts = state.db_service.count_rows().await.unwrap_or_default();
     Json(HealthResponse {
         status: "ok".to_string(),
         service: "auxm".to_string(),
         version: env!("CARGO_PKG_VERSION").to_string(),
         storage_mode: state.db_service.storage_mode().to_string(),
-        libraries: snapshot.as_ref().map(|s| s.libraries.len()).unwrap_or(0),
-        categories: snapshot.as_ref().map(|s| s.categories.len()).unwrap_or(0),
-        book_files: snapshot.as_ref().map(|s| s.book_files.len()).unwrap_or(0),
+        libraries: counts.libraries,
+        categories: counts.categories,
+        book_files: counts.book_files,
     })
 }
 
@@ -141,133 +147,124 @@ pub struct ScanResponse {
 
 #[derive(Serialize)]
 struct ScanStreamMessage {
-    kind: String,
+    kind: &'static str,
     message: String,
-    data: Option<serde_json::Value>,
+    data: Option<ScanResponse>,
 }
 
-pub async fn scan(State(state): State<AppState>) -> Result<Json<ScanResponse>, AppError> {
-    let db_service = &state.db_service;
-
-    let report = db_service.scan_and_refresh().await?;
-    cleanup_deleted_book_caches(&state.asset_cache, &report).await;
-    let snapshot = db_service.get_snapshot().await?;
-    let generated_covers = state
-        .asset_cache
-        .precompute_book_covers(&snapshot.book_files)
-        .await
-        .map_err(AppError::from)?;
-    tracing::info!("precomputed {} book covers after scan", generated_covers);
-    crate::service::restart::schedule_process_restart(std::time::Duration::from_millis(500));
+impl ScanStreamMessage {
+    fn log(message: String) -> Self {
+        Self {
+            kind: "log",
+            message,
+            data: None,
+        }
+    }
+}
 
+pub async fn scan(State(state): State<AppState>) -> Result<Json<ScanResponse>, AppError> {
+    // 与 `/scan/stream` 一样放进独立任务：客户端断开时只丢弃等待结果的 future，
+    // 扫描照常跑完并复位扫描状态，不会让 `running` 一直停在 true
+    let report = tokio::spawn(async move {
+        run_scan_pipeline(&state, |message| tracing::debug!("{}", message)).await
+    })
+    .await
+    .map_err(|err| AppError::InternalServerError(format!("scan task failed: {err}")))??;
     Ok(Json(build_scan_response(report)))
 }
 
-pub async fn scan_stream(
-    State(state): State<AppState>,
-) -> Sse<impl tokio_stream::Stream<Item = Result<Event, Infallible>>> {
+pub async fn scan_status(State(state): State<AppState>) -> Json<ScanStatus> {
+    Json(state.db_service.scan_status())
+}
+
+pub async fn scan_stream(State(state): State<AppState>) -> impl IntoResponse {
     let (tx, rx) = mpsc::unbounded_channel::<ScanStreamMessage>();
 
     tokio::spawn(async move {
-        let send = |kind: &str,
-                    message: String,
-                    data: Option<serde_json::Value>,
-                    tx: &mpsc::UnboundedSender<ScanStreamMessage>| {
-            let _ = tx.send(ScanStreamMessage {
-                kind: kind.to_string(),
-                message,
-                data,
-            });
-        };
-
-        send("log", "开始扫描数据库和文件系统...".to_string(), None, &tx);
+        let progress_tx = tx.clone();
+        let result = run_scan_pipeline(&state, move |message| {
+            let _ = progress_tx.send(ScanStreamMessage::log(message));
+        })
+        .await;
 
-        let report = match state.db_service.scan_and_refresh().await {
+        let message = match result {
             Ok(report) => {
-                cleanup_deleted_book_caches_with_progress(&state.asset_cache, &report, |message| {
-                    let _ = tx.send(ScanStreamMessage {
-                        kind: "log".to_string(),
-                        message,
-                        data: None,
-                    });
-                })
-                .await;
-                send(
-                    "log",
-                    format!(
-                        "扫描完成，新增 {} 本，更新 {} 本，删除 {} 本，准备生成封面缓存...",
-                        report.inserted_book_files,
-                        report.updated_book_files,
-                        report.deleted_book_files
-                    ),
-                    None,
-                    &tx,
-                );
-                report
-            }
-            Err(err) => {
-                send("failed", format!("扫描失败: {}", err), None, &tx);
-                return;
-            }
-        };
-
-        let snapshot = match state.db_service.get_snapshot().await {
-            Ok(snapshot) => snapshot,
-            Err(err) => {
-                send("failed", format!("读取扫描结果失败: {}", err), None, &tx);
-                return;
-            }
-        };
-
-        let cover_result = state
-            .asset_cache
-            .precompute_book_covers_with_progress(&snapshot.book_files, |message| {
-                let _ = tx.send(ScanStreamMessage {
-                    kind: "log".to_string(),
-                    message,
-                    data: None,
-                });
-            })
-            .await;
-
-        match cover_result {
-            Ok(count) => {
-                send(
-                    "log",
-                    format!("封面缓存生成完成，共处理 {} 本书", count),
-                    None,
-                    &tx,
-                );
                 let response = build_scan_response(report);
-                send(
-                    "complete",
-                    response.message.clone(),
-                    Some(serde_json::to_value(response).unwrap_or(serde_json::Value::Null)),
-                    &tx,
-                );
-                crate::service::restart::schedule_process_restart(
-                    std::time::Duration::from_millis(500),
-                );
-            }
-            Err(err) => {
-                send("failed", format!("封面缓存生成失败: {}", err), None, &tx);
+                ScanStreamMessage {
+                    kind: "complete",
+                    message: response.message.clone(),
+                    data: Some(response),
+                }
             }
-        }
+            Err(err) => ScanStreamMessage {
+                kind: "failed",
+                message: format!("扫描失败: {}", err),
+                data: None,
+            },
+        };
+        let _ = tx.send(message);
     });
 
+    // 每条消息直接序列化进 SSE 帧缓冲区，不再经过中间的 Value / String
     let stream = UnboundedReceiverStream::new(rx).map(|message| {
-        let event_name = message.kind.clone();
-        let data = serde_json::to_string(&message).unwrap_or_else(|_| {
-            "{\"kind\":\"error\",\"message\":\"failed to serialize scan event\",\"data\":null}"
-                .to_string()
-        });
-        Ok(Event::default().event(event_name).data(data))
+        Ok::<_, Infallible>(Event::default()
+            .event(message.kind)
+            .json_data(&message)
+            .unwrap_or_else(|err| {
+                tracing::warn!("failed to serialize scan event: {}", err);
+                Event::default().event(message.kind).data(
+                    "{\"kind\":\"error\",\"message\":\"failed to serialize scan event\",\"data\":null}",
+                )
+            }))
     });
 
-    Sse::new(stream).keep_alive(KeepAlive::default())
+    // 长时间无进度时（如大 PDF 计页）定期发心跳，避免被代理的空闲超时断开；
+    // 同时告诉 nginx 等反向代理不要缓冲整个响应
+    (
+        [(HeaderName::from_static("x-accel-buffering"), "no")],
+        Sse::new(stream).keep_alive(
+            KeepAlive::new()
+                .interval(SCAN_STREAM_HEARTBEAT_INTERVAL)
+                .text("ping"),
+        ),
+    )
 }
 
-fn build_scan_response(report: crate::service::database::SyncReport) -> ScanResponse {
+/// 扫描流水线
+///
+/// `/scan` 与 `/scan/stream` 共用：同步数据库 → 清理已删除书籍的缓存 → 预生成封面，
+/// 成功后安排进程重启。进度消息通过 `on_progress` 逐条回调。
+async fn run_scan_pipeline<F>(state: &AppState, mut on_progress: F) -> Result<SyncReport, AppError>
+where
+    F: FnMut(String) + Clone + Send + 'static,
+{
+    on_progress("开始扫描数据库和文件系统...".to_string());
+    let report = state
+        .db_service
+        .scan_and_refresh_with_progress(on_progress.clone())
+        .await?;
+    cleanup_changed_book_caches(&state.asset_cache, &report, &mut on_progress).await;
+    on_progress(format!(
+        "扫描完成，新增 {} 本，更新 {} 本，删除 {} 本，准备生成封面缓存...",
+        report.inserted_book_files, report.updated_book_files, report.deleted_book_files
+    ));
+
+    let cover_sources = state.db_service.list_cover_sources().await?;
+    let generated_covers = state
+        .asset_cache
+        .precompute_book_covers_with_progress(&cover_sources, &mut on_progress)
+        .await?;
+    tracing::info!("precomputed {} book covers after scan", generated_covers);
+    on_progress(format!(
+        "封面缓存生成完成，共处理 {} 本书",
+        generated_covers
+    ));
+
+    crate::service::restart::schedule_process_restart(std::time::Duration::from_millis(500));
+    Ok(report)
+}
+
+fn build_scan_response(report: SyncReport) -> ScanResponse {
     ScanResponse {
         success: true,
         message: "扫描完成".to_string(),
@@ -288,24 +285,22 @@ fn build_scan_response(report: crate::service::database::SyncReport) -> ScanResp
     }
 }
 
-async fn cleanup_deleted_book_caches(
-    asset_cache: &crate::service::assets::AssetCacheService,
-    report: &crate::service::database::SyncReport,
-) {
-    cleanup_deleted_book_caches_with_progress(asset_cache, report, |message| {
-        tracing::info!("{}", message);
-    })
-    .await;
-}
-
-async fn cleanup_deleted_book_caches_with_progress<F>(
+/// 删除已删除书籍与内容有变化书籍的缓存
+///
+/// 更新的书籍页序或页面内容可能变了，而 PDF 页面与封面缓存只按书籍路径和页码命名，
+/// 保留下来会返回旧内容；清掉后按新内容重新生成。
+async fn cleanup_changed_book_caches<F>(
     asset_cache: &crate::service::assets::AssetCacheService,
-    report: &crate::service::database::SyncReport,
+    report: &SyncReport,
     mut on_progress: F,
 ) where
     F: FnMut(String),
 {
-    for book in &report.deleted_book_file_details {
+    let changed_books = report
+        .deleted_book_file_details
+        .iter()
+        .chain(&report.updated_book_file_details);
+    for book in changed_books {
         match asset_cache.delete_book_cache(&book.path).await {
             Ok(()) => on_progress(format!("已清理缓存: {}", book.path)),
             Err(err) => tracing::warn!("failed to delete cache for {}: {}", book.path, err),
@@ -16,6 +16,7 @@
 //!
 //! - `config` - 配置管理模块
 //! - `error` - 错误类型定义
+//! - `logging` - 日志初始化（后台线程写出）
 //! - `middleware` - 中间件（请求日志）
 //! - `routes` - 路由定义
 //! - `handlers` - 请求处理器
@@ -44,6 +45,7 @@
 
 pub mod config;
 pub mod error;
+pub mod logging;
 pub mod middleware;
 pub mod routes;
 pub mod runtime;
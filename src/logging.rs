@@ -0,0 +1,149 @@
+//! 日志模块
+//!
+//! 初始化 tracing 订阅者。日志行先进入内存队列，再由后台线程批量写到 stdout，
+//! 请求处理和扫描线程不会因为终端输出而阻塞。进程退出或 `exec` 重启前调用 [`flush`]
+//! （或丢弃 `init_tracing` 返回的 [`LogGuard`]），等队列里的日志写完。
+
+use std::io::Write;
+use std::sync::mpsc::{self, Receiver, SyncSender};
+use std::sync::OnceLock;
+use std::time::Duration;
+use tracing_subscriber::fmt::writer::{BoxMakeWriter, MakeWriter};
+use tracing_subscriber::{layer::SubscriberExt, util::SubscriberInitExt};
+
+/// 队列中最多积压的日志行数；积压满时调用方阻塞等待，不丢日志
+const LOG_QUEUE_CAPACITY: usize = 4096;
+/// `flush` 最多等待写线程的时间，避免 stdout 被阻塞时卡住退出流程
+const FLUSH_TIMEOUT: Duration = Duration::from_secs(2);
+
+/// 写线程的队列；`flush` 通过它投递刷新请求
+static LOG_QUEUE: OnceLock<SyncSender<LogMessage>> = OnceLock::new();
+
+enum LogMessage {
+    Line(Vec<u8>),
+    /// 之前入队的日志全部写出并 flush 后回复
+    Flush(SyncSender<()>),
+}
+
+/// 丢弃时等待已入队的日志写完
+#[must_use = "hold the guard until exit so queued log lines are written"]
+pub struct LogGuard(());
+
+impl Drop for LogGuard {
+    fn drop(&mut self) {
+        flush();
+    }
+}
+
+/// 等待此前入队的日志全部写到 stdout
+///
+/// 进程退出、`exec` 重启等不会运行析构的路径上需要显式调用。
+pub fn flush() {
+    let Some(sender) = LOG_QUEUE.get() else {
+        return;
+    };
+    let (ack_tx, ack_rx) = mpsc::sync_channel(1);
+    if sender.send(LogMessage::Flush(ack_tx)).is_ok() {
+        let _ = ack_rx.recv_timeout(FLUSH_TIMEOUT);
+    }
+}
+
+/// 初始化全局 tracing 订阅者
+pub fn init_tracing(log_filter: &str) -> LogGuard {
+    let env_filter = tracing_subscriber::EnvFilter::new(log_filter);
+    let writer = match QueuedStdout::spawn() {
+        Ok(writer) => BoxMakeWriter::new(writer),
+        Err(err) => {
+            eprintln!("failed to spawn log writer thread, logging synchronously: {err}");
+            BoxMakeWriter::new(std::io::stdout)
+        }
+    };
+    let fmt_layer = tracing_subscriber::fmt::layer().with_writer(writer);
+
+    tracing_subscriber::registry()
+        .with(env_filter)
+        .with(fmt_layer)
+        .init();
+    LogGuard(())
+}
+
+/// 把格式化好的日志行交给后台线程写出的 `MakeWriter`
+struct QueuedStdout {
+    sender: SyncSender<LogMessage>,
+}
+
+impl QueuedStdout {
+    fn spawn() -> std::io::Result<Self> {
+        let (sender, receiver) = mpsc::sync_channel(LOG_QUEUE_CAPACITY);
+        std::thread::Builder::new()
+            .name("log-writer".to_string())
+            .spawn(move || log_writer_loop(receiver))?;
+        let _ = LOG_QUEUE.set(sender.clone());
+        Ok(Self { sender })
+    }
+}
+
+impl<'a> MakeWriter<'a> for QueuedStdout {
+    type Writer = QueuedLine<'a>;
+
+    fn make_writer(&'a self) -> Self::Writer {
+        QueuedLine {
+            sender: &self.sender,
+            buf: Vec::new(),
+        }
+    }
+}
+
+/// 单条日志事件的缓冲；drop 时整行入队
+struct QueuedLine<'a> {
+    sender: &'a SyncSender<LogMessage>,
+    buf: Vec<u8>,
+}
+
+impl Write for QueuedLine<'_> {
+    fn write(&mut self, bytes: &[u8]) -> std::io::Result<usize> {
+        self.buf.extend_from_slice(bytes);
+        Ok(bytes.len())
+    }
+
+    fn flush(&mut self) -> std::io::Result<()> {
+        Ok(())
+    }
+}
+
+impl Drop for QueuedLine<'_> {
+    fn drop(&mut self) {
+        if self.buf.is_empty() {
+            return;
+        }
+        let line = std::mem::take(&mut self.buf);
+        // 写线程已经退出时直接同步写，保证日志不丢
+        if let Err(mpsc::SendError(LogMessage::Line(line))) =
+            self.sender.send(LogMessage::Line(line))
+        {
+            let _ = std::io::stdout().write_all(&line);
+        }
+    }
+}
+
+fn log_writer_loop(receiver: Receiver<LogMessage>) {
+    let mut out = std::io::BufWriter::new(std::io::stdout());
+    while let Ok(message) = receiver.recv() {
+        let mut flush_acks = Vec::new();
+        let mut handle = |message: LogMessage| match message {
+            LogMessage::Line(line) => {
+                let _ = out.write_all(&line);
+            }
+            LogMessage::Flush(ack) => flush_acks.push(ack),
+        };
+        handle(message);
+        // 已经排队的行一并写出，队列清空后再 flush，一次系统调用覆盖一批日志
+        while let Ok(message) = receiver.try_recv() {
+            handle(message);
+        }
+        let _ = out.flush();
+        for ack in flush_acks {
+            let _ = ack.send(());
+        }
+    }
+}
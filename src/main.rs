@@ -9,7 +9,6 @@ static GLOBAL: jemallocator::Jemalloc = jemallocator::Jemalloc;
 
 use auxm::{routes, AppState, AssetCacheService, Config, DatabaseService};
 use tokio::signal;
-use tracing_subscriber::{layer::SubscriberExt, util::SubscriberInitExt};
 
 /// 应用程序入口函数
 ///
@@ -28,7 +27,8 @@ async fn main() {
     // 2. 初始化日志系统
     let log_level = std::env::var("RUST_LOG").unwrap_or_else(|_| config.log_level.clone());
     let log_filter = format!("{},sqlx=off", log_level);
-    init_tracing(&log_filter);
+    // 守卫在 main 返回时等待排队中的日志写完
+    let _log_guard = auxm::logging::init_tracing(&log_filter);
 
     tracing::info!(
         "Starting {} v{} on http://{}:{}",
@@ -87,16 +87,6 @@ async fn main() {
 
     tracing::info!("Server shutdown complete");
 }
-fn init_tracing(log_filter: &str) {
-    let env_filter = tracing_subscriber::EnvFilter::new(log_filter);
-    let fmt_layer = tracing_subscriber::fmt::layer();
-
-    tracing_subscriber::registry()
-        .with(env_filter)
-        .with(fmt_layer)
-        .init();
-}
-
 /// 优雅关闭信号处理
 ///
 /// 监听操作系统信号（Ctrl+C、SIGTERM），在收到关闭信号后停止接受新连接，
@@ -30,10 +30,11 @@ pub fn create_router(state: crate::AppState, app_config: &crate::config::Config)
         .layer(tower::limit::ConcurrencyLimitLayer::new(
             app_config.internal.http_concurrency_limit.max(1),
         ))
+        // 访问日志只在 debug 级别输出：默认 info 级别下不为每个请求创建 span、写日志行
         .layer(
             tower_http::trace::TraceLayer::new_for_http()
                 .make_span_with(|request: &axum::extract::Request| {
-                    tracing::info_span!(
+                    tracing::debug_span!(
                         "request",
                         method = %request.method(),
                         uri = %request.uri(),
@@ -43,7 +44,7 @@ pub fn create_router(state: crate::AppState, app_config: &crate::config::Config)
                     |response: &axum::response::Response,
                      latency: std::time::Duration,
                      _span: &tracing::Span| {
-                        tracing::info!(
+                        tracing::debug!(
                             status = %response.status(),
                             latency = ?latency,
                         );
@@ -12,7 +12,9 @@ use axum::{
 ///
 /// # API 端点
 ///
-/// - `GET /api/books` - 获取书籍列表（支持分页和排序）
+/// - `GET /api/books` - 获取书籍列表（支持分页和排序；传 `cursor` 时按键集分页）
+/// - `GET /api/books/favorite/list` - 获取收藏列表（分页方式同上）
+/// - `POST /api/books/favorite` - 批量收藏 / 取消收藏
 pub fn routes(state: AppState) -> Router {
     Router::new()
         .route("/api/books", get(crate::handlers::books::list_books))
@@ -20,6 +22,10 @@ pub fn routes(state: AppState) -> Router {
             "/api/books/favorite/list",
             get(crate::handlers::books::list_favorite_books),
         )
+        .route(
+            "/api/books/favorite",
+            post(crate::handlers::books::set_books_favorite),
+        )
         .route("/api/books/:id", get(crate::handlers::books::get_book))
         .route(
             "/api/books/:id/favorite",
@@ -2,11 +2,15 @@
 //!
 //! 以单文件工具页模式提供前端页面和静态资源。
 
-use axum::response::Html;
-use axum::routing::{get, get_service};
+use axum::http::{header, HeaderValue};
+use axum::response::{Html, IntoResponse, Response};
+use axum::routing::get;
 use axum::Router;
 use std::path::PathBuf;
-use tower_http::services::{ServeDir, ServeFile};
+use tower_http::services::ServeDir;
+
+/// 页面与静态资源的缓存策略：短时缓存，/static 过期后可由 ServeDir 的 Last-Modified 协商
+const FRONTEND_CACHE_CONTROL: &str = "public, max-age=300";
 
 fn get_frontend_dir() -> PathBuf {
     if let Ok(exe_path) = std::env::current_exe() {
@@ -22,7 +26,6 @@ fn get_frontend_dir() -> PathBuf {
 
 pub fn routes() -> Router {
     let frontend_dir = get_frontend_dir();
-    let favicon_path = frontend_dir.join("favicon.ico");
 
     Router::new()
         .route("/", get(index))
@@ -35,8 +38,19 @@ pub fn routes() -> Router {
         .route("/img_swiper/:id", get(img_swiper))
         .route("/pdf_swiper", get(pdf_swiper))
         .route("/pdf_swiper/:id", get(pdf_swiper))
-        .route_service("/favicon.ico", get_service(ServeFile::new(favicon_path)))
+        .route("/favicon.ico", get(favicon))
         .nest_service("/static", ServeDir::new(frontend_dir))
+        .layer(axum::middleware::map_response(with_cache_control))
+}
+
+async fn with_cache_control(mut response: Response) -> Response {
+    if response.status().is_success() {
+        response
+            .headers_mut()
+            .entry(header::CACHE_CONTROL)
+            .or_insert(HeaderValue::from_static(FRONTEND_CACHE_CONTROL));
+    }
+    response
 }
 
 async fn index() -> Html<&'static str> {
@@ -62,3 +76,10 @@ async fn img_swiper() -> Html<&'static str> {
 async fn pdf_swiper() -> Html<&'static str> {
     Html(include_str!("../frontend/pdf_swiper.html"))
 }
+
+async fn favicon() -> impl IntoResponse {
+    (
+        [(header::CONTENT_TYPE, "image/x-icon")],
+        include_bytes!("../frontend/favicon.ico").as_slice(),
+    )
+}
@@ -14,6 +14,7 @@ use axum::{
 ///
 /// - `GET /health` - 健康检查
 /// - `GET /scan` - 增量扫描并同步数据库
+/// - `GET /api/scan/status` - 查询扫描是否进行中及上次结果
 pub fn routes(state: AppState) -> Router {
     Router::new()
         .route("/health", get(crate::handlers::system::health_check))
@@ -27,5 +28,9 @@ pub fn routes(state: AppState) -> Router {
         )
         .route("/scan", get(crate::handlers::system::scan))
         .route("/scan/stream", get(crate::handlers::system::scan_stream))
+        .route(
+            "/api/scan/status",
+            get(crate::handlers::system::scan_status),
+        )
         .with_state(state)
 }
@@ -1,4 +1,7 @@
-use std::path::PathBuf;
+use std::ffi::OsStr;
+use std::fs::File;
+use std::path::{Path, PathBuf};
+use std::sync::atomic::{AtomicU64, Ordering};
 
 pub const CONFIG_PATH_ENV: &str = "AUXM_CONFIG_PATH";
 pub const CACHE_DIR_ENV: &str = "AUXM_CACHE_DIR";
@@ -33,6 +36,53 @@ pub fn app_cache_root() -> std::io::Result<PathBuf> {
     Ok(base.join("auxm"))
 }
 
+/// 写入缓存文件
+///
+/// 先写到同目录下的临时文件，写完后改名为 `path`。其他请求用 `exists()` 判断缓存是否
+/// 命中时不会看到写了一半的文件，写入失败也不会留下残缺的缓存。父目录只在首次写入、
+/// 创建失败时才创建，缓存目录已存在时不再多做 mkdir/stat。
+pub fn write_cache_file(
+    path: &Path,
+    write: impl FnOnce(&mut File) -> std::io::Result<()>,
+) -> std::io::Result<()> {
+    let temp_path = cache_temp_path(path);
+    let mut file = match File::create(&temp_path) {
+        Err(err) if err.kind() == std::io::ErrorKind::NotFound => {
+            if let Some(parent) = path.parent() {
+                std::fs::create_dir_all(parent)?;
+            }
+            File::create(&temp_path)?
+        }
+        result => result?,
+    };
+    let result = write(&mut file).and_then(|()| std::fs::rename(&temp_path, path));
+    if result.is_err() {
+        let _ = std::fs::remove_file(&temp_path);
+    }
+    result
+}
+
+/// 缓存临时文件名中的标记：`<目标文件名>.tmp-<pid>-<序号>`
+const CACHE_TEMP_MARKER: &str = ".tmp-";
+
+/// 同目录下、进程内唯一的临时文件名
+fn cache_temp_path(path: &Path) -> PathBuf {
+    static NEXT_TEMP_ID: AtomicU64 = AtomicU64::new(0);
+    let id = NEXT_TEMP_ID.fetch_add(1, Ordering::Relaxed);
+    let mut temp_path = path.as_os_str().to_owned();
+    temp_path.push(format!("{CACHE_TEMP_MARKER}{}-{id}", std::process::id()));
+    PathBuf::from(temp_path)
+}
+
+/// `write_cache_file` 的临时文件返回写入它的进程号，其他文件返回 None
+pub fn cache_temp_file_pid(file_name: &OsStr) -> Option<u32> {
+    let file_name = file_name.to_str()?;
+    let (_, suffix) = file_name.rsplit_once(CACHE_TEMP_MARKER)?;
+    let (pid, id) = suffix.split_once('-')?;
+    id.parse::<u64>().ok()?;
+    pid.parse().ok()
+}
+
 fn home_dir() -> std::io::Result<PathBuf> {
     std::env::var_os("HOME")
         .map(PathBuf::from)
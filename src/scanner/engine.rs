@@ -1,12 +1,13 @@
 //! Scanner 扫描引擎模块
 //!
-//! 实现文件系统的递归扫描功能。
+//! 实现文件系统的树形扫描功能。
 
-use super::strategy::ConfigurableRecognizer;
+use super::strategy::{count_pdf_pages, ConfigurableRecognizer};
 use super::types::{CachedBookMetadata, ScanResult, ScannedBookFile, ScannedCategory};
 use std::collections::HashMap;
 use std::fs;
-use std::path::Path;
+use std::path::{Path, PathBuf};
+use std::sync::atomic::{AtomicUsize, Ordering};
 use std::time::SystemTime;
 
 pub struct Scanner<'a> {
@@ -35,101 +36,211 @@ impl<'a> Scanner<'a> {
         }
     }
 
+    /// 按路径查找上次扫描的元数据；UTF-8 路径直接借用为 `&str` 查询，不再逐项分配字符串
+    fn existing_book(&self, path: &Path) -> Option<&CachedBookMetadata> {
+        if self.existing_books.is_empty() {
+            return None;
+        }
+        self.existing_books.get(path.to_string_lossy().as_ref())
+    }
+
     pub fn scan(&self, root: &Path) -> ScanResult {
-        let mut book_files = Vec::new();
-        let mut categories = Vec::new();
+        let mut output = WalkOutput::default();
 
         let meta = match fs::metadata(root) {
             Ok(m) => m,
-            Err(_) => {
-                return ScanResult {
-                    book_files,
-                    categories,
-                };
-            }
+            Err(_) => return output.into_scan_result(),
         };
 
         if meta.is_dir() {
-            let inspection = self.recognizer.inspect_directory(
-                root,
-                &meta,
-                self.existing_books.get(&root.to_string_lossy().to_string()),
-            );
-            categories.push(
+            let inspection =
+                self.recognizer
+                    .inspect_directory(root, &meta, self.existing_book(root));
+            output.categories.push(
                 inspection
                     .category
                     .unwrap_or_else(|| build_root_category(root, &meta)),
             );
             if let Some(book) = inspection.book {
-                book_files.push(book);
+                output.book_files.push(book);
             }
             if inspection.recurse {
-                fs::read_dir(root)
-                    .ok()
-                    .map(|entries| entries.flatten())
-                    .into_iter()
-                    .flatten()
-                    .for_each(|entry| {
-                        self.scan_dir(&entry.path(), &mut book_files, &mut categories)
-                    });
+                self.walk_parallel(inspection.children, &mut output);
             }
         } else {
-            self.scan_dir(root, &mut book_files, &mut categories);
+            self.walk(vec![root.to_path_buf()], &mut output);
         }
 
-        ScanResult {
-            book_files,
-            categories,
+        count_pdf_pages_parallel(&mut output.book_files, &output.pending_page_counts);
+        output.into_scan_result()
+    }
+
+    /// 根目录的各个子项互不依赖，分给多个线程并行遍历；
+    /// 结果按子项原顺序拼接，与串行遍历的输出完全一致
+    fn walk_parallel(&self, mut children: Vec<PathBuf>, output: &mut WalkOutput) {
+        let workers = std::thread::available_parallelism()
+            .map(|n| n.get())
+            .unwrap_or(1)
+            .min(children.len());
+        if workers <= 1 {
+            children.reverse();
+            self.walk(children, output);
+            return;
+        }
+
+        let next = AtomicUsize::new(0);
+        let mut parts: Vec<(usize, WalkOutput)> = std::thread::scope(|scope| {
+            let handles: Vec<_> = (0..workers)
+                .map(|_| {
+                    scope.spawn(|| {
+                        let mut parts = Vec::new();
+                        loop {
+                            let index = next.fetch_add(1, Ordering::Relaxed);
+                            let Some(child) = children.get(index) else {
+                                break;
+                            };
+                            let mut part = WalkOutput::default();
+                            self.walk(vec![child.clone()], &mut part);
+                            parts.push((index, part));
+                        }
+                        parts
+                    })
+                })
+                .collect();
+            handles
+                .into_iter()
+                .flat_map(|handle| match handle.join() {
+                    Ok(parts) => parts,
+                    // 丢掉某个子树的结果会让同步误删书籍，因此把 panic 原样抛给调用方
+                    Err(err) => std::panic::resume_unwind(err),
+                })
+                .collect()
+        });
+
+        parts.sort_by_key(|(index, _)| *index);
+        for (_, part) in parts {
+            output.append(part);
         }
     }
 
-    fn scan_dir(
-        &self,
-        path: &Path,
-        book_files: &mut Vec<ScannedBookFile>,
-        categories: &mut Vec<ScannedCategory>,
-    ) {
-        let meta = match fs::metadata(path) {
-            Ok(m) => m,
-            Err(_) => return,
-        };
+    /// 以显式栈代替递归遍历目录树，访问顺序与递归的先序遍历一致
+    fn walk(&self, mut pending: Vec<PathBuf>, output: &mut WalkOutput) {
+        while let Some(path) = pending.pop() {
+            let meta = match fs::metadata(&path) {
+                Ok(m) => m,
+                Err(_) => continue,
+            };
 
-        if meta.is_dir() {
-            if self.recognizer.is_hidden(path) {
-                return;
-            }
-            let inspection = self.recognizer.inspect_directory(
-                path,
-                &meta,
-                self.existing_books.get(&path.to_string_lossy().to_string()),
-            );
-            if let Some(category) = inspection.category {
-                categories.push(category);
+            if meta.is_dir() {
+                if self.recognizer.is_hidden(&path) {
+                    continue;
+                }
+                let inspection =
+                    self.recognizer
+                        .inspect_directory(&path, &meta, self.existing_book(&path));
+                if let Some(category) = inspection.category {
+                    output.categories.push(category);
+                }
+                if let Some(book) = inspection.book {
+                    output.book_files.push(book);
+                }
+                if inspection.recurse {
+                    // 逆序压栈，出栈顺序与 `read_dir` 顺序一致
+                    pending.extend(inspection.children.into_iter().rev());
+                }
+                continue;
             }
-            if let Some(book) = inspection.book {
-                book_files.push(book);
-            }
-            if inspection.recurse {
-                fs::read_dir(path)
-                    .ok()
-                    .map(|entries| entries.flatten())
-                    .into_iter()
-                    .flatten()
-                    .for_each(|entry| self.scan_dir(&entry.path(), book_files, categories));
+
+            if let Some(inspection) =
+                self.recognizer
+                    .analyze_file(&path, &meta, self.existing_book(&path))
+            {
+                if inspection.needs_page_count {
+                    output.pending_page_counts.push(output.book_files.len());
+                }
+                output.book_files.push(inspection.book);
             }
-            return;
         }
+    }
+}
+
+/// 遍历的中间结果
+#[derive(Default)]
+struct WalkOutput {
+    book_files: Vec<ScannedBookFile>,
+    categories: Vec<ScannedCategory>,
+    /// `book_files` 中还需要统计页数的 PDF 的下标
+    pending_page_counts: Vec<usize>,
+}
+
+impl WalkOutput {
+    fn append(&mut self, part: WalkOutput) {
+        let offset = self.book_files.len();
+        self.pending_page_counts.extend(
+            part.pending_page_counts
+                .into_iter()
+                .map(|index| index + offset),
+        );
+        self.book_files.extend(part.book_files);
+        self.categories.extend(part.categories);
+    }
 
-        if let Some(book) = self.recognizer.analyze_file(
-            path,
-            &meta,
-            self.existing_books.get(&path.to_string_lossy().to_string()),
-        ) {
-            book_files.push(book);
+    fn into_scan_result(self) -> ScanResult {
+        ScanResult {
+            book_files: self.book_files,
+            categories: self.categories,
         }
     }
 }
 
+/// 统计新增或已变化 PDF 的页数
+///
+/// 打开 PDF 并解析 xref 是扫描中最重的一步。遍历时只收集下标，这里再分给多个线程，
+/// 即使所有 PDF 都在同一个目录下也能用满所有核心。
+fn count_pdf_pages_parallel(book_files: &mut [ScannedBookFile], pending: &[usize]) {
+    let workers = std::thread::available_parallelism()
+        .map(|n| n.get())
+        .unwrap_or(1)
+        .min(pending.len());
+    if workers <= 1 {
+        for &index in pending {
+            book_files[index].page_count = count_pdf_pages(&book_files[index].path);
+        }
+        return;
+    }
+
+    let books = &*book_files;
+    let next = AtomicUsize::new(0);
+    let counts: Vec<(usize, i64)> = std::thread::scope(|scope| {
+        let handles: Vec<_> = (0..workers)
+            .map(|_| {
+                scope.spawn(|| {
+                    let mut counts = Vec::new();
+                    loop {
+                        let next_index = next.fetch_add(1, Ordering::Relaxed);
+                        let Some(&index) = pending.get(next_index) else {
+                            break;
+                        };
+                        counts.push((index, count_pdf_pages(&books[index].path)));
+                    }
+                    counts
+                })
+            })
+            .collect();
+        handles
+            .into_iter()
+            .flat_map(|handle| match handle.join() {
+                Ok(counts) => counts,
+                Err(err) => std::panic::resume_unwind(err),
+            })
+            .collect()
+    });
+
+    for (index, page_count) in counts {
+        book_files[index].page_count = page_count;
+    }
+}
+
 fn build_root_category(path: &Path, metadata: &std::fs::Metadata) -> ScannedCategory {
     let name = path
         .file_name()
@@ -149,3 +260,39 @@ fn build_root_category(path: &Path, metadata: &std::fs::Metadata) -> ScannedCate
         mtime,
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::fs;
+    use tempfile::tempdir;
+
+    #[test]
+    fn parallel_walk_keeps_each_subtree_in_pre_order() -> Result<(), Box<dyn std::error::Error>> {
+        let temp_dir = tempdir()?;
+        let names = ["a", "b", "c", "d", "e"];
+        for name in names {
+            fs::create_dir_all(temp_dir.path().join(name).join("inner"))?;
+        }
+
+        let recognizer = ConfigurableRecognizer::default();
+        let result = Scanner::new(&recognizer).scan(temp_dir.path());
+        let paths: Vec<String> = result.categories.into_iter().map(|c| c.path).collect();
+
+        assert_eq!(paths.len(), 1 + names.len() * 2);
+        assert_eq!(paths[0], temp_dir.path().to_string_lossy());
+        for name in names {
+            let dir = temp_dir.path().join(name).to_string_lossy().to_string();
+            let inner = temp_dir
+                .path()
+                .join(name)
+                .join("inner")
+                .to_string_lossy()
+                .to_string();
+            let dir_index = paths.iter().position(|p| *p == dir);
+            let inner_index = paths.iter().position(|p| *p == inner);
+            assert_eq!(inner_index, dir_index.map(|i| i + 1));
+        }
+        Ok(())
+    }
+}
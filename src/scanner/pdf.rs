@@ -5,11 +5,10 @@
 use image::codecs::jpeg::JpegEncoder;
 use image::ExtendedColorType;
 use mupdf::{Colorspace, Document, Matrix};
-use std::collections::HashMap;
-use std::fs::File;
-use std::io::BufWriter;
+use std::collections::{HashMap, HashSet};
+use std::io::{BufWriter, Write};
 use std::path::{Path, PathBuf};
-use std::sync::{mpsc, Mutex};
+use std::sync::{mpsc, Arc, Mutex};
 use std::thread;
 use std::time::{Duration, Instant};
 use tokio::sync::oneshot;
@@ -21,12 +20,28 @@ impl PdfHelper {
         let document = Document::open(path).ok()?;
         document.page_count().ok()?.try_into().ok()
     }
+
+    /// 渲染 PDF 封面 JPEG
+    ///
+    /// 在调用线程上单独打开文档、用完即关，不经过渲染线程。批量预生成封面时多个任务
+    /// 可在阻塞线程池上并行渲染，不会在单个渲染线程上排队；也不会把每本 PDF 都放进
+    /// 文档缓存。渲染线程已经打开的文档走 [`PdfRenderService::write_cover_jpeg`]。
+    pub fn write_cover_jpeg(path: &str, width: u32, target_path: &Path) -> std::io::Result<()> {
+        if target_path.exists() {
+            return Ok(());
+        }
+
+        let document = Document::open(path).map_err(mupdf_to_io_error)?;
+        write_document_cover_jpeg(&document, width, target_path)
+    }
 }
 
 #[derive(Debug)]
 pub struct PdfRenderService {
     sender: mpsc::Sender<RenderCommand>,
     worker: Mutex<Option<thread::JoinHandle<()>>>,
+    /// 渲染线程文档缓存中已打开的路径，供调用方不经过渲染线程就能判断
+    open_paths: Arc<Mutex<HashSet<String>>>,
 }
 
 #[derive(Debug, Clone, Copy)]
@@ -38,9 +53,11 @@ pub struct PdfRenderStats {
 impl PdfRenderService {
     pub fn new() -> std::io::Result<Self> {
         let (sender, receiver) = mpsc::channel();
+        let open_paths = Arc::new(Mutex::new(HashSet::new()));
+        let cache = DocumentCache::new(Arc::clone(&open_paths));
         let worker = thread::Builder::new()
             .name("auxm-pdf-renderer".to_string())
-            .spawn(move || pdf_render_worker_loop(receiver))
+            .spawn(move || pdf_render_worker_loop(receiver, cache))
             .map_err(|err| {
                 std::io::Error::other(format!("failed to start pdf render worker: {err}"))
             })?;
@@ -48,21 +65,34 @@ impl PdfRenderService {
         Ok(Self {
             sender,
             worker: Mutex::new(Some(worker)),
+            open_paths,
         })
     }
 
-    pub async fn write_page_svg(
+    /// 渲染线程当前是否打开着这份文档（例如正在阅读）
+    pub fn is_open(&self, path: &str) -> bool {
+        self.open_paths
+            .lock()
+            .unwrap_or_else(|err| err.into_inner())
+            .contains(path)
+    }
+
+    /// 在渲染线程上用已打开的文档渲染封面 JPEG，不再重新打开文件
+    ///
+    /// 只应在 [`is_open`](Self::is_open) 为真时调用：其余文档走
+    /// [`PdfHelper::write_cover_jpeg`] 在阻塞线程池上并行渲染。判断之后文档恰好过期时，
+    /// 渲染线程临时打开一次，不放进缓存。
+    pub async fn write_cover_jpeg(
         &self,
         path: &str,
-        page_index: usize,
         width: u32,
         target_path: &Path,
     ) -> std::io::Result<()> {
         let (response_tx, response_rx) = oneshot::channel();
         self.sender
-            .send(RenderCommand::Render(RenderRequest {
+            .send(RenderCommand::RenderCoverJpeg(RenderRequest {
                 path: path.to_string(),
-                page_index,
+                page_index: 0,
                 width,
                 target_path: target_path.to_path_buf(),
                 response_tx,
@@ -74,26 +104,18 @@ impl PdfRenderService {
             .map_err(|_| std::io::Error::other("pdf render worker stopped unexpectedly"))?
     }
 
-    pub async fn write_cover_svg(
-        &self,
-        path: &str,
-        width: u32,
-        target_path: &Path,
-    ) -> std::io::Result<()> {
-        self.write_page_svg(path, 0, width, target_path).await
-    }
-
-    pub async fn write_cover_jpeg(
+    pub async fn write_page_svg(
         &self,
         path: &str,
+        page_index: usize,
         width: u32,
         target_path: &Path,
     ) -> std::io::Result<()> {
         let (response_tx, response_rx) = oneshot::channel();
         self.sender
-            .send(RenderCommand::RenderCoverJpeg(RenderRequest {
+            .send(RenderCommand::Render(RenderRequest {
                 path: path.to_string(),
-                page_index: 0,
+                page_index,
                 width,
                 target_path: target_path.to_path_buf(),
                 response_tx,
@@ -105,6 +127,15 @@ impl PdfRenderService {
             .map_err(|_| std::io::Error::other("pdf render worker stopped unexpectedly"))?
     }
 
+    pub async fn write_cover_svg(
+        &self,
+        path: &str,
+        width: u32,
+        target_path: &Path,
+    ) -> std::io::Result<()> {
+        self.write_page_svg(path, 0, width, target_path).await
+    }
+
     pub async fn render_page_svg_bytes(
         &self,
         path: &str,
@@ -143,6 +174,7 @@ impl Default for PdfRenderService {
         Self {
             sender: mpsc::channel().0,
             worker: Mutex::new(None),
+            open_paths: Arc::default(),
         }
     }
 }
@@ -188,9 +220,10 @@ struct ByteRenderRequest {
     response_tx: oneshot::Sender<std::io::Result<Vec<u8>>>,
 }
 
-#[derive(Default)]
 struct DocumentCache {
     documents: HashMap<String, CachedDocument>,
+    /// 与 `documents` 的键保持一致，供 `PdfRenderService::is_open` 读取
+    open_paths: Arc<Mutex<HashSet<String>>>,
 }
 
 struct CachedDocument {
@@ -200,6 +233,15 @@ struct CachedDocument {
 
 impl DocumentCache {
     const IDLE_TTL: Duration = Duration::from_secs(90);
+    /// 同时保持打开的文档上限；超出时关闭最久未使用的文档
+    const MAX_OPEN_DOCUMENTS: usize = 16;
+
+    fn new(open_paths: Arc<Mutex<HashSet<String>>>) -> Self {
+        Self {
+            documents: HashMap::new(),
+            open_paths,
+        }
+    }
 
     fn get_or_open(&mut self, path: &str) -> std::io::Result<&Document> {
         self.evict_expired();
@@ -208,6 +250,9 @@ impl DocumentCache {
             entry.last_used_at = Instant::now();
         } else {
             let document = Document::open(path).map_err(mupdf_to_io_error)?;
+            if self.documents.len() >= Self::MAX_OPEN_DOCUMENTS {
+                self.evict_least_recently_used();
+            }
             self.documents.insert(
                 path.to_string(),
                 CachedDocument {
@@ -215,6 +260,7 @@ impl DocumentCache {
                     last_used_at: Instant::now(),
                 },
             );
+            self.publish_open_paths();
         }
 
         self.documents
@@ -223,10 +269,51 @@ impl DocumentCache {
             .ok_or_else(|| std::io::Error::other("document cache lost newly inserted entry"))
     }
 
+    /// 已经打开的文档直接复用（刷新访问时间）；未打开时返回 None，不放入缓存
+    fn get_open(&mut self, path: &str) -> Option<&Document> {
+        let entry = self.documents.get_mut(path)?;
+        entry.last_used_at = Instant::now();
+        Some(&entry.document)
+    }
+
+    fn publish_open_paths(&self) {
+        let mut open_paths = self
+            .open_paths
+            .lock()
+            .unwrap_or_else(|err| err.into_inner());
+        open_paths.clear();
+        open_paths.extend(self.documents.keys().cloned());
+    }
+
+    fn evict_least_recently_used(&mut self) {
+        let oldest = self
+            .documents
+            .iter()
+            .min_by_key(|(_, entry)| entry.last_used_at)
+            .map(|(path, _)| path.clone());
+        if let Some(path) = oldest {
+            self.documents.remove(&path);
+            self.publish_open_paths();
+        }
+    }
+
     fn evict_expired(&mut self) {
         let now = Instant::now();
+        let before = self.documents.len();
         self.documents
             .retain(|_, entry| now.duration_since(entry.last_used_at) < Self::IDLE_TTL);
+        if self.documents.len() != before {
+            self.publish_open_paths();
+        }
+    }
+
+    /// 距最早一份文档闲置过期还剩多久；没有打开的文档时返回 None
+    fn time_until_next_expiry(&self) -> Option<Duration> {
+        let now = Instant::now();
+        self.documents
+            .values()
+            .map(|entry| (entry.last_used_at + Self::IDLE_TTL).saturating_duration_since(now))
+            .min()
     }
 
     fn stats(&self) -> PdfRenderStats {
@@ -237,46 +324,57 @@ impl DocumentCache {
     }
 }
 
-fn pdf_render_worker_loop(receiver: mpsc::Receiver<RenderCommand>) {
-    let mut cache = DocumentCache::default();
-
+fn pdf_render_worker_loop(receiver: mpsc::Receiver<RenderCommand>, mut cache: DocumentCache) {
+    // 只在最早一份文档到期时醒来清理；没有打开的文档时一直阻塞到下一条命令，
+    // 空闲时不再定时唤醒
     loop {
-        match receiver.recv_timeout(Duration::from_secs(15)) {
-            Ok(command) => match command {
-                RenderCommand::Render(request) => {
-                    let result = render_pdf_page_svg(
-                        &mut cache,
-                        &request.path,
-                        request.page_index,
-                        request.width,
-                        &request.target_path,
-                    );
-                    let _ = request.response_tx.send(result);
-                }
-                RenderCommand::RenderCoverJpeg(request) => {
-                    let result = render_pdf_cover_jpeg_direct(
-                        &request.path,
-                        request.width,
-                        &request.target_path,
-                    );
-                    let _ = request.response_tx.send(result);
-                }
-                RenderCommand::RenderSvgBytes(request) => {
-                    let result = render_pdf_page_svg_bytes(
-                        &mut cache,
-                        &request.path,
-                        request.page_index,
-                        request.width,
-                    );
-                    let _ = request.response_tx.send(result);
-                }
-                RenderCommand::Stats { response_tx } => {
-                    let _ = response_tx.send(cache.stats());
+        let command = match cache.time_until_next_expiry() {
+            Some(wait) => match receiver.recv_timeout(wait) {
+                Ok(command) => command,
+                Err(mpsc::RecvTimeoutError::Timeout) => {
+                    cache.evict_expired();
+                    continue;
                 }
-                RenderCommand::Shutdown => break,
+                Err(mpsc::RecvTimeoutError::Disconnected) => break,
             },
-            Err(mpsc::RecvTimeoutError::Timeout) => cache.evict_expired(),
-            Err(mpsc::RecvTimeoutError::Disconnected) => break,
+            None => match receiver.recv() {
+                Ok(command) => command,
+                Err(_) => break,
+            },
+        };
+        match command {
+            RenderCommand::Render(request) => {
+                let result = render_pdf_page_svg(
+                    &mut cache,
+                    &request.path,
+                    request.page_index,
+                    request.width,
+                    &request.target_path,
+                );
+                let _ = request.response_tx.send(result);
+            }
+            RenderCommand::RenderCoverJpeg(request) => {
+                let result = render_pdf_cover_jpeg(
+                    &mut cache,
+                    &request.path,
+                    request.width,
+                    &request.target_path,
+                );
+                let _ = request.response_tx.send(result);
+            }
+            RenderCommand::RenderSvgBytes(request) => {
+                let result = render_pdf_page_svg_bytes(
+                    &mut cache,
+                    &request.path,
+                    request.page_index,
+                    request.width,
+                );
+                let _ = request.response_tx.send(result);
+            }
+            RenderCommand::Stats { response_tx } => {
+                let _ = response_tx.send(cache.stats());
+            }
+            RenderCommand::Shutdown => break,
         }
     }
 }
@@ -320,10 +418,7 @@ fn render_pdf_page_svg(
     let display_list = page.to_display_list(true).map_err(mupdf_to_io_error)?;
     let svg = display_list.to_svg(&matrix).map_err(mupdf_to_io_error)?;
 
-    if let Some(parent) = target_path.parent() {
-        std::fs::create_dir_all(parent)?;
-    }
-    std::fs::write(target_path, svg)
+    crate::runtime::write_cache_file(target_path, |file| file.write_all(svg.as_bytes()))
 }
 
 fn render_pdf_page_svg_bytes(
@@ -362,12 +457,35 @@ fn render_pdf_page_svg_bytes(
     Ok(svg.into_bytes())
 }
 
-fn render_pdf_cover_jpeg_direct(path: &str, width: u32, target_path: &Path) -> std::io::Result<()> {
+/// 渲染 PDF 封面 JPEG
+///
+/// 正在阅读的文档已在缓存中时直接复用，不再重新打开文件；否则临时打开、用完即关。
+fn render_pdf_cover_jpeg(
+    cache: &mut DocumentCache,
+    path: &str,
+    width: u32,
+    target_path: &Path,
+) -> std::io::Result<()> {
     if target_path.exists() {
         return Ok(());
     }
 
-    let document = Document::open(path).map_err(mupdf_to_io_error)?;
+    let opened;
+    let document = match cache.get_open(path) {
+        Some(document) => document,
+        None => {
+            opened = Document::open(path).map_err(mupdf_to_io_error)?;
+            &opened
+        }
+    };
+    write_document_cover_jpeg(document, width, target_path)
+}
+
+fn write_document_cover_jpeg(
+    document: &Document,
+    width: u32,
+    target_path: &Path,
+) -> std::io::Result<()> {
     let page = document.load_page(0).map_err(mupdf_to_io_error)?;
     let bounds = page.bounds().map_err(mupdf_to_io_error)?;
     let raw_width = (bounds.x1 - bounds.x0).abs().max(1.0);
@@ -382,26 +500,24 @@ fn render_pdf_cover_jpeg_direct(path: &str, width: u32, target_path: &Path) -> s
         .to_pixmap(&matrix, &colorspace, false, false)
         .map_err(mupdf_to_io_error)?;
 
-    if let Some(parent) = target_path.parent() {
-        std::fs::create_dir_all(parent)?;
-    }
-    let file = File::create(target_path)?;
-    let writer = BufWriter::new(file);
-    let mut encoder = JpegEncoder::new_with_quality(writer, 85);
     if pixmap.n() != 3 {
         return Err(std::io::Error::other(format!(
             "unsupported pixmap channel count: {}",
             pixmap.n()
         )));
     }
-    encoder
-        .encode(
-            pixmap.samples(),
-            pixmap.width(),
-            pixmap.height(),
-            ExtendedColorType::Rgb8,
-        )
-        .map_err(|err| std::io::Error::other(err.to_string()))
+    crate::runtime::write_cache_file(target_path, |file| {
+        let mut writer = BufWriter::new(file);
+        JpegEncoder::new_with_quality(&mut writer, 85)
+            .encode(
+                pixmap.samples(),
+                pixmap.width(),
+                pixmap.height(),
+                ExtendedColorType::Rgb8,
+            )
+            .map_err(|err| std::io::Error::other(err.to_string()))?;
+        writer.flush()
+    })
 }
 
 fn mupdf_to_io_error(err: mupdf::Error) -> std::io::Error {
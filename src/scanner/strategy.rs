@@ -5,7 +5,9 @@
 use super::types::{CachedBookMetadata, ScannedBookFile, ScannedCategory};
 use crate::config::{CacheConfig, ScannerConfig};
 use crate::scanner::pdf::PdfHelper;
-use std::path::Path;
+use std::cmp::Ordering;
+use std::ffi::OsStr;
+use std::path::{Path, PathBuf};
 use std::time::SystemTime;
 
 const IMAGE_FOLDER_KIND: &str = "image_folder";
@@ -69,10 +71,14 @@ impl ConfigurableRecognizer {
     }
 
     pub fn is_hidden(&self, path: &Path) -> bool {
-        path.file_name()
-            .and_then(|n| n.to_str())
-            .map(|n| n.starts_with('.'))
-            .unwrap_or(false)
+        path.file_name().is_some_and(is_hidden_name)
+    }
+
+    /// 扩展名是否为图片；逐项忽略大小写比较，目录项循环里不再为每个文件分配小写副本
+    fn is_image_extension(&self, ext: &str) -> bool {
+        self.image_extensions
+            .iter()
+            .any(|known| known.eq_ignore_ascii_case(ext))
     }
 
     pub fn inspect_directory(
@@ -82,13 +88,15 @@ impl ConfigurableRecognizer {
         existing_book: Option<&CachedBookMetadata>,
     ) -> DirectoryInspection {
         let mut direct_images = Vec::new();
+        let mut children = Vec::new();
         let mut has_pdf = false;
         let mut has_subdirs = false;
 
         if let Ok(entries) = std::fs::read_dir(path) {
             for entry in entries.flatten() {
-                let entry_path = entry.path();
-                if self.is_hidden(&entry_path) {
+                // 先用目录项自带的文件名和类型判断，只为用得到的条目拼接完整路径
+                let file_name = entry.file_name();
+                if is_hidden_name(&file_name) {
                     continue;
                 }
                 let Ok(file_type) = entry.file_type() else {
@@ -96,32 +104,37 @@ impl ConfigurableRecognizer {
                 };
                 if file_type.is_dir() {
                     has_subdirs = true;
+                    children.push(entry.path());
                     continue;
                 }
                 if !file_type.is_file() {
+                    // 符号链接等交给遍历时的 `fs::metadata` 跟随后再判断
+                    children.push(entry.path());
                     continue;
                 }
 
-                let Some(ext) = entry_path.extension().and_then(|e| e.to_str()) else {
+                let Some(ext) = Path::new(&file_name).extension().and_then(|e| e.to_str()) else {
                     continue;
                 };
-                let ext = ext.to_lowercase();
-                if self.image_extensions.contains(&ext) {
+                if self.is_image_extension(ext) {
                     let Ok(metadata) = entry.metadata() else {
                         continue;
                     };
                     direct_images.push(ImageEntry {
-                        path: entry_path.to_string_lossy().to_string(),
+                        path: entry.path().to_string_lossy().to_string(),
                         mtime: system_time_to_secs(metadata.modified().ok()),
                         size: metadata.len() as i64,
                     });
-                } else if ext == "pdf" {
+                } else if ext.eq_ignore_ascii_case(PDF_KIND) {
                     has_pdf = true;
+                    if ext == PDF_KIND {
+                        children.push(entry.path());
+                    }
                 }
             }
         }
 
-        direct_images.sort_by(|a, b| a.path.cmp(&b.path));
+        direct_images.sort_by(|a, b| natural_cmp(&a.path, &b.path));
         let has_image_book = direct_images.len() >= self.min_image_count;
         let is_mixed_container = has_pdf || has_subdirs;
 
@@ -131,15 +144,20 @@ impl ConfigurableRecognizer {
             book: has_image_book
                 .then(|| fill_image_book_model(path, metadata, self, direct_images, existing_book)),
             recurse: is_mixed_container || !has_image_book,
+            children,
         }
     }
 
+    /// 识别单个文件
+    ///
+    /// 新增或已变化的 PDF 不在这里打开读取页数，只标记 `needs_page_count`，
+    /// 由扫描引擎在遍历结束后并行统计（见 [`count_pdf_pages`]）。
     pub fn analyze_file(
         &self,
         path: &Path,
         metadata: &std::fs::Metadata,
         existing_book: Option<&CachedBookMetadata>,
-    ) -> Option<ScannedBookFile> {
+    ) -> Option<FileInspection> {
         if self.is_hidden(path) {
             return None;
         }
@@ -151,15 +169,60 @@ impl ConfigurableRecognizer {
     }
 }
 
-fn count_pdf_pages(path: &Path) -> Option<usize> {
-    PdfHelper::page_count(&path.to_string_lossy())
+/// 打开 PDF 读取页数；无法解析的文件记为 0 页
+pub fn count_pdf_pages(path: &str) -> i64 {
+    PdfHelper::page_count(path).unwrap_or(0) as i64
+}
+
+/// 按自然顺序比较路径：连续数字按数值比较，`2.jpg` 排在 `10.jpg` 之前
+///
+/// 逐字节比较、不分配内存；补零命名（`001.jpg`）的顺序与按字典序相同。
+fn natural_cmp(a: &str, b: &str) -> Ordering {
+    let (a, b) = (a.as_bytes(), b.as_bytes());
+    let (mut i, mut j) = (0, 0);
+    while i < a.len() && j < b.len() {
+        if a[i].is_ascii_digit() && b[j].is_ascii_digit() {
+            let a_end = i + a[i..].iter().take_while(|c| c.is_ascii_digit()).count();
+            let b_end = j + b[j..].iter().take_while(|c| c.is_ascii_digit()).count();
+            let a_num = trim_leading_zeros(&a[i..a_end]);
+            let b_num = trim_leading_zeros(&b[j..b_end]);
+            let ordering = a_num
+                .len()
+                .cmp(&b_num.len())
+                .then_with(|| a_num.cmp(b_num))
+                .then_with(|| (a_end - i).cmp(&(b_end - j)));
+            if ordering != Ordering::Equal {
+                return ordering;
+            }
+            i = a_end;
+            j = b_end;
+        } else {
+            match a[i].cmp(&b[j]) {
+                Ordering::Equal => {
+                    i += 1;
+                    j += 1;
+                }
+                ordering => return ordering,
+            }
+        }
+    }
+    (a.len() - i).cmp(&(b.len() - j))
+}
+
+fn trim_leading_zeros(digits: &[u8]) -> &[u8] {
+    let zeros = digits.iter().take_while(|&&c| c == b'0').count();
+    &digits[zeros..]
+}
+
+fn is_hidden_name(name: &OsStr) -> bool {
+    name.to_str().is_some_and(|n| n.starts_with('.'))
 }
 
 fn fill_pdf_book_model(
     path: &Path,
     metadata: &std::fs::Metadata,
     existing_book: Option<&CachedBookMetadata>,
-) -> ScannedBookFile {
+) -> FileInspection {
     let mtime = metadata
         .modified()
         .ok()
@@ -168,11 +231,12 @@ fn fill_pdf_book_model(
         .unwrap_or(0);
 
     let size = metadata.len() as i64;
+    let cached = existing_book
+        .filter(|cached| cached.kind == PDF_KIND && cached.mtime == mtime && cached.size == size);
+    let needs_page_count = cached.is_none();
 
     let (page_count, pages_json, content_signature, cover_path, is_oversized, avg_page_pixels) =
-        if let Some(cached) = existing_book.filter(|cached| {
-            cached.kind == PDF_KIND && cached.mtime == mtime && cached.size == size
-        }) {
+        if let Some(cached) = cached {
             (
                 cached.page_count,
                 cached.pages_json.clone(),
@@ -182,11 +246,10 @@ fn fill_pdf_book_model(
                 cached.avg_page_pixels,
             )
         } else {
-            let count = count_pdf_pages(path).unwrap_or(0) as i64;
-            (count, None, None, None, false, 0)
+            (0, None, None, None, false, 0)
         };
 
-    ScannedBookFile {
+    let book = ScannedBookFile {
         path: path.to_string_lossy().to_string(),
         title: path
             .file_name()
@@ -201,6 +264,10 @@ fn fill_pdf_book_model(
         is_oversized,
         avg_page_pixels,
         cover_path,
+    };
+    FileInspection {
+        book,
+        needs_page_count,
     }
 }
 
@@ -254,16 +321,15 @@ fn fill_image_book_payload_from_images(
     i64,
 ) {
     let cover = images.first().map(|entry| entry.path.clone());
-    let image_paths: Vec<String> = images.iter().map(|entry| entry.path.clone()).collect();
-    let count = image_paths.len();
-    let json = serde_json::to_string(&image_paths).ok();
+    let count = images.len();
+    let json = encode_page_paths(&images);
     let content_signature = Some(build_image_folder_signature(&images));
     let avg_page_pixels = existing_book
         .filter(|cached| {
             cached.kind == IMAGE_FOLDER_KIND && cached.content_signature == content_signature
         })
         .map(|cached| cached.avg_page_pixels as u64)
-        .unwrap_or_else(|| analyze_image_folder(&image_paths));
+        .unwrap_or_else(|| analyze_image_folder(&images));
     let is_oversized = avg_page_pixels >= recognizer.oversized_image_avg_pixels;
     (
         count as i64,
@@ -275,7 +341,22 @@ fn fill_image_book_payload_from_images(
     )
 }
 
-fn analyze_image_folder(images: &[String]) -> u64 {
+/// 直接从图片条目序列化页列表，不再先克隆出一份 `Vec<String>`；
+/// 缓冲区按路径总长预分配，写入过程中不会反复扩容
+fn encode_page_paths(images: &[ImageEntry]) -> Option<String> {
+    // 每个路径额外留出引号和逗号的位置
+    let capacity = images
+        .iter()
+        .map(|entry| entry.path.len() + 3)
+        .sum::<usize>()
+        + 2;
+    let mut buf = Vec::with_capacity(capacity);
+    let paths = images.iter().map(|entry| entry.path.as_str());
+    serde::Serializer::collect_seq(&mut serde_json::Serializer::new(&mut buf), paths).ok()?;
+    String::from_utf8(buf).ok()
+}
+
+fn analyze_image_folder(images: &[ImageEntry]) -> u64 {
     if images.is_empty() {
         return 0;
     }
@@ -332,13 +413,16 @@ fn system_time_to_secs(time: Option<SystemTime>) -> i64 {
         .unwrap_or(0)
 }
 
-fn sample_image_paths(images: &[String], sample_count: usize) -> Vec<&str> {
+fn sample_image_paths(images: &[ImageEntry], sample_count: usize) -> Vec<&str> {
     if sample_count <= 1 {
-        return images.first().map(|s| vec![s.as_str()]).unwrap_or_default();
+        return images
+            .first()
+            .map(|entry| vec![entry.path.as_str()])
+            .unwrap_or_default();
     }
 
     if sample_count >= images.len() {
-        return images.iter().map(String::as_str).collect();
+        return images.iter().map(|entry| entry.path.as_str()).collect();
     }
 
     let last = images.len() - 1;
@@ -350,7 +434,7 @@ fn sample_image_paths(images: &[String], sample_count: usize) -> Vec<&str> {
 
     indices
         .into_iter()
-        .map(|idx| images[idx].as_str())
+        .map(|idx| images[idx].path.as_str())
         .collect()
 }
 
@@ -379,6 +463,16 @@ pub struct DirectoryInspection {
     pub category: Option<ScannedCategory>,
     pub book: Option<ScannedBookFile>,
     pub recurse: bool,
+    /// 需要继续遍历的子项（子目录、PDF、符号链接），保持 `read_dir` 的顺序
+    ///
+    /// 与识别共用同一次目录读取，遍历时不必再读一遍目录。
+    pub children: Vec<PathBuf>,
+}
+
+pub struct FileInspection {
+    pub book: ScannedBookFile,
+    /// 没有可复用的缓存，`book.page_count` 还需要打开文件统计
+    pub needs_page_count: bool,
 }
 
 #[cfg(test)]
@@ -596,6 +690,16 @@ mod tests {
         Ok(())
     }
 
+    #[test]
+    fn natural_cmp_orders_page_numbers_numerically() {
+        let mut paths = vec!["b/10.jpg", "b/2.jpg", "b/1.jpg", "b/cover.jpg", "b/001.jpg"];
+        paths.sort_by(|a, b| natural_cmp(a, b));
+        assert_eq!(
+            paths,
+            ["b/1.jpg", "b/001.jpg", "b/2.jpg", "b/10.jpg", "b/cover.jpg"]
+        );
+    }
+
     fn create_png(path: &Path, width: u32, height: u32) -> Result<(), Box<dyn std::error::Error>> {
         let image: ImageBuffer<Rgba<u8>, Vec<u8>> =
             ImageBuffer::from_pixel(width, height, Rgba([255, 0, 0, 255]));
@@ -6,6 +6,11 @@ pub mod database;
 pub mod memory;
 pub mod restart;
 
+/// 数据库结构版本，写入 SQLite 的 `PRAGMA user_version`
+///
+/// 库文件已是该版本时启动会跳过建表和列迁移；修改 `SCHEMA_SQL` 或列迁移时需要递增。
+pub const SCHEMA_VERSION: i64 = 1;
+
 pub const SCHEMA_SQL: &str = r#"
 CREATE TABLE IF NOT EXISTS libraries (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -43,4 +48,13 @@ CREATE TABLE IF NOT EXISTS book_files (
     created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', '+8 hours')),
     FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
 );
+
+-- 外键子表列：删除分类/书库时的级联删除以及按分类查询都会用到
+CREATE INDEX IF NOT EXISTS idx_categories_library_id ON categories(library_id);
+CREATE INDEX IF NOT EXISTS idx_categories_parent_id ON categories(parent_id);
+CREATE INDEX IF NOT EXISTS idx_book_files_category_id ON book_files(category_id);
+
+-- 书籍列表与收藏列表按 created_at 分页
+CREATE INDEX IF NOT EXISTS idx_book_files_created_at ON book_files(created_at);
+CREATE INDEX IF NOT EXISTS idx_book_files_favorite_created_at ON book_files(is_favorite, created_at);
 "#;
@@ -1,23 +1,36 @@
 use crate::config::CacheConfig;
-use crate::domain::book_files;
-use crate::scanner::pdf::{PdfRenderService, PdfRenderStats};
+use crate::domain::BookCoverSource;
+use crate::scanner::pdf::{PdfHelper, PdfRenderService, PdfRenderStats};
 use fast_image_resize as fr;
 use image::codecs::jpeg::JpegEncoder;
-use image::{ExtendedColorType, RgbImage};
+use image::metadata::Orientation;
+use image::{DynamicImage, ExtendedColorType, ImageDecoder, RgbImage};
+use mupdf::{Colorspace, Document, Matrix, Pixmap};
+use std::collections::HashMap;
 use std::fs::File;
+use std::future::Future;
 use std::hash::{Hash, Hasher};
-use std::io::{BufReader, BufWriter};
+use std::io::{BufReader, BufWriter, Write};
 use std::path::{Path, PathBuf};
-use std::sync::{Arc, RwLock};
+use std::sync::{Arc, Mutex, RwLock};
 use tokio::sync::Semaphore;
 
 #[derive(Clone)]
 pub struct AssetCacheService {
     root_dir: PathBuf,
+    /// 三类缓存的目录，启动时拼好，拼接缓存文件路径时不再逐次 `join`
+    cover_root: PathBuf,
+    image_page_root: PathBuf,
+    pdf_svg_root: PathBuf,
     config: Arc<RwLock<CacheConfig>>,
     render_limiter: Arc<RwLock<Arc<Semaphore>>>,
     file_io_limiter: Arc<Semaphore>,
     pdf_renderer: Arc<PdfRenderService>,
+    /// 正在生成的缓存文件；同一文件的并发请求排队等待第一个请求生成完毕
+    generating: Arc<Mutex<HashMap<PathBuf, Arc<tokio::sync::Mutex<()>>>>>,
+    /// 生成缓存文件时持读锁，清空缓存移走目录时持写锁：清空要等在途的生成写完，
+    /// 之后开始的生成写进新目录，不会把文件写回被清空的位置或漏算释放的空间
+    clearing: Arc<tokio::sync::RwLock<()>>,
 }
 
 pub enum PdfPageSvgAsset {
@@ -36,6 +49,12 @@ pub struct AssetCacheStats {
     pub pdf_render: PdfRenderStats,
 }
 
+struct CoverJob {
+    book_path: String,
+    title: String,
+    source_image_path: Option<String>,
+}
+
 #[derive(Debug, Clone, Copy)]
 pub enum CacheClearTarget {
     All,
@@ -46,18 +65,60 @@ pub enum CacheClearTarget {
 
 impl AssetCacheService {
     pub fn new(config: CacheConfig, file_io_concurrency: usize) -> std::io::Result<Self> {
-        let root_dir = crate::runtime::app_cache_root()?;
-        std::fs::create_dir_all(root_dir.join("covers"))?;
-        std::fs::create_dir_all(root_dir.join("image_pages"))?;
-        std::fs::create_dir_all(root_dir.join("pdf_svg"))?;
+        let service = Self::with_root_dir(
+            crate::runtime::app_cache_root()?,
+            config,
+            file_io_concurrency,
+        )?;
+        service.spawn_startup_sweep();
+        Ok(service)
+    }
+
+    /// 在后台线程清理上次进程留下的残余：清空缓存后没删完的目录，以及写到一半就退出的临时文件
+    fn spawn_startup_sweep(&self) {
+        let root_dir = self.root_dir.clone();
+        let cache_roots = [
+            self.cover_root.clone(),
+            self.image_page_root.clone(),
+            self.pdf_svg_root.clone(),
+        ];
+        let spawned = std::thread::Builder::new()
+            .name("auxm-cache-sweep".to_string())
+            .spawn(move || {
+                remove_trashed_directories(&root_dir);
+                for cache_root in &cache_roots {
+                    remove_stale_temp_files(cache_root);
+                }
+            });
+        if let Err(err) = spawned {
+            tracing::warn!("failed to spawn cache sweep thread: {}", err);
+        }
+    }
+
+    fn with_root_dir(
+        root_dir: PathBuf,
+        config: CacheConfig,
+        file_io_concurrency: usize,
+    ) -> std::io::Result<Self> {
+        let cover_root = root_dir.join("covers");
+        let image_page_root = root_dir.join("image_pages");
+        let pdf_svg_root = root_dir.join("pdf_svg");
+        std::fs::create_dir_all(&cover_root)?;
+        std::fs::create_dir_all(&image_page_root)?;
+        std::fs::create_dir_all(&pdf_svg_root)?;
         Ok(Self {
             root_dir,
+            cover_root,
+            image_page_root,
+            pdf_svg_root,
             render_limiter: Arc::new(RwLock::new(Arc::new(Semaphore::new(
                 config.max_render_jobs.max(1),
             )))),
             file_io_limiter: Arc::new(Semaphore::new(file_io_concurrency.max(1))),
             config: Arc::new(RwLock::new(config)),
             pdf_renderer: Arc::new(PdfRenderService::new()?),
+            generating: Arc::new(Mutex::new(HashMap::new())),
+            clearing: Arc::new(tokio::sync::RwLock::new(())),
         })
     }
 
@@ -94,55 +155,43 @@ impl AssetCacheService {
         &self,
         book_path: &str,
         source_image_path: &str,
+        width: u32,
     ) -> std::io::Result<PathBuf> {
-        let cache_path = self.cover_cache_path(book_path);
+        let cache_path = self.cover_cache_path(book_path, width);
         if cache_path.exists() {
             return Ok(cache_path);
         }
-        let limiter = self
-            .render_limiter
-            .read()
-            .map(|guard| guard.clone())
-            .map_err(|err| {
-                std::io::Error::other(format!("asset cache limiter lock poisoned: {err}"))
-            })?;
-        let _permit = limiter
-            .acquire()
-            .await
-            .map_err(|err| std::io::Error::other(format!("render limiter closed: {err}")))?;
-        if cache_path.exists() {
-            return Ok(cache_path);
-        }
-        let width = self.config().cover_width;
-        let cache_path_clone = cache_path.clone();
         let source = source_image_path.to_string();
-        run_image_cover_job(source, cache_path_clone, width).await?;
+        let target = cache_path.clone();
+        self.generate_once(&cache_path, || {
+            run_render_job(move || create_image_cover(&source, &target, width))
+        })
+        .await?;
         Ok(cache_path)
     }
 
-    pub async fn get_or_create_pdf_cover(&self, book_path: &str) -> std::io::Result<PathBuf> {
-        let cache_path = self.cover_cache_path(book_path);
-        if cache_path.exists() {
-            return Ok(cache_path);
-        }
-        let limiter = self
-            .render_limiter
-            .read()
-            .map(|guard| guard.clone())
-            .map_err(|err| {
-                std::io::Error::other(format!("asset cache limiter lock poisoned: {err}"))
-            })?;
-        let _permit = limiter
-            .acquire()
-            .await
-            .map_err(|err| std::io::Error::other(format!("render limiter closed: {err}")))?;
+    pub async fn get_or_create_pdf_cover(
+        &self,
+        book_path: &str,
+        width: u32,
+    ) -> std::io::Result<PathBuf> {
+        let cache_path = self.cover_cache_path(book_path, width);
         if cache_path.exists() {
             return Ok(cache_path);
         }
-        let width = self.config().cover_width;
-        self.pdf_renderer
-            .write_cover_jpeg(book_path, width, &cache_path)
-            .await?;
+        let source = book_path.to_string();
+        let target = cache_path.clone();
+        self.generate_once(&cache_path, || async move {
+            // 正在阅读的 PDF 已在渲染线程打开，直接复用；其余在阻塞线程池上并行渲染
+            if self.pdf_renderer.is_open(&source) {
+                self.pdf_renderer
+                    .write_cover_jpeg(&source, width, &target)
+                    .await
+            } else {
+                run_render_job(move || PdfHelper::write_cover_jpeg(&source, width, &target)).await
+            }
+        })
+        .await?;
         Ok(cache_path)
     }
 
@@ -155,24 +204,12 @@ impl AssetCacheService {
         if cache_path.exists() {
             return Ok(PdfPageSvgAsset::CachedFile(cache_path));
         }
-        let limiter = self
-            .render_limiter
-            .read()
-            .map(|guard| guard.clone())
-            .map_err(|err| {
-                std::io::Error::other(format!("asset cache limiter lock poisoned: {err}"))
-            })?;
-        let _permit = limiter
-            .acquire()
-            .await
-            .map_err(|err| std::io::Error::other(format!("render limiter closed: {err}")))?;
-        if cache_path.exists() {
-            return Ok(PdfPageSvgAsset::CachedFile(cache_path));
-        }
         let width = self.config().pdf_svg_width;
-        self.pdf_renderer
-            .write_page_svg(book_path, page_index, width, &cache_path)
-            .await?;
+        self.generate_once(&cache_path, || {
+            self.pdf_renderer
+                .write_page_svg(book_path, page_index, width, &cache_path)
+        })
+        .await?;
         Ok(PdfPageSvgAsset::CachedFile(cache_path))
     }
 
@@ -183,10 +220,33 @@ impl AssetCacheService {
         page_path: &str,
     ) -> std::io::Result<PathBuf> {
         let width = self.config().image_page_preview_width.max(256);
-        let cache_path = self.image_page_cache_path(book_path, page_index, width, "jpg");
+        let cache_path = self.image_page_cache_path(book_path, page_index, page_path, width, "jpg");
         if cache_path.exists() {
             return Ok(cache_path);
         }
+        let source = page_path.to_string();
+        let target = cache_path.clone();
+        self.generate_once(&cache_path, || {
+            run_render_job(move || create_image_page_preview(&source, &target, width))
+        })
+        .await?;
+        Ok(cache_path)
+    }
+
+    /// 生成缓存文件，同一路径同时只生成一次
+    ///
+    /// 热门页面首次被访问时常有多个请求同时未命中缓存。后到的请求在该路径的锁上等待，
+    /// 拿到锁后文件已经存在就直接返回，不再各自解码、缩放并重复写同一个文件。
+    async fn generate_once<F, Fut>(&self, cache_path: &Path, generate: F) -> std::io::Result<()>
+    where
+        F: FnOnce() -> Fut,
+        Fut: Future<Output = std::io::Result<()>>,
+    {
+        let key = GeneratingKey::acquire(&self.generating, cache_path);
+        let _generating = key.lock.lock().await;
+        if cache_path.exists() {
+            return Ok(());
+        }
         let limiter = self
             .render_limiter
             .read()
@@ -198,22 +258,13 @@ impl AssetCacheService {
             .acquire()
             .await
             .map_err(|err| std::io::Error::other(format!("render limiter closed: {err}")))?;
-        if cache_path.exists() {
-            return Ok(cache_path);
-        }
-        let source = page_path.to_string();
-        let cache_path_clone = cache_path.clone();
-        tokio::task::spawn_blocking(move || {
-            create_image_page_preview(&source, &cache_path_clone, width)
-        })
-        .await
-        .map_err(|err| std::io::Error::other(err.to_string()))??;
-        Ok(cache_path)
+        let _not_clearing = self.clearing.read().await;
+        generate().await
     }
 
     pub async fn precompute_book_covers(
         &self,
-        books: &[book_files::Model],
+        books: &[BookCoverSource],
     ) -> std::io::Result<usize> {
         self.precompute_book_covers_with_progress(books, |_| {})
             .await
@@ -221,24 +272,28 @@ impl AssetCacheService {
 
     pub async fn precompute_book_covers_with_progress<F>(
         &self,
-        books: &[book_files::Model],
+        books: &[BookCoverSource],
         mut on_progress: F,
     ) -> std::io::Result<usize>
     where
         F: FnMut(String),
     {
-        let jobs: Vec<(&book_files::Model, Option<String>)> = books
+        let width = self.config().cover_width;
+        let jobs: Vec<CoverJob> = books
             .iter()
             .filter_map(|book| {
-                if book.kind == "pdf" {
-                    Some((book, None))
+                let source_image_path = if book.kind == "pdf" {
+                    None
                 } else {
-                    book.cover_path
-                        .clone()
-                        .or_else(|| first_image_path(book))
-                        .map(|source_image_path| (book, Some(source_image_path)))
-                }
+                    Some(book.cover_image_path.clone()?)
+                };
+                Some(CoverJob {
+                    book_path: book.path.clone(),
+                    title: book.title.clone().unwrap_or_else(|| book.path.clone()),
+                    source_image_path,
+                })
             })
+            .filter(|job| !self.cover_cache_path(&job.book_path, width).exists())
             .collect();
 
         let total = jobs.len();
@@ -246,31 +301,47 @@ impl AssetCacheService {
             return Ok(0);
         }
 
+        // 渲染并发由 render_limiter 控制，这里只保持同样数量的任务在途
+        let concurrency = self.config().max_render_jobs.max(1);
+        let mut pending = jobs.into_iter();
+        let mut in_flight = tokio::task::JoinSet::new();
+        let mut finished = 0usize;
         let mut generated = 0usize;
 
-        for (index, (book, source_image_path)) in jobs.iter().enumerate() {
-            let title = book.title.clone().unwrap_or_else(|| book.path.clone());
-            let cache_path = self.cover_cache_path(&book.path);
-            if cache_path.exists() {
-                continue;
+        loop {
+            while in_flight.len() < concurrency {
+                let Some(job) = pending.next() else {
+                    break;
+                };
+                let service = self.clone();
+                in_flight.spawn(async move {
+                    let result = match job.source_image_path.as_deref() {
+                        Some(source_image_path) => {
+                            service
+                                .get_or_create_image_cover(&job.book_path, source_image_path, width)
+                                .await
+                        }
+                        None => service.get_or_create_pdf_cover(&job.book_path, width).await,
+                    };
+                    (job, result)
+                });
             }
 
-            let result = match source_image_path.as_deref() {
-                Some(source_image_path) => {
-                    self.get_or_create_image_cover(&book.path, source_image_path)
-                        .await
-                }
-                None => self.get_or_create_pdf_cover(&book.path).await,
+            let Some(joined) = in_flight.join_next().await else {
+                break;
             };
-
-            match result {
-                Ok(_) => {
+            finished += 1;
+            match joined {
+                Ok((job, Ok(_))) => {
                     generated += 1;
-                    on_progress(format!("已生成封面 {}/{}: {}", index + 1, total, title));
+                    on_progress(format!("已生成封面 {}/{}: {}", finished, total, job.title));
+                }
+                Ok((job, Err(err))) => {
+                    on_progress(format!("封面生成失败: {} ({})", job.book_path, err));
+                    tracing::warn!("failed to precompute cover for {}: {}", job.book_path, err);
                 }
                 Err(err) => {
-                    on_progress(format!("封面生成失败: {} ({})", book.path, err));
-                    tracing::warn!("failed to precompute cover for {}: {}", book.path, err);
+                    tracing::warn!("cover precompute task failed: {}", err);
                 }
             }
         }
@@ -296,40 +367,51 @@ impl AssetCacheService {
         self.clear_cache(CacheClearTarget::All).await
     }
 
+    /// 清空缓存目录，返回释放的空间（MB）
+    ///
+    /// 目录只是改名移走并重建为空目录，实际删除文件在后台线程进行，
+    /// 请求不必等待成千上万次 unlink 完成。改名前先等在途的缓存生成写完。
     pub async fn clear_cache(&self, target: CacheClearTarget) -> std::io::Result<f64> {
-        let cover_root = self.root_dir.join("covers");
-        let image_page_root = self.root_dir.join("image_pages");
-        let pdf_svg_root = self.root_dir.join("pdf_svg");
-        tokio::task::spawn_blocking(move || {
+        let root_dir = self.root_dir.clone();
+        let cover_root = self.cover_root.clone();
+        let image_page_root = self.image_page_root.clone();
+        let pdf_svg_root = self.pdf_svg_root.clone();
+        let clearing = self.clearing.write().await;
+        let freed_mb = tokio::task::spawn_blocking(move || {
             let mut freed_mb = 0.0;
             match target {
                 CacheClearTarget::All => {
-                    freed_mb += clear_directory_and_measure_mb(&cover_root)?;
-                    freed_mb += clear_directory_and_measure_mb(&image_page_root)?;
-                    freed_mb += clear_directory_and_measure_mb(&pdf_svg_root)?;
+                    freed_mb += detach_directory_and_measure_mb(&cover_root)?;
+                    freed_mb += detach_directory_and_measure_mb(&image_page_root)?;
+                    freed_mb += detach_directory_and_measure_mb(&pdf_svg_root)?;
                 }
                 CacheClearTarget::Covers => {
-                    freed_mb += clear_directory_and_measure_mb(&cover_root)?;
+                    freed_mb += detach_directory_and_measure_mb(&cover_root)?;
                 }
                 CacheClearTarget::ImagePages => {
-                    freed_mb += clear_directory_and_measure_mb(&image_page_root)?;
+                    freed_mb += detach_directory_and_measure_mb(&image_page_root)?;
                 }
                 CacheClearTarget::PdfSvg => {
-                    freed_mb += clear_directory_and_measure_mb(&pdf_svg_root)?;
+                    freed_mb += detach_directory_and_measure_mb(&pdf_svg_root)?;
                 }
             }
-            Ok(freed_mb)
+            Ok::<_, std::io::Error>(freed_mb)
         })
         .await
-        .map_err(|err| std::io::Error::other(err.to_string()))?
+        .map_err(|err| std::io::Error::other(err.to_string()))??;
+        drop(clearing);
+
+        tokio::task::spawn_blocking(move || remove_trashed_directories(&root_dir));
+        Ok(freed_mb)
     }
 
     pub async fn delete_book_cache(&self, book_path: &str) -> std::io::Result<()> {
-        let cover_path = self.cover_cache_path(book_path);
-        let image_page_dir = self.book_cache_dir("image_pages", book_path);
-        let pdf_svg_dir = self.book_cache_dir("pdf_svg", book_path);
+        let cover_root = self.cover_root.clone();
+        let cover_prefix = cover_cache_prefix(book_path);
+        let image_page_dir = book_cache_dir(&self.image_page_root, book_path);
+        let pdf_svg_dir = book_cache_dir(&self.pdf_svg_root, book_path);
         tokio::task::spawn_blocking(move || {
-            remove_file_if_exists(&cover_path)?;
+            remove_cover_variants(&cover_root, &cover_prefix)?;
             remove_dir_if_exists(&image_page_dir)?;
             remove_dir_if_exists(&pdf_svg_dir)?;
             Ok(())
@@ -339,20 +421,16 @@ impl AssetCacheService {
     }
 
     pub async fn stats(&self) -> std::io::Result<AssetCacheStats> {
-        let cover_root = self.root_dir.join("covers");
-        let image_page_root = self.root_dir.join("image_pages");
-        let pdf_svg_root = self.root_dir.join("pdf_svg");
-        let cover_stats = tokio::task::spawn_blocking(move || directory_stats(&cover_root))
-            .await
-            .map_err(|err| std::io::Error::other(err.to_string()))??;
-        let image_page_stats =
-            tokio::task::spawn_blocking(move || directory_stats(&image_page_root))
-                .await
-                .map_err(|err| std::io::Error::other(err.to_string()))??;
-        let pdf_svg_stats = tokio::task::spawn_blocking(move || directory_stats(&pdf_svg_root))
-            .await
-            .map_err(|err| std::io::Error::other(err.to_string()))??;
-        let pdf_render = self.pdf_renderer.stats().await?;
+        let cover_root = self.cover_root.clone();
+        let image_page_root = self.image_page_root.clone();
+        let pdf_svg_root = self.pdf_svg_root.clone();
+        // 三个缓存目录在各自的阻塞线程上同时遍历，磁盘延迟互相重叠
+        let (cover_stats, image_page_stats, pdf_svg_stats, pdf_render) = tokio::try_join!(
+            directory_stats_blocking(cover_root),
+            directory_stats_blocking(image_page_root),
+            directory_stats_blocking(pdf_svg_root),
+            self.pdf_renderer.stats()
+        )?;
 
         Ok(AssetCacheStats {
             root_dir: self.root_dir.clone(),
@@ -366,71 +444,95 @@ impl AssetCacheService {
         })
     }
 
-    fn cover_cache_path(&self, book_path: &str) -> PathBuf {
-        self.root_dir
-            .join("covers")
-            .join(format!("{}.jpg", hash_key(book_path)))
+    /// 封面文件名带上宽度：调整封面宽度后按新尺寸重新生成，不再返回旧尺寸的封面
+    fn cover_cache_path(&self, book_path: &str, width: u32) -> PathBuf {
+        self.cover_root
+            .join(format!("{}{}.jpg", cover_cache_prefix(book_path), width))
     }
 
     fn pdf_svg_cache_path(&self, book_path: &str, page: usize) -> PathBuf {
-        self.root_dir
-            .join("pdf_svg")
-            .join(cache_book_dir_name(book_path))
-            .join(format!("page-{}.svg", page))
+        let mut path = book_cache_dir(&self.pdf_svg_root, book_path);
+        path.push(format!("page-{}.svg", page));
+        path
     }
 
+    /// 文件名带上源图片路径的哈希：页序变化（例如排序规则调整）后同一页码对应另一张图片，
+    /// 不会再返回按旧页序生成的预览
     fn image_page_cache_path(
         &self,
         book_path: &str,
         page_index: usize,
+        page_path: &str,
         width: u32,
         ext: &str,
     ) -> PathBuf {
-        self.root_dir
-            .join("image_pages")
-            .join(cache_book_dir_name(book_path))
-            .join(format!("page-{}-w{}.{}", page_index + 1, width, ext))
+        let mut path = book_cache_dir(&self.image_page_root, book_path);
+        path.push(format!(
+            "page-{}-{:x}-w{}.{}",
+            page_index + 1,
+            hash_key(page_path),
+            width,
+            ext
+        ));
+        path
     }
+}
 
-    fn book_cache_dir(&self, category: &str, book_path: &str) -> PathBuf {
-        self.root_dir
-            .join(category)
-            .join(cache_book_dir_name(book_path))
-    }
+fn book_cache_dir(cache_root: &Path, book_path: &str) -> PathBuf {
+    cache_root.join(cache_book_dir_name(book_path))
 }
 
-fn create_image_cover(source_path: &str, target_path: &Path, width: u32) -> std::io::Result<()> {
-    let file = File::open(source_path)?;
-    let reader = image::ImageReader::new(BufReader::new(file))
-        .with_guessed_format()
-        .map_err(|err| std::io::Error::other(err.to_string()))?;
-    let image = reader
-        .decode()
-        .map_err(|err| std::io::Error::other(err.to_string()))?;
-    let rgb = image.into_rgb8();
-    let (src_width, src_height) = rgb.dimensions();
-    let (dst_width, dst_height) = resized_cover_dimensions(src_width, src_height, width);
+/// `generating` 中某个路径的锁；最后一个持有者释放时把条目从表中移除
+struct GeneratingKey<'a> {
+    generating: &'a Mutex<HashMap<PathBuf, Arc<tokio::sync::Mutex<()>>>>,
+    path: &'a Path,
+    lock: Arc<tokio::sync::Mutex<()>>,
+}
 
-    let resized_bytes = if (src_width, src_height) == (dst_width, dst_height) {
-        rgb.into_raw()
-    } else {
-        resize_rgb_image(rgb, dst_width, dst_height)?
-    };
+impl<'a> GeneratingKey<'a> {
+    fn acquire(
+        generating: &'a Mutex<HashMap<PathBuf, Arc<tokio::sync::Mutex<()>>>>,
+        path: &'a Path,
+    ) -> Self {
+        let lock = generating
+            .lock()
+            .unwrap_or_else(|err| err.into_inner())
+            .entry(path.to_path_buf())
+            .or_default()
+            .clone();
+        Self {
+            generating,
+            path,
+            lock,
+        }
+    }
+}
 
-    if let Some(parent) = target_path.parent() {
-        std::fs::create_dir_all(parent)?;
-    }
-    let file = File::create(target_path)?;
-    let writer = BufWriter::new(file);
-    let mut encoder = JpegEncoder::new_with_quality(writer, 85);
-    encoder
-        .encode(
-            &resized_bytes,
-            dst_width,
-            dst_height,
-            ExtendedColorType::Rgb8,
-        )
-        .map_err(|err| std::io::Error::other(err.to_string()))
+impl Drop for GeneratingKey<'_> {
+    fn drop(&mut self) {
+        let mut generating = self
+            .generating
+            .lock()
+            .unwrap_or_else(|err| err.into_inner());
+        // 表中一份、自己一份：没有其他请求在等待
+        if Arc::strong_count(&self.lock) == 2 {
+            generating.remove(self.path);
+        }
+    }
+}
+
+fn create_image_cover(source_path: &str, target_path: &Path, width: u32) -> std::io::Result<()> {
+    let (pixels, dst_width, dst_height) =
+        load_resized_rgb(source_path, |src_width, src_height| {
+            resized_cover_dimensions(src_width, src_height, width)
+        })?;
+    write_jpeg(
+        target_path,
+        pixels.as_bytes(),
+        dst_width,
+        dst_height,
+        COVER_JPEG_QUALITY,
+    )
 }
 
 fn create_image_page_preview(
@@ -438,55 +540,147 @@ fn create_image_page_preview(
     target_path: &Path,
     width: u32,
 ) -> std::io::Result<()> {
-    let file = File::open(source_path)?;
-    let reader = image::ImageReader::new(BufReader::new(file))
+    let (pixels, dst_width, dst_height) =
+        load_resized_rgb(source_path, |src_width, src_height| {
+            resized_fit_width(src_width, src_height, width)
+        })?;
+    write_jpeg(
+        target_path,
+        pixels.as_bytes(),
+        dst_width,
+        dst_height,
+        IMAGE_PAGE_PREVIEW_JPEG_QUALITY,
+    )
+}
+
+/// 缩放后的 RGB 像素；MuPDF 渲染的结果直接借用 pixmap 的缓冲区，编码前不再复制一份
+enum RgbPixels {
+    Decoded(Vec<u8>),
+    Rendered(Pixmap),
+}
+
+impl RgbPixels {
+    fn as_bytes(&self) -> &[u8] {
+        match self {
+            Self::Decoded(bytes) => bytes,
+            Self::Rendered(pixmap) => pixmap.samples(),
+        }
+    }
+}
+
+/// 读取图片并缩放到 `fit` 给出的尺寸，返回 RGB 像素与宽高
+///
+/// JPEG 缩小到一半以下时交给 MuPDF 按目标尺寸解码：MuPDF 会让 libjpeg 在 DCT 阶段
+/// 直接按 1/2、1/4、1/8 解码，不必先解出整张原图再缩放。失败时回退到完整解码。
+/// 完整解码按 EXIF 方向旋转；带非默认方向的 JPEG 不走 MuPDF，封面与预览的朝向一致。
+fn load_resized_rgb(
+    source_path: &str,
+    fit: impl Fn(u32, u32) -> (u32, u32),
+) -> std::io::Result<(RgbPixels, u32, u32)> {
+    let reader = image::ImageReader::new(BufReader::new(File::open(source_path)?))
         .with_guessed_format()
         .map_err(|err| std::io::Error::other(err.to_string()))?;
-    let image = reader
-        .decode()
+    let is_jpeg = reader.format() == Some(image::ImageFormat::Jpeg);
+    let mut decoder = reader
+        .into_decoder()
         .map_err(|err| std::io::Error::other(err.to_string()))?;
+    let orientation = decoder.orientation().unwrap_or(Orientation::NoTransforms);
+    if is_jpeg && matches!(orientation, Orientation::NoTransforms) {
+        let (src_width, src_height) = decoder.dimensions();
+        let (dst_width, _) = fit(src_width, src_height);
+        if src_width >= dst_width.saturating_mul(2) {
+            match decode_jpeg_scaled(source_path, dst_width) {
+                Ok(scaled) => return Ok(scaled),
+                Err(err) => tracing::debug!(
+                    "scaled jpeg decode failed for {}, decoding full image: {}",
+                    source_path,
+                    err
+                ),
+            }
+        }
+    }
+    decode_and_resize(decoder, orientation, fit)
+}
+
+fn decode_and_resize(
+    decoder: impl ImageDecoder,
+    orientation: Orientation,
+    fit: impl Fn(u32, u32) -> (u32, u32),
+) -> std::io::Result<(RgbPixels, u32, u32)> {
+    let mut image = DynamicImage::from_decoder(decoder)
+        .map_err(|err| std::io::Error::other(err.to_string()))?;
+    image.apply_orientation(orientation);
     let rgb = image.into_rgb8();
     let (src_width, src_height) = rgb.dimensions();
-    let (dst_width, dst_height) = resized_fit_width(src_width, src_height, width);
+    let (dst_width, dst_height) = fit(src_width, src_height);
     let resized_bytes = if (src_width, src_height) == (dst_width, dst_height) {
         rgb.into_raw()
     } else {
         resize_rgb_image(rgb, dst_width, dst_height)?
     };
+    Ok((RgbPixels::Decoded(resized_bytes), dst_width, dst_height))
+}
 
-    if let Some(parent) = target_path.parent() {
-        std::fs::create_dir_all(parent)?;
+/// 用 MuPDF 把 JPEG 作为单页文档、按目标宽度渲染
+fn decode_jpeg_scaled(source_path: &str, dst_width: u32) -> std::io::Result<(RgbPixels, u32, u32)> {
+    let document = Document::open(source_path).map_err(mupdf_to_io_error)?;
+    let page = document.load_page(0).map_err(mupdf_to_io_error)?;
+    let bounds = page.bounds().map_err(mupdf_to_io_error)?;
+    let raw_width = (bounds.x1 - bounds.x0).abs().max(1.0);
+    let scale = dst_width.max(1) as f32 / raw_width;
+    let pixmap = page
+        .to_pixmap(
+            &Matrix::new_scale(scale, scale),
+            &Colorspace::device_rgb(),
+            false,
+            false,
+        )
+        .map_err(mupdf_to_io_error)?;
+    if pixmap.n() != 3 {
+        return Err(std::io::Error::other(format!(
+            "unsupported pixmap channel count: {}",
+            pixmap.n()
+        )));
     }
+    let (width, height) = (pixmap.width(), pixmap.height());
+    Ok((RgbPixels::Rendered(pixmap), width, height))
+}
 
-    let file = File::create(target_path)?;
-    let writer = BufWriter::new(file);
-    let mut encoder = JpegEncoder::new_with_quality(writer, 85);
-    encoder
-        .encode(
-            &resized_bytes,
-            dst_width,
-            dst_height,
-            ExtendedColorType::Rgb8,
-        )
-        .map_err(|err| std::io::Error::other(err.to_string()))
+fn mupdf_to_io_error(err: mupdf::Error) -> std::io::Error {
+    std::io::Error::other(err.to_string())
 }
 
-async fn run_image_cover_job(
-    source_path: String,
-    target_path: PathBuf,
+/// 封面只生成一次、长期缓存，保留较高质量
+const COVER_JPEG_QUALITY: u8 = 85;
+/// 图片页预览数量多、生成频繁，质量 80 时编码更快、文件更小，阅读时看不出差别
+const IMAGE_PAGE_PREVIEW_JPEG_QUALITY: u8 = 80;
+
+fn write_jpeg(
+    target_path: &Path,
+    bytes: &[u8],
     width: u32,
+    height: u32,
+    quality: u8,
 ) -> std::io::Result<()> {
-    let (tx, rx) = tokio::sync::oneshot::channel();
-    std::thread::Builder::new()
-        .name("auxm-image-cover".to_string())
-        .spawn(move || {
-            let result = create_image_cover(&source_path, &target_path, width);
-            let _ = tx.send(result);
-        })
-        .map_err(|err| std::io::Error::other(err.to_string()))?;
+    crate::runtime::write_cache_file(target_path, |file| {
+        let mut writer = BufWriter::new(file);
+        JpegEncoder::new_with_quality(&mut writer, quality)
+            .encode(bytes, width, height, ExtendedColorType::Rgb8)
+            .map_err(|err| std::io::Error::other(err.to_string()))?;
+        writer.flush()
+    })
+}
 
-    rx.await
-        .map_err(|_| std::io::Error::other("image cover worker stopped unexpectedly"))?
+/// 在 tokio 的阻塞线程池上执行图片解码、缩放与编码
+///
+/// 线程复用，不再为每个任务新建系统线程；同时执行的数量由调用方持有的
+/// `render_limiter` 许可限制，不会占满阻塞线程池或挤占请求处理。
+async fn run_render_job(
+    job: impl FnOnce() -> std::io::Result<()> + Send + 'static,
+) -> std::io::Result<()> {
+    tokio::task::spawn_blocking(job)
+        .await
+        .map_err(|err| std::io::Error::other(format!("image render job failed: {err}")))?
 }
 
 fn resized_cover_dimensions(src_width: u32, src_height: u32, target_width: u32) -> (u32, u32) {
@@ -537,10 +731,11 @@ fn resize_rgb_image(rgb: RgbImage, dst_width: u32, dst_height: u32) -> std::io::
     Ok(dst.into_vec())
 }
 
-fn hash_key(value: &str) -> String {
+/// 缓存文件名用的路径哈希；直接返回数值，由调用方在拼文件名时一次性格式化为十六进制
+fn hash_key(value: &str) -> u64 {
     let mut hasher = std::collections::hash_map::DefaultHasher::new();
     value.hash(&mut hasher);
-    format!("{:x}", hasher.finish())
+    hasher.finish()
 }
 
 fn cache_book_dir_name(book_path: &str) -> String {
@@ -564,47 +759,131 @@ fn cache_book_dir_name(book_path: &str) -> String {
     } else {
         sanitized
     };
-    format!("{}-{}", sanitized, hash_key(book_path))
+    format!("{}-{:x}", sanitized, hash_key(book_path))
 }
 
-fn clear_directory_and_measure_mb(dir: &Path) -> std::io::Result<f64> {
+/// 改名移走待删除目录时附加的后缀标记
+const TRASH_MARKER: &str = ".trash-";
+
+/// 统计目录大小后把它改名为同级的 `*.trash-*` 目录，并在原位置重建空目录
+fn detach_directory_and_measure_mb(dir: &Path) -> std::io::Result<f64> {
     if !dir.exists() {
         return Ok(0.0);
     }
 
     let bytes = directory_size_bytes(dir)?;
-    std::fs::remove_dir_all(dir)?;
+    let nanos = std::time::SystemTime::now()
+        .duration_since(std::time::UNIX_EPOCH)
+        .map(|elapsed| elapsed.as_nanos())
+        .unwrap_or_default();
+    let mut trashed = dir.as_os_str().to_owned();
+    trashed.push(format!("{TRASH_MARKER}{nanos:x}"));
+    std::fs::rename(dir, &trashed)?;
     std::fs::create_dir_all(dir)?;
     Ok(bytes_to_mb(bytes))
 }
 
+/// 删除缓存根目录下所有改名移走的目录（也会清理上次中途退出时残留的）
+///
+/// 各个目录互不相干，每个目录用一个线程删除，清空全部缓存时三类缓存同时删。
+fn remove_trashed_directories(root_dir: &Path) {
+    let entries = match std::fs::read_dir(root_dir) {
+        Ok(entries) => entries,
+        Err(err) => {
+            tracing::warn!("failed to list cache root {}: {}", root_dir.display(), err);
+            return;
+        }
+    };
+    let trashed: Vec<PathBuf> = entries
+        .flatten()
+        .filter(|entry| entry.file_name().to_string_lossy().contains(TRASH_MARKER))
+        .map(|entry| entry.path())
+        .collect();
+    std::thread::scope(|scope| {
+        for path in &trashed {
+            scope.spawn(move || {
+                if let Err(err) = std::fs::remove_dir_all(path) {
+                    tracing::warn!("failed to remove cleared cache {}: {}", path.display(), err);
+                }
+            });
+        }
+    });
+}
+
+/// 递归删除其他进程（即已退出的旧进程）留下的 `write_cache_file` 临时文件
+///
+/// 本进程的临时文件可能正在写入，保留不动。
+fn remove_stale_temp_files(dir: &Path) {
+    let Ok(entries) = std::fs::read_dir(dir) else {
+        return;
+    };
+    let current_pid = std::process::id();
+    for entry in entries.flatten() {
+        let Ok(file_type) = entry.file_type() else {
+            continue;
+        };
+        if file_type.is_dir() {
+            remove_stale_temp_files(&entry.path());
+        } else if crate::runtime::cache_temp_file_pid(&entry.file_name())
+            .is_some_and(|pid| pid != current_pid)
+        {
+            let path = entry.path();
+            if let Err(err) = remove_file_if_exists(&path) {
+                tracing::warn!(
+                    "failed to remove stale cache temp file {}: {}",
+                    path.display(),
+                    err
+                );
+            }
+        }
+    }
+}
+
+/// 直接删除，不存在时视为成功；不再先 `exists()` 多做一次 stat
 fn remove_dir_if_exists(dir: &Path) -> std::io::Result<()> {
-    if dir.exists() {
-        std::fs::remove_dir_all(dir)?;
+    ignore_not_found(std::fs::remove_dir_all(dir))
+}
+
+/// 同一本书所有宽度的封面文件名共同的前缀：`{hash:x}-w`
+fn cover_cache_prefix(book_path: &str) -> String {
+    format!("{:x}-w", hash_key(book_path))
+}
+
+/// 删除这本书每种宽度的封面；调整过封面宽度后，旧宽度的文件也一并清掉
+///
+/// 写入中的临时文件留给启动清理处理，不和正在进行的写入抢同一个文件。
+fn remove_cover_variants(cover_root: &Path, prefix: &str) -> std::io::Result<()> {
+    let entries = match std::fs::read_dir(cover_root) {
+        Ok(entries) => entries,
+        Err(err) if err.kind() == std::io::ErrorKind::NotFound => return Ok(()),
+        Err(err) => return Err(err),
+    };
+    for entry in entries {
+        let entry = entry?;
+        let name = entry.file_name();
+        let Some(name) = name.to_str() else {
+            continue;
+        };
+        if name.starts_with(prefix) && name.ends_with(".jpg") {
+            remove_file_if_exists(&entry.path())?;
+        }
     }
     Ok(())
 }
 
 fn remove_file_if_exists(path: &Path) -> std::io::Result<()> {
-    if path.exists() {
-        std::fs::remove_file(path)?;
+    ignore_not_found(std::fs::remove_file(path))
+}
+
+fn ignore_not_found(result: std::io::Result<()>) -> std::io::Result<()> {
+    match result {
+        Err(err) if err.kind() == std::io::ErrorKind::NotFound => Ok(()),
+        result => result,
     }
-    Ok(())
 }
 
 fn directory_size_bytes(dir: &Path) -> std::io::Result<u64> {
-    let mut total = 0u64;
-    for entry in std::fs::read_dir(dir)? {
-        let entry = entry?;
-        let path = entry.path();
-        let metadata = entry.metadata()?;
-        if metadata.is_dir() {
-            total = total.saturating_add(directory_size_bytes(&path)?);
-        } else {
-            total = total.saturating_add(metadata.len());
-        }
-    }
-    Ok(total)
+    Ok(directory_stats(dir)?.bytes)
 }
 
 struct DirectoryStats {
@@ -612,34 +891,167 @@ struct DirectoryStats {
     bytes: u64,
 }
 
+/// 递归统计目录下的文件数与字节数；目录不存在时视为空
+///
+/// 子目录由 `DirEntry::file_type` 判断（多数文件系统随目录项一起返回，不需要 stat），
+/// 只对文件读取元数据取大小。尚未改名发布的缓存临时文件不计入。
 fn directory_stats(dir: &Path) -> std::io::Result<DirectoryStats> {
-    if !dir.exists() {
-        return Ok(DirectoryStats { files: 0, bytes: 0 });
-    }
-
     let mut stats = DirectoryStats { files: 0, bytes: 0 };
-    for entry in std::fs::read_dir(dir)? {
+    let entries = match std::fs::read_dir(dir) {
+        Ok(entries) => entries,
+        Err(err) if err.kind() == std::io::ErrorKind::NotFound => return Ok(stats),
+        Err(err) => return Err(err),
+    };
+    for entry in entries {
         let entry = entry?;
-        let path = entry.path();
-        let metadata = entry.metadata()?;
-        if metadata.is_dir() {
-            let child = directory_stats(&path)?;
+        if entry.file_type()?.is_dir() {
+            let child = directory_stats(&entry.path())?;
             stats.files += child.files;
             stats.bytes = stats.bytes.saturating_add(child.bytes);
-        } else {
+        } else if crate::runtime::cache_temp_file_pid(&entry.file_name()).is_none() {
             stats.files += 1;
-            stats.bytes = stats.bytes.saturating_add(metadata.len());
+            stats.bytes = stats.bytes.saturating_add(entry.metadata()?.len());
         }
     }
     Ok(stats)
 }
 
+async fn directory_stats_blocking(dir: PathBuf) -> std::io::Result<DirectoryStats> {
+    tokio::task::spawn_blocking(move || directory_stats(&dir))
+        .await
+        .map_err(|err| std::io::Error::other(err.to_string()))?
+}
+
 fn bytes_to_mb(bytes: u64) -> f64 {
     bytes as f64 / (1024.0 * 1024.0)
 }
 
-fn first_image_path(book: &book_files::Model) -> Option<String> {
-    serde_json::from_str::<Vec<String>>(book.pages_json.as_deref().unwrap_or("[]"))
-        .ok()
-        .and_then(|pages| pages.into_iter().next())
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    /// 在 SOI 之后插入只含方向标签的 EXIF APP1 段
+    fn with_exif_orientation(jpeg: &[u8], orientation: u16) -> Vec<u8> {
+        let mut tiff =
+            b"MM\x00\x2a\x00\x00\x00\x08\x00\x01\x01\x12\x00\x03\x00\x00\x00\x01".to_vec();
+        tiff.extend_from_slice(&orientation.to_be_bytes());
+        tiff.extend_from_slice(&[0, 0, 0, 0, 0, 0]);
+        let segment_len = (2 + 6 + tiff.len()) as u16;
+
+        let mut out = jpeg[..2].to_vec();
+        out.extend_from_slice(&[0xff, 0xe1]);
+        out.extend_from_slice(&segment_len.to_be_bytes());
+        out.extend_from_slice(b"Exif\x00\x00");
+        out.extend_from_slice(&tiff);
+        out.extend_from_slice(&jpeg[2..]);
+        out
+    }
+
+    #[test]
+    fn load_resized_rgb_applies_exif_orientation_before_fit(
+    ) -> Result<(), Box<dyn std::error::Error>> {
+        let temp_dir = tempfile::tempdir()?;
+        let path = temp_dir.path().join("rotated.jpg");
+        let mut jpeg = Vec::new();
+        JpegEncoder::new_with_quality(&mut jpeg, 90).encode(
+            &vec![128u8; 64 * 32 * 3],
+            64,
+            32,
+            ExtendedColorType::Rgb8,
+        )?;
+        // 6 = 顺时针旋转 90 度显示
+        std::fs::write(&path, with_exif_orientation(&jpeg, 6))?;
+
+        // 缩小到四分之一，原本会走 MuPDF 的缩放解码路径
+        let (pixels, width, height) =
+            load_resized_rgb(&path.to_string_lossy(), |src_width, src_height| {
+                (src_width / 4, src_height / 4)
+            })?;
+        assert_eq!((width, height), (8, 16));
+        assert_eq!(pixels.as_bytes().len(), 8 * 16 * 3);
+        Ok(())
+    }
+
+    #[tokio::test]
+    async fn image_page_preview_follows_page_order_after_rescan(
+    ) -> Result<(), Box<dyn std::error::Error>> {
+        let library = tempfile::tempdir()?;
+        let cache = tempfile::tempdir()?;
+        for (name, shade) in [("1.jpg", 0u8), ("2.jpg", 96), ("10.jpg", 192)] {
+            let mut jpeg = Vec::new();
+            JpegEncoder::new_with_quality(&mut jpeg, 90).encode(
+                &[shade; 8 * 8 * 3],
+                8,
+                8,
+                ExtendedColorType::Rgb8,
+            )?;
+            std::fs::write(library.path().join(name), jpeg)?;
+        }
+        let service = AssetCacheService::with_root_dir(
+            cache.path().to_path_buf(),
+            CacheConfig::default(),
+            1,
+        )?;
+        let book_path = library.path().to_string_lossy().to_string();
+        let page_path = |name: &str| library.path().join(name).to_string_lossy().to_string();
+
+        // 旧版按字符串排序，第 2 页是 10.jpg；重新扫描按自然顺序排序后第 2 页是 2.jpg
+        let before = service
+            .get_or_create_image_page_preview(&book_path, 1, &page_path("10.jpg"))
+            .await?;
+        let after = service
+            .get_or_create_image_page_preview(&book_path, 1, &page_path("2.jpg"))
+            .await?;
+        assert_ne!(before, after);
+        let shade = image::open(&after)?.into_rgb8().get_pixel(0, 0)[0];
+        assert!(shade.abs_diff(96) < 16, "preview shade {shade}");
+        Ok(())
+    }
+
+    #[test]
+    fn stale_cache_temp_files_are_swept_and_not_counted() -> Result<(), Box<dyn std::error::Error>>
+    {
+        let cache = tempfile::tempdir()?;
+        let book_dir = cache.path().join("book");
+        std::fs::create_dir_all(&book_dir)?;
+        let published = book_dir.join("page-1.svg");
+        let own_temp = book_dir.join(format!("page-2.svg.tmp-{}-0", std::process::id()));
+        let stale_temp = book_dir.join(format!("page-3.svg.tmp-{}-7", u32::MAX));
+        for path in [&published, &own_temp, &stale_temp] {
+            std::fs::write(path, b"<svg/>")?;
+        }
+
+        let stats = directory_stats(cache.path())?;
+        assert_eq!((stats.files, stats.bytes), (1, 6));
+
+        remove_stale_temp_files(cache.path());
+        assert!(published.exists());
+        assert!(own_temp.exists());
+        assert!(!stale_temp.exists());
+        Ok(())
+    }
+
+    #[tokio::test]
+    async fn delete_book_cache_removes_covers_of_every_width(
+    ) -> Result<(), Box<dyn std::error::Error>> {
+        let cache = tempfile::tempdir()?;
+        let service = AssetCacheService::with_root_dir(
+            cache.path().to_path_buf(),
+            CacheConfig::default(),
+            1,
+        )?;
+        let old_width = service.cover_cache_path("/library/book", 240);
+        let new_width = service.cover_cache_path("/library/book", 320);
+        let other_book = service.cover_cache_path("/library/other", 240);
+        std::fs::create_dir_all(&service.cover_root)?;
+        for path in [&old_width, &new_width, &other_book] {
+            std::fs::write(path, b"jpeg")?;
+        }
+
+        service.delete_book_cache("/library/book").await?;
+        assert!(!old_width.exists());
+        assert!(!new_width.exists());
+        assert!(other_book.exists());
+        Ok(())
+    }
 }
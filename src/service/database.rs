@@ -7,17 +7,50 @@
 //! ローカルファイルとデータベースの同期を含む、データベース操作サービスを提供します。
 
 use crate::config::{CacheConfig, ScannerConfig};
-use crate::domain::{book_files, categories, libraries};
+use crate::domain::{
+    book_files, categories, libraries, BookCoverSource, BookListItem, BookPageSource,
+};
 use crate::scanner::{CachedBookMetadata, ConfigurableRecognizer, ScanResult, Scanner};
+use crate::service::SCHEMA_VERSION;
+use sea_orm::sea_query::{Expr, OnConflict, SimpleExpr};
+use sea_orm::sqlx::sqlite::{SqliteConnectOptions, SqliteJournalMode, SqliteSynchronous};
 use sea_orm::{
-    ActiveModelTrait, ColumnTrait, ConnectOptions, ConnectionTrait, DatabaseConnection, DbErr,
-    EntityTrait, PaginatorTrait, QueryFilter, QueryOrder, Statement, TransactionTrait,
+    ColumnTrait, ConnectOptions, ConnectionTrait, DatabaseConnection, DbErr, EntityTrait,
+    PaginatorTrait, QueryFilter, QueryOrder, QuerySelect, Select, Statement, TransactionTrait,
 };
 use serde::Serialize;
-use std::collections::HashMap;
+use std::collections::{HashMap, HashSet};
 use std::path::Path;
 use std::sync::{Arc, RwLock};
 use std::time::Duration;
+use tokio_stream::StreamExt;
+
+/// 同期時にまとめて書き込む 1 ステートメントあたりの最大行数
+///
+/// book_files は最大 15 列（UPSERT 時は id を含む）なので、SQLite のバインド変数上限を超えない範囲に収める。
+const SYNC_BATCH_SIZE: usize = 500;
+
+/// library を登録し、その ID を返す（root_path が既に登録済みなら既存行の ID）
+const UPSERT_LIBRARY_SQL: &str = "\
+INSERT INTO libraries (name, root_path, last_scanned_at) VALUES (?, ?, ?)
+ON CONFLICT(root_path) DO UPDATE SET last_scanned_at = excluded.last_scanned_at
+RETURNING id";
+
+/// ロック待ちの上限。ライターの長いコミットと重なっても、すぐに SQLITE_BUSY で失敗させない
+const SQLITE_BUSY_TIMEOUT: Duration = Duration::from_secs(5);
+
+/// 指定カテゴリとその子孫カテゴリの id を返すサブクエリ（`category_id IN (...)` の中身）
+///
+/// 子孫の展開は再帰 CTE で SQLite 側に任せる（parent_id / category_id の索引を使う）。
+/// `UNION` で重複を除くので、parent_id が循環していても展開は止まる。
+/// クエリビルダーでは再帰 CTE を簡潔に書けないため、この部分だけ SQL で書く。
+const CATEGORY_SUBTREE_IDS_SQL: &str = "\
+WITH RECURSIVE subtree(id) AS (
+    SELECT ?
+    UNION
+    SELECT categories.id FROM categories JOIN subtree ON categories.parent_id = subtree.id
+)
+SELECT id FROM subtree";
 
 /// データベースデータセット
 ///
@@ -35,12 +68,25 @@ pub struct DatabaseSnapshot {
     pub book_files: Vec<book_files::Model>,
 }
 
+/// 各テーブルの件数
+#[derive(Debug, Clone, Copy, Default, Serialize)]
+pub struct TableCounts {
+    pub libraries: usize,
+    pub categories: usize,
+    pub book_files: usize,
+}
+
+/// カテゴリツリーのノード
+///
+/// API レスポンスと同じ形でシリアライズされるので、キャッシュしたツリーをそのまま返せる。
 #[derive(Debug, Clone, Serialize)]
 pub struct CategoryNode {
     pub id: i64,
     pub name: String,
     pub path: String,
     pub book_count: usize,
+    /// 子孫カテゴリを含めた書籍数（ツリー構築時に一度だけ集計する）
+    pub total_book_count: usize,
     pub sub_categories: Vec<CategoryNode>,
 }
 
@@ -57,6 +103,19 @@ pub struct DiffData {
     pub updated_book_files: Vec<book_files::Model>,
 }
 
+impl DiffData {
+    /// ファイルシステムと DB が一致しており、書き込みが一切不要かどうか
+    pub fn is_empty(&self) -> bool {
+        self.new_library_paths.is_empty()
+            && self.deleted_library_ids.is_empty()
+            && self.new_category_paths.is_empty()
+            && self.deleted_category_ids.is_empty()
+            && self.new_book_file_paths.is_empty()
+            && self.deleted_book_file_ids.is_empty()
+            && self.updated_book_files.is_empty()
+    }
+}
+
 #[derive(Debug, Clone, Serialize)]
 pub struct LibraryChangeDetail {
     pub path: String,
@@ -81,7 +140,7 @@ pub struct BookChangeDetail {
 /// 同期レポート
 ///
 /// 同期操作の結果統計を含みます。
-#[derive(Debug, Clone, Serialize)]
+#[derive(Debug, Clone, Default, Serialize)]
 pub struct SyncReport {
     pub inserted_libraries: usize,
     pub deleted_libraries: usize,
@@ -99,15 +158,102 @@ pub struct SyncReport {
     pub updated_book_file_details: Vec<BookChangeDetail>,
 }
 
+/// 書籍一覧のキーセット（シーク）方式ページングの位置
+///
+/// 前ページ最後の行の `(created_at, id)`。OFFSET と違い、深いページでも索引を
+/// その位置から辿るだけで済む。API では `encode` した 16 進文字列をそのまま受け渡す。
+/// created_at が NULL の行（SQLite では最小値として並ぶ）もカーソルにできる。
+#[derive(Debug, Clone, PartialEq, Eq)]
+pub struct BookCursor {
+    pub created_at: Option<String>,
+    pub id: i64,
+}
+
+impl BookCursor {
+    /// ページ最後の行からカーソルを作る
+    pub fn after(book: &BookListItem) -> Self {
+        Self {
+            created_at: book.created_at.clone(),
+            id: book.id,
+        }
+    }
+
+    /// URL にエスケープなしで載せられる 16 進文字列にする
+    pub fn encode(&self) -> String {
+        use std::fmt::Write;
+
+        // created_at が NULL のときは区切りの `|` ごと省く
+        let raw = match &self.created_at {
+            Some(created_at) => format!("{}|{}", self.id, created_at),
+            None => self.id.to_string(),
+        };
+        let mut encoded = String::with_capacity(raw.len() * 2);
+        for byte in raw.bytes() {
+            let _ = write!(encoded, "{byte:02x}");
+        }
+        encoded
+    }
+
+    /// `encode` の逆変換。形式が不正なら `None`
+    pub fn decode(value: &str) -> Option<Self> {
+        if value.len() % 2 != 0 {
+            return None;
+        }
+        let bytes = (0..value.len())
+            .step_by(2)
+            .map(|index| u8::from_str_radix(value.get(index..index + 2)?, 16).ok())
+            .collect::<Option<Vec<u8>>>()?;
+        let raw = String::from_utf8(bytes).ok()?;
+        let (id, created_at) = match raw.split_once('|') {
+            Some((id, created_at)) => (id, Some(created_at.to_string())),
+            None => (raw.as_str(), None),
+        };
+        Some(Self {
+            created_at,
+            id: id.parse().ok()?,
+        })
+    }
+}
+
+/// スキャン実行状態
+///
+/// バックグラウンドで走るスキャンの進行状況を API から参照するために保持します。
+#[derive(Debug, Clone, Default, Serialize)]
+pub struct ScanStatus {
+    pub running: bool,
+    pub last_started_at: Option<i64>,
+    pub last_finished_at: Option<i64>,
+    pub last_error: Option<String>,
+}
+
 /// データベースサービス
 ///
 /// データベース接続管理と、ローカルファイルとデータベース間の同期を担当します。
 #[derive(Clone)]
 pub struct DatabaseService {
+    /// 書き込み用（1 接続）。同期とお気に入り更新はこちらを使う
     db: DatabaseConnection,
+    /// 読み取り専用接続のプール
+    read_db: DatabaseConnection,
     persistent_path: String,
-    scanner_config: Arc<RwLock<ScannerConfig>>,
+    scanner_config: Arc<RwLock<Arc<ScannerConfig>>>,
     cache_config: Arc<RwLock<CacheConfig>>,
+    scan_status: Arc<RwLock<ScanStatus>>,
+    read_cache: Arc<RwLock<SyncedReadCache>>,
+    /// スキャンと同期を 1 本ずつ実行させるためのロック
+    scan_lock: Arc<tokio::sync::Mutex<()>>,
+}
+
+/// 同期でしか変わらない読み取り結果のメモリキャッシュ
+///
+/// カテゴリツリーと各テーブルの件数はお気に入り更新では変わらないので、
+/// 同期のコミット後に破棄するまで使い回す。
+/// `generation` は破棄のたびに進め、破棄前に読み始めた古い結果を書き戻さないようにする。
+#[derive(Default)]
+struct SyncedReadCache {
+    generation: u64,
+    category_tree: Option<Arc<Vec<CategoryNode>>>,
+    table_counts: Option<TableCounts>,
 }
 
 impl DatabaseService {
@@ -116,27 +262,47 @@ impl DatabaseService {
         ensure_database_file(&persistent_path)?;
 
         let file_url = format!("sqlite:{}", persistent_path);
-        let mut options = ConnectOptions::new(file_url);
-        options
-            .max_connections(config.internal.database_max_connections.max(1))
-            .min_connections(
-                config
-                    .internal
-                    .database_min_connections
-                    .min(config.internal.database_max_connections.max(1)),
-            )
-            .connect_timeout(Duration::from_secs(5))
-            .sqlx_logging(false);
-        let conn = sea_orm::Database::connect(options).await?;
-
-        Self::init_schema(&conn).await?;
-        Self::ensure_schema_columns(&conn).await?;
+        // 書き込みは 1 接続に直列化し、SQLite の書き込みロックを接続間で奪い合わせない
+        let mut writer_options = pool_options(&file_url, 1, 1);
+        writer_options.map_sqlx_sqlite_opts(tune_sqlite_connection);
+        let conn = sea_orm::Database::connect(writer_options).await?;
+
+        // 既に最新版のスキーマなら、起動のたびの DDL と table_info の確認を省く
+        if Self::schema_version(&conn).await? < SCHEMA_VERSION {
+            // DDL をまとめて 1 トランザクションで適用し、文ごとのコミット（fsync）を避ける
+            let txn = conn.begin().await?;
+            Self::init_schema(&txn).await?;
+            Self::ensure_schema_columns(&txn).await?;
+            txn.execute_unprepared(&format!("PRAGMA user_version = {SCHEMA_VERSION}"))
+                .await?;
+            txn.commit().await?;
+        }
+        // 索引追加後の統計を更新する（必要なテーブルだけ ANALYZE されるので起動時でも軽い）
+        conn.execute_unprepared("PRAGMA optimize").await?;
+
+        // WAL では読み取り専用接続がライターのコミット中も並行して読める。
+        // SELECT だけのメソッドはこちらのプールを使う
+        let max_connections = config.internal.database_max_connections.max(1);
+        let mut reader_options = pool_options(
+            &file_url,
+            max_connections,
+            config
+                .internal
+                .database_min_connections
+                .min(max_connections),
+        );
+        reader_options.map_sqlx_sqlite_opts(tune_sqlite_reader_connection);
+        let read_db = sea_orm::Database::connect(reader_options).await?;
 
         Ok(Self {
             db: conn,
+            read_db,
             persistent_path,
-            scanner_config: Arc::new(RwLock::new(config.scanner.clone())),
+            scanner_config: Arc::new(RwLock::new(Arc::new(config.scanner.clone()))),
             cache_config: Arc::new(RwLock::new(config.cache.clone())),
+            scan_status: Arc::new(RwLock::new(ScanStatus::default())),
+            read_cache: Arc::new(RwLock::new(SyncedReadCache::default())),
+            scan_lock: Arc::new(tokio::sync::Mutex::new(())),
         })
     }
 
@@ -149,7 +315,8 @@ impl DatabaseService {
         "sqlite-file"
     }
 
-    pub fn get_scanner_config(&self) -> ScannerConfig {
+    /// 当前扫描配置的只读快照；更新时整体替换，读取方不会看到半更新的状态
+    pub fn get_scanner_config(&self) -> Arc<ScannerConfig> {
         match self.scanner_config.read() {
             Ok(guard) => guard.clone(),
             Err(err) => {
@@ -160,6 +327,7 @@ impl DatabaseService {
     }
 
     pub fn update_scanner_config(&self, scanner_config: ScannerConfig) {
+        let scanner_config = Arc::new(scanner_config);
         match self.scanner_config.write() {
             Ok(mut guard) => *guard = scanner_config,
             Err(err) => {
@@ -192,7 +360,47 @@ impl DatabaseService {
         }
     }
 
-    async fn init_schema(db: &DatabaseConnection) -> Result<(), DbErr> {
+    pub fn scan_status(&self) -> ScanStatus {
+        match self.scan_status.read() {
+            Ok(guard) => guard.clone(),
+            Err(err) => {
+                tracing::warn!("scan status lock poisoned, using inner value: {}", err);
+                err.into_inner().clone()
+            }
+        }
+    }
+
+    fn update_scan_status(&self, update: impl FnOnce(&mut ScanStatus)) {
+        match self.scan_status.write() {
+            Ok(mut guard) => update(&mut *guard),
+            Err(err) => {
+                tracing::warn!("scan status lock poisoned, updating inner value: {}", err);
+                update(&mut *err.into_inner());
+            }
+        }
+    }
+
+    /// `PRAGMA user_version` に記録されたスキーマ版を読む（未設定の既存 DB は 0）
+    async fn schema_version<C>(db: &C) -> Result<i64, DbErr>
+    where
+        C: ConnectionTrait,
+    {
+        let row = db
+            .query_one(Statement::from_string(
+                db.get_database_backend(),
+                "PRAGMA user_version",
+            ))
+            .await?;
+        match row {
+            Some(row) => row.try_get::<i64>("", "user_version"),
+            None => Ok(0),
+        }
+    }
+
+    async fn init_schema<C>(db: &C) -> Result<(), DbErr>
+    where
+        C: ConnectionTrait,
+    {
         use crate::service::SCHEMA_SQL;
 
         let statements: Vec<&str> = SCHEMA_SQL
@@ -207,7 +415,10 @@ impl DatabaseService {
         Ok(())
     }
 
-    async fn ensure_schema_columns(db: &DatabaseConnection) -> Result<(), DbErr> {
+    async fn ensure_schema_columns<C>(db: &C) -> Result<(), DbErr>
+    where
+        C: ConnectionTrait,
+    {
         let rows = db
             .query_all(Statement::from_string(
                 db.get_database_backend(),
@@ -244,10 +455,25 @@ impl DatabaseService {
     }
 
     /// データベースからすべてのデータを取得する
+    ///
+    /// `all()` は全行の生データを一度に受け取ってからモデルへ変換するため、一時的に
+    /// 2 倍のメモリを使う。カーソルから 1 行ずつ変換して積むことでピークを抑える。
     pub async fn get_all(&self) -> Result<DatabaseData, DbErr> {
-        let libraries = libraries::Entity::find().all(&self.db).await?;
-        let categories = categories::Entity::find().all(&self.db).await?;
-        let book_files = book_files::Entity::find().all(&self.db).await?;
+        let libraries: Vec<libraries::Model> = libraries::Entity::find()
+            .stream(&self.read_db)
+            .await?
+            .collect::<Result<_, _>>()
+            .await?;
+        let categories: Vec<categories::Model> = categories::Entity::find()
+            .stream(&self.read_db)
+            .await?
+            .collect::<Result<_, _>>()
+            .await?;
+        let book_files: Vec<book_files::Model> = book_files::Entity::find()
+            .stream(&self.read_db)
+            .await?
+            .collect::<Result<_, _>>()
+            .await?;
 
         Ok(DatabaseData {
             libraries,
@@ -266,84 +492,317 @@ impl DatabaseService {
         })
     }
 
+    /// 封面预生成用に必要な列だけを 1 行ずつ読み出す
+    ///
+    /// `pages_json` は先頭ページを取り出したらすぐ破棄するので、全書籍分を同時に保持しない。
+    pub async fn list_cover_sources(&self) -> Result<Vec<BookCoverSource>, DbErr> {
+        let mut rows = book_files::Entity::find()
+            .select_only()
+            .columns([
+                book_files::Column::Path,
+                book_files::Column::Title,
+                book_files::Column::Kind,
+                book_files::Column::CoverPath,
+                book_files::Column::PagesJson,
+            ])
+            .into_tuple::<(
+                String,
+                Option<String>,
+                String,
+                Option<String>,
+                Option<String>,
+            )>()
+            .stream(&self.read_db)
+            .await?;
+
+        let mut sources = Vec::new();
+        while let Some(row) = rows.next().await {
+            let (path, title, kind, cover_path, pages_json) = row?;
+            let cover_image_path = if kind == "pdf" {
+                None
+            } else {
+                cover_path.or_else(|| {
+                    book_files::page_path_in(pages_json.as_deref(), 0)
+                        .ok()
+                        .flatten()
+                })
+            };
+            sources.push(BookCoverSource {
+                path,
+                title,
+                kind,
+                cover_image_path,
+            });
+        }
+        Ok(sources)
+    }
+
+    /// id で書籍を 1 件取得する
+    ///
+    /// クエリビルダーは `book_files::Model` の列を列挙した SELECT を生成する。SQL 文字列は
+    /// 毎回同じなので、sqlx の接続ごとのプリペアドステートメントキャッシュに載る。
     pub async fn get_book(&self, book_id: i64) -> Result<Option<book_files::Model>, DbErr> {
-        book_files::Entity::find_by_id(book_id).one(&self.db).await
+        book_files::Entity::find_by_id(book_id)
+            .one(&self.read_db)
+            .await
+    }
+
+    /// id で書籍のファイルパスだけを取得する
+    ///
+    /// PDF ページ描画や Finder 表示のようにパスしか使わない経路では、pages_json を含む行全体を読まない。
+    pub async fn get_book_path(&self, book_id: i64) -> Result<Option<String>, DbErr> {
+        book_files::Entity::find_by_id(book_id)
+            .select_only()
+            .column(book_files::Column::Path)
+            .into_tuple::<String>()
+            .one(&self.read_db)
+            .await
+    }
+
+    /// 画像書籍のページ表示用に、書籍パスと指定ページ（0 始まり）の画像パスだけを取得する
+    ///
+    /// ページ表示のたびに全ページ分の pages_json を転送・パースしないよう、要素の取り出しは
+    /// SQLite 側で行う。書籍が無ければ `None`、ページが範囲外なら `page_path` が `None`。
+    pub async fn get_book_page(
+        &self,
+        book_id: i64,
+        page_index: usize,
+    ) -> Result<Option<BookPageSource>, DbErr> {
+        // 列の順序は `BookPageSource` の位置指定の読み出しと一致させる
+        book_files::Entity::find_by_id(book_id)
+            .select_only()
+            .columns([book_files::Column::Path, book_files::Column::IsOversized])
+            .column_as(
+                Expr::cust_with_values(
+                    "json_extract(pages_json, '$[' || ? || ']')",
+                    [page_index as i64],
+                ),
+                "page_path",
+            )
+            .into_model::<BookPageSource>()
+            .one(&self.read_db)
+            .await
     }
 
     pub async fn list_favorite_books(
         &self,
         page: usize,
         page_size: usize,
-    ) -> Result<(Vec<book_files::Model>, usize), DbErr> {
-        let query = book_files::Entity::find()
-            .filter(book_files::Column::IsFavorite.eq(true))
-            .order_by_desc(book_files::Column::CreatedAt);
-        let paginator = query.paginate(&self.db, page_size as u64);
-        let total = paginator.num_items().await? as usize;
-        let books = paginator.fetch_page(page.saturating_sub(1) as u64).await?;
+    ) -> Result<(Vec<BookListItem>, usize), DbErr> {
+        let query = book_list_query().filter(book_files::Column::IsFavorite.eq(true));
+        let paginator = order_by_created_at(query, true)
+            .into_model::<BookListItem>()
+            .paginate(&self.read_db, page_size as u64);
+        // 件数とページ本体は別々の読み取り接続で並行に取る
+        let (total, books) = tokio::try_join!(
+            paginator.num_items(),
+            paginator.fetch_page(page.saturating_sub(1) as u64)
+        )?;
+        let total = total as usize;
         Ok((books, total))
     }
 
-    pub async fn list_all_favorite_books(&self) -> Result<Vec<book_files::Model>, DbErr> {
-        book_files::Entity::find()
-            .filter(book_files::Column::IsFavorite.eq(true))
-            .order_by_desc(book_files::Column::CreatedAt)
-            .all(&self.db)
+    pub async fn list_all_favorite_books(&self) -> Result<Vec<BookListItem>, DbErr> {
+        let query = book_list_query().filter(book_files::Column::IsFavorite.eq(true));
+        order_by_created_at(query, true)
+            .into_model::<BookListItem>()
+            .all(&self.read_db)
             .await
     }
 
+    /// お気に入り状態を更新する。対象の書籍が存在しなければ `false` を返す
+    ///
+    /// 行を読み出して全列を書き戻すのではなく、1 回の UPDATE で済ませる。
     pub async fn set_book_favorite(&self, book_id: i64, is_favorite: bool) -> Result<bool, DbErr> {
-        let Some(book) = self.get_book(book_id).await? else {
-            return Ok(false);
-        };
+        let result = book_files::Entity::update_many()
+            .col_expr(book_files::Column::IsFavorite, Expr::value(is_favorite))
+            .filter(book_files::Column::Id.eq(book_id))
+            .exec(&self.db)
+            .await?;
+        Ok(result.rows_affected > 0)
+    }
+
+    /// 複数の書籍のお気に入り状態をまとめて更新し、更新した行数を返す
+    ///
+    /// 1 件ずつ API とトランザクションを往復させず、1 トランザクション内の
+    /// `UPDATE ... WHERE id IN (...)` で済ませる（コミット＝fsync は 1 回）。
+    pub async fn set_books_favorite(
+        &self,
+        book_ids: &[i64],
+        is_favorite: bool,
+    ) -> Result<u64, DbErr> {
+        if book_ids.is_empty() {
+            return Ok(0);
+        }
+        let txn = self.db.begin().await?;
+        let mut updated = 0;
+        for chunk in padded_id_chunks(book_ids) {
+            updated += book_files::Entity::update_many()
+                .col_expr(book_files::Column::IsFavorite, Expr::value(is_favorite))
+                .filter(book_files::Column::Id.is_in(chunk))
+                .exec(&txn)
+                .await?
+                .rows_affected;
+        }
+        txn.commit().await?;
+        Ok(updated)
+    }
 
-        let active_model = book_files::ActiveModel {
-            id: sea_orm::Set(book.id),
-            category_id: sea_orm::Set(book.category_id),
-            path: sea_orm::Set(book.path),
-            title: sea_orm::Set(book.title),
-            kind: sea_orm::Set(book.kind),
-            size: sea_orm::Set(book.size),
-            mtime: sea_orm::Set(book.mtime),
-            page_count: sea_orm::Set(book.page_count),
-            pages_json: sea_orm::Set(book.pages_json),
-            content_signature: sea_orm::Set(book.content_signature),
-            is_oversized: sea_orm::Set(book.is_oversized),
-            avg_page_pixels: sea_orm::Set(book.avg_page_pixels),
-            is_favorite: sea_orm::Set(is_favorite),
-            cover_path: sea_orm::Set(book.cover_path),
-            created_at: sea_orm::Set(book.created_at),
+    /// カテゴリツリーを構築する
+    ///
+    /// 書籍は件数しか使わないので、全行を読み込まず category_id ごとの COUNT だけを取る。
+    /// 結果は次の同期までメモリにキャッシュし、リクエスト間で同じツリーを共有する。
+    pub async fn list_categories_tree(&self) -> Result<Arc<Vec<CategoryNode>>, DbErr> {
+        let generation = {
+            let cache = self.read_cache();
+            if let Some(tree) = &cache.category_tree {
+                return Ok(tree.clone());
+            }
+            cache.generation
         };
-        active_model.update(&self.db).await?;
-        Ok(true)
+
+        let (categories, book_counts): (Vec<categories::Model>, Vec<(i64, i64)>) = tokio::try_join!(
+            categories::Entity::find().all(&self.read_db),
+            book_files::Entity::find()
+                .select_only()
+                .column(book_files::Column::CategoryId)
+                .column_as(Expr::col(book_files::Column::Id).count(), "book_count")
+                .group_by(book_files::Column::CategoryId)
+                .into_tuple()
+                .all(&self.read_db)
+        )?;
+        let books_by_category: HashMap<i64, usize> = book_counts
+            .into_iter()
+            .map(|(category_id, count)| (category_id, count as usize))
+            .collect();
+        let tree = Arc::new(build_category_tree(&categories, &books_by_category));
+
+        let mut cache = self.write_read_cache();
+        if cache.generation == generation {
+            cache.category_tree = Some(tree.clone());
+        }
+        Ok(tree)
     }
 
-    pub async fn list_categories_tree(&self) -> Result<Vec<CategoryNode>, DbErr> {
-        let snapshot = self.get_snapshot().await?;
-        Ok(build_category_tree(
-            &snapshot.categories,
-            &snapshot.book_files,
-        ))
+    fn read_cache(&self) -> std::sync::RwLockReadGuard<'_, SyncedReadCache> {
+        match self.read_cache.read() {
+            Ok(guard) => guard,
+            Err(err) => {
+                tracing::warn!("read cache lock poisoned, using inner value: {}", err);
+                err.into_inner()
+            }
+        }
     }
 
+    fn write_read_cache(&self) -> std::sync::RwLockWriteGuard<'_, SyncedReadCache> {
+        match self.read_cache.write() {
+            Ok(guard) => guard,
+            Err(err) => {
+                tracing::warn!("read cache lock poisoned, updating inner value: {}", err);
+                err.into_inner()
+            }
+        }
+    }
+
+    /// 同期で変わりうる読み取りキャッシュをすべて破棄する
+    fn invalidate_read_cache(&self) {
+        let mut cache = self.write_read_cache();
+        cache.generation = cache.generation.wrapping_add(1);
+        cache.category_tree = None;
+        cache.table_counts = None;
+    }
+
+    /// 指定カテゴリとその子孫カテゴリに属する書籍を id 順で返す
+    ///
+    /// カテゴリ全件を読み込んでツリーを辿るのではなく、1 本のクエリで取得する。
+    /// 選ぶ列は他の一覧と同じ `book_list_query` に任せる。
     pub async fn list_books_by_category(
         &self,
         category_id: i64,
-    ) -> Result<Vec<book_files::Model>, DbErr> {
-        let snapshot = self.get_snapshot().await?;
-        let category_ids = collect_descendant_category_ids(category_id, &snapshot.categories);
-        let books = snapshot
-            .book_files
-            .into_iter()
-            .filter(|book| category_ids.contains(&book.category_id))
-            .collect();
-        Ok(books)
+    ) -> Result<Vec<BookListItem>, DbErr> {
+        book_list_query()
+            .filter(Expr::cust_with_values(
+                format!("category_id IN ({CATEGORY_SUBTREE_IDS_SQL})"),
+                [category_id],
+            ))
+            .order_by_asc(book_files::Column::Id)
+            .into_model::<BookListItem>()
+            .all(&self.read_db)
+            .await
+    }
+
+    /// 各テーブルの件数を COUNT(*) で取得する（行データは読み込まない）
+    ///
+    /// ヘルスチェックのたびに呼ばれるので、結果は次の同期までメモリにキャッシュする。
+    pub async fn count_rows(&self) -> Result<TableCounts, DbErr> {
+        let generation = {
+            let cache = self.read_cache();
+            if let Some(counts) = cache.table_counts {
+                return Ok(counts);
+            }
+            cache.generation
+        };
+
+        // 3 つの COUNT は別々の読み取り接続で並行に実行する
+        let (library_count, category_count, book_count) = tokio::try_join!(
+            libraries::Entity::find().count(&self.read_db),
+            categories::Entity::find().count(&self.read_db),
+            book_files::Entity::find().count(&self.read_db)
+        )?;
+        let counts = TableCounts {
+            libraries: library_count as usize,
+            categories: category_count as usize,
+            book_files: book_count as usize,
+        };
+
+        let mut cache = self.write_read_cache();
+        if cache.generation == generation {
+            cache.table_counts = Some(counts);
+        }
+        Ok(counts)
     }
 
     /// スキャンを実行してキャッシュを更新する
     pub async fn scan_and_refresh(&self) -> Result<SyncReport, DbErr> {
+        self.scan_and_refresh_with_progress(|_| {}).await
+    }
+
+    /// スキャンを実行し、進捗メッセージを逐次通知する
+    ///
+    /// `on_progress` はスキャン用のブロッキングスレッドから呼ばれる。
+    /// 同時に要求されたスキャンはプロセス内で順番待ちさせる。並行に走らせると、
+    /// どちらも同じ古いスナップショットで差分を取り、書き込みロックも奪い合うことになる。
+    pub async fn scan_and_refresh_with_progress<F>(
+        &self,
+        on_progress: F,
+    ) -> Result<SyncReport, DbErr>
+    where
+        F: FnMut(String) + Send + 'static,
+    {
+        let _scan_guard = self.scan_lock.lock().await;
+        self.update_scan_status(|status| {
+            status.running = true;
+            status.last_started_at = Some(unix_now_secs());
+        });
+
+        let result = self.scan_and_sync(on_progress).await;
+
+        self.update_scan_status(|status| {
+            status.running = false;
+            status.last_finished_at = Some(unix_now_secs());
+            status.last_error = result.as_ref().err().map(|err| err.to_string());
+        });
+        result
+    }
+
+    async fn scan_and_sync<F>(&self, on_progress: F) -> Result<SyncReport, DbErr>
+    where
+        F: FnMut(String) + Send + 'static,
+    {
         let db_data = self.get_all().await?;
-        let scan_data = self.scan_all_with_existing(&db_data.book_files).await;
+        let scan_data = self
+            .scan_all_with_existing_with_progress(&db_data.book_files, on_progress)
+            .await?;
         self.sync(&db_data, &scan_data).await
     }
 
@@ -353,37 +812,111 @@ impl DatabaseService {
         page: usize,
         page_size: usize,
         sort_desc: bool,
-    ) -> Result<(Vec<book_files::Model>, usize), DbErr> {
-        let query = if sort_desc {
-            book_files::Entity::find().order_by_desc(book_files::Column::CreatedAt)
-        } else {
-            book_files::Entity::find().order_by_asc(book_files::Column::CreatedAt)
-        };
-        let paginator = query.paginate(&self.db, page_size as u64);
-        let total = paginator.num_items().await? as usize;
-        let books = paginator.fetch_page(page.saturating_sub(1) as u64).await?;
+    ) -> Result<(Vec<BookListItem>, usize), DbErr> {
+        let paginator = order_by_created_at(book_list_query(), sort_desc)
+            .into_model::<BookListItem>()
+            .paginate(&self.read_db, page_size as u64);
+        // 件数とページ本体は別々の読み取り接続で並行に取る
+        let (total, books) = tokio::try_join!(
+            paginator.num_items(),
+            paginator.fetch_page(page.saturating_sub(1) as u64)
+        )?;
+        let total = total as usize;
 
         Ok((books, total))
     }
 
-    pub async fn list_all_books(&self, sort_desc: bool) -> Result<Vec<book_files::Model>, DbErr> {
-        let query = if sort_desc {
-            book_files::Entity::find().order_by_desc(book_files::Column::CreatedAt)
-        } else {
-            book_files::Entity::find().order_by_asc(book_files::Column::CreatedAt)
+    pub async fn list_all_books(&self, sort_desc: bool) -> Result<Vec<BookListItem>, DbErr> {
+        order_by_created_at(book_list_query(), sort_desc)
+            .into_model::<BookListItem>()
+            .all(&self.read_db)
+            .await
+    }
+
+    /// キーセット方式で `after` の次の `page_size` 件を取得する（`None` なら先頭から）
+    pub async fn list_books_after(
+        &self,
+        after: Option<&BookCursor>,
+        page_size: usize,
+        sort_desc: bool,
+    ) -> Result<(Vec<BookListItem>, usize), DbErr> {
+        self.fetch_books_after(
+            book_list_query(),
+            book_files::Entity::find(),
+            after,
+            page_size,
+            sort_desc,
+        )
+        .await
+    }
+
+    /// お気に入り一覧をキーセット方式で取得する（新しい順）
+    pub async fn list_favorite_books_after(
+        &self,
+        after: Option<&BookCursor>,
+        page_size: usize,
+    ) -> Result<(Vec<BookListItem>, usize), DbErr> {
+        let favorite = book_files::Column::IsFavorite.eq(true);
+        self.fetch_books_after(
+            book_list_query().filter(favorite.clone()),
+            book_files::Entity::find().filter(favorite),
+            after,
+            page_size,
+            true,
+        )
+        .await
+    }
+
+    /// `query` の `after` 以降を `page_size` 件と、`count_query` の総件数を並行に取る
+    async fn fetch_books_after(
+        &self,
+        query: Select<book_files::Entity>,
+        count_query: Select<book_files::Entity>,
+        after: Option<&BookCursor>,
+        page_size: usize,
+        sort_desc: bool,
+    ) -> Result<(Vec<BookListItem>, usize), DbErr> {
+        let query = match after {
+            Some(cursor) => query.filter(keyset_after(cursor, sort_desc)),
+            None => query,
         };
-        query.all(&self.db).await
+        let (total, books) = tokio::try_join!(
+            count_query.count(&self.read_db),
+            order_by_created_at(query, sort_desc)
+                .limit(page_size as u64)
+                .into_model::<BookListItem>()
+                .all(&self.read_db)
+        )?;
+        Ok((books, total as usize))
     }
 
     /// 設定されたすべてのパスをスキャンする
-    pub async fn scan_all(&self) -> ScanResult {
+    pub async fn scan_all(&self) -> Result<ScanResult, DbErr> {
         self.scan_all_with_existing(&[]).await
     }
 
-    pub async fn scan_all_with_existing(&self, existing_books: &[book_files::Model]) -> ScanResult {
+    pub async fn scan_all_with_existing(
+        &self,
+        existing_books: &[book_files::Model],
+    ) -> Result<ScanResult, DbErr> {
+        self.scan_all_with_existing_with_progress(existing_books, |_| {})
+            .await
+    }
+
+    pub async fn scan_all_with_existing_with_progress<F>(
+        &self,
+        existing_books: &[book_files::Model],
+        mut on_progress: F,
+    ) -> Result<ScanResult, DbErr>
+    where
+        F: FnMut(String) + Send + 'static,
+    {
         let scanner_config = self.get_scanner_config();
-        let cache_config = self.get_cache_config();
         let scan_paths = scanner_config.scan_paths.clone();
+        let recognizer = ConfigurableRecognizer::from((
+            scanner_config.as_ref().clone(),
+            self.get_cache_config(),
+        ));
         let existing_books: Vec<CachedBookMetadata> = existing_books
             .iter()
             .map(|book| CachedBookMetadata {
@@ -401,30 +934,34 @@ impl DatabaseService {
             })
             .collect();
 
-        let result = tokio::task::spawn_blocking(move || {
+        // スキャンスレッドが panic した場合に空の結果を返すと、同期で全件削除されてしまう
+        tokio::task::spawn_blocking(move || {
             let mut all_result = ScanResult {
                 categories: vec![],
                 book_files: vec![],
             };
+            // 既存書籍のインデックスはスキャンパスごとに作り直さず、一度だけ構築して使い回す
+            let scanner = Scanner::with_existing_books(&recognizer, existing_books);
 
             for scan_path in &scan_paths {
-                let recognizer =
-                    ConfigurableRecognizer::from((scanner_config.clone(), cache_config.clone()));
-                let scanner = Scanner::with_existing_books(&recognizer, existing_books.clone());
+                on_progress(format!("正在扫描: {}", scan_path));
                 let scan_result = scanner.scan(Path::new(scan_path));
+                on_progress(format!(
+                    "扫描完成: {}（{} 本书，{} 个目录）",
+                    scan_path,
+                    scan_result.book_files.len(),
+                    scan_result.categories.len()
+                ));
                 all_result.categories.extend(scan_result.categories);
                 all_result.book_files.extend(scan_result.book_files);
             }
 
+            dedupe_scan_result(&mut all_result);
+            on_progress("正在同步数据库...".to_string());
             all_result
         })
         .await
-        .unwrap_or_else(|_| ScanResult {
-            categories: vec![],
-            book_files: vec![],
-        });
-
-        result
+        .map_err(|err| DbErr::Custom(format!("scan task failed: {err}")))
     }
 
     /// 増分比較
@@ -512,28 +1049,8 @@ impl DatabaseService {
             .book_files
             .iter()
             .filter_map(|b| {
-                if let Some(db_book) = db_book_paths.get(&b.path) {
-                    if book_requires_update(db_book, b) {
-                        return Some(book_files::Model {
-                            id: db_book.id,
-                            category_id: db_book.category_id,
-                            path: b.path.clone(),
-                            title: b.title.clone().or(db_book.title.clone()),
-                            kind: b.kind.clone(),
-                            size: b.size,
-                            mtime: b.mtime,
-                            page_count: b.page_count,
-                            pages_json: b.pages_json.clone(),
-                            content_signature: b.content_signature.clone(),
-                            is_oversized: b.is_oversized,
-                            avg_page_pixels: b.avg_page_pixels,
-                            is_favorite: db_book.is_favorite,
-                            cover_path: db_book.cover_path.clone(),
-                            created_at: db_book.created_at.clone(),
-                        });
-                    }
-                }
-                None
+                let db_book = db_book_paths.get(&b.path)?;
+                book_requires_update(db_book, b).then(|| updated_book_model(db_book, b))
             })
             .collect();
 
@@ -555,23 +1072,12 @@ impl DatabaseService {
         scan_data: &ScanResult,
     ) -> Result<SyncReport, DbErr> {
         let diff: DiffData = self.diff(db_data, scan_data).await?;
+        let mut report = SyncReport::default();
+        // 変更がなければトランザクション自体を開かない（再スキャンの大半はこの経路）
+        if diff.is_empty() {
+            return Ok(report);
+        }
         let txn = self.db.begin().await?;
-        let mut report = SyncReport {
-            inserted_libraries: 0,
-            deleted_libraries: 0,
-            inserted_categories: 0,
-            deleted_categories: 0,
-            inserted_book_files: 0,
-            deleted_book_files: 0,
-            updated_book_files: 0,
-            inserted_library_details: Vec::new(),
-            deleted_library_details: Vec::new(),
-            inserted_category_details: Vec::new(),
-            deleted_category_details: Vec::new(),
-            inserted_book_file_details: Vec::new(),
-            deleted_book_file_details: Vec::new(),
-            updated_book_file_details: Vec::new(),
-        };
 
         let mut library_id_map: HashMap<String, i64> = HashMap::new();
         let mut category_id_map: HashMap<String, i64> = HashMap::new();
@@ -590,6 +1096,22 @@ impl DatabaseService {
             .iter()
             .map(|book| (book.id, book))
             .collect();
+        // 新規行ごとに Vec を線形探索しないよう、パスで引けるマップを一度だけ作る
+        let db_category_id_by_path: HashMap<&str, i64> = db_data
+            .categories
+            .iter()
+            .map(|category| (category.path.as_str(), category.id))
+            .collect();
+        let scan_category_mtime_by_path: HashMap<&str, i64> = scan_data
+            .categories
+            .iter()
+            .map(|category| (category.path.as_str(), category.mtime))
+            .collect();
+        let scan_book_by_path: HashMap<&str, &crate::scanner::types::ScannedBookFile> = scan_data
+            .book_files
+            .iter()
+            .map(|book| (book.path.as_str(), book))
+            .collect();
 
         // --- 1. 挿入フェーズ (Top-Down: Library -> Category -> Book) ---
 
@@ -603,23 +1125,16 @@ impl DatabaseService {
             });
         }
 
+        // Library のルートを「今回追加分 → 既存分」、各グループ内は長い順に一度だけ並べておく。
+        // カテゴリごとに先頭から探せば最長一致になり、ID と詳細用のパスを同じ探索で得られる
+        let library_roots = ordered_library_roots(&library_id_map, &db_data.libraries);
+
         for category_path in &diff.new_category_paths {
             // 最長一致で Library を検索 (サブディレクトリ構造に対応)
-            let lib_id = library_id_map
+            let Some(&(library_root, lib_id)) = library_roots
                 .iter()
-                .filter(|(root_path, _)| category_path.starts_with(*root_path))
-                .max_by_key(|(root_path, _)| root_path.len())
-                .map(|(_, id)| *id)
-                .or_else(|| {
-                    db_data
-                        .libraries
-                        .iter()
-                        .filter(|l| category_path.starts_with(&l.root_path))
-                        .max_by_key(|l| l.root_path.len())
-                        .map(|l| l.id)
-                });
-
-            let Some(lib_id) = lib_id else {
+                .find(|(root_path, _)| category_path.starts_with(root_path))
+            else {
                 continue;
             };
 
@@ -631,13 +1146,10 @@ impl DatabaseService {
                 .and_then(|pp| category_id_map.get(pp))
                 .copied()
                 .or_else(|| {
-                    parent_path.and_then(|pp| {
-                        db_data
-                            .categories
-                            .iter()
-                            .find(|c| c.path == pp)
-                            .map(|c| c.id)
-                    })
+                    parent_path
+                        .as_deref()
+                        .and_then(|pp| db_category_id_by_path.get(pp))
+                        .copied()
                 });
 
             let name = Path::new(category_path)
@@ -646,11 +1158,9 @@ impl DatabaseService {
                 .unwrap_or("Unnamed")
                 .to_string();
 
-            let mtime = scan_data
-                .categories
-                .iter()
-                .find(|c| c.path == *category_path)
-                .map(|c| c.mtime)
+            let mtime = scan_category_mtime_by_path
+                .get(category_path.as_str())
+                .copied()
                 .unwrap_or(0);
 
             let active_model = categories::ActiveModel {
@@ -662,42 +1172,35 @@ impl DatabaseService {
                 ..Default::default()
             };
 
-            let inserted = active_model.insert(&txn).await?;
-            category_id_map.insert(category_path.clone(), inserted.id);
+            // 必要なのは ID だけなので、挿入した行を読み戻さない
+            let inserted = categories::Entity::insert(active_model).exec(&txn).await?;
+            category_id_map.insert(category_path.clone(), inserted.last_insert_id);
             report.inserted_categories += 1;
             report.inserted_category_details.push(CategoryChangeDetail {
                 path: category_path.clone(),
                 name: name.clone(),
-                library_path: Some(resolve_library_path(
-                    category_path,
-                    &library_id_map,
-                    &db_data.libraries,
-                )),
-                parent_path: Path::new(category_path)
-                    .parent()
-                    .map(|p| p.to_string_lossy().to_string()),
+                library_path: Some(library_root.to_string()),
+                parent_path,
             });
         }
 
+        let mut new_book_models = Vec::with_capacity(diff.new_book_file_paths.len());
         for book_path in &diff.new_book_file_paths {
             let category_path =
-                resolve_book_category_path(book_path, &category_id_map, &db_data.categories);
+                resolve_book_category_path(book_path, &category_id_map, &db_category_id_by_path);
 
             let category_id = category_path.as_ref().and_then(|cp| {
-                category_id_map.get(cp).copied().or_else(|| {
-                    db_data
-                        .categories
-                        .iter()
-                        .find(|c| c.path == *cp)
-                        .map(|c| c.id)
-                })
+                category_id_map
+                    .get(cp)
+                    .or_else(|| db_category_id_by_path.get(cp.as_str()))
+                    .copied()
             });
 
-            if let Some(book) = scan_data.book_files.iter().find(|b| b.path == *book_path) {
+            if let Some(book) = scan_book_by_path.get(book_path.as_str()) {
                 let Some(category_id) = category_id else {
                     continue;
                 };
-                let active_model = book_files::ActiveModel {
+                new_book_models.push(book_files::ActiveModel {
                     category_id: sea_orm::Set(category_id),
                     path: sea_orm::Set(book.path.clone()),
                     title: sea_orm::Set(book.title.clone()),
@@ -712,8 +1215,7 @@ impl DatabaseService {
                     is_favorite: sea_orm::Set(false),
                     cover_path: sea_orm::Set(book.cover_path.clone()),
                     ..Default::default()
-                };
-                active_model.insert(&txn).await?;
+                });
                 report.inserted_book_files += 1;
                 report.inserted_book_file_details.push(BookChangeDetail {
                     path: book.path.clone(),
@@ -723,11 +1225,27 @@ impl DatabaseService {
             }
         }
 
+        // 一行ずつ INSERT せず、まとめて multi-row INSERT で書き込む。
+        // 既に同じパスの行があれば（二重スキャン等）その行だけ無視し、同期全体は失敗させない
+        for chunk in owned_batches(new_book_models) {
+            book_files::Entity::insert_many(chunk)
+                .on_conflict(
+                    OnConflict::column(book_files::Column::Path)
+                        .do_nothing()
+                        .to_owned(),
+                )
+                .exec_without_returning(&txn)
+                .await?;
+        }
+
         // --- 2. 更新フェーズ ---
 
-        for updated_book in &diff.updated_book_files {
-            // N+1 クエリを排除：必要な信息都在 diff 结果中
-            let active_model = book_files::ActiveModel {
+        // 一行ずつ UPDATE せず、id の衝突を利用した UPSERT でまとめて書き戻す。
+        // 更新するのはスキャン由来の列だけなので、同期中に変わったお気に入り等は上書きしない
+        let updated_book_models: Vec<book_files::ActiveModel> = diff
+            .updated_book_files
+            .iter()
+            .map(|updated_book| book_files::ActiveModel {
                 id: sea_orm::Set(updated_book.id),
                 category_id: sea_orm::Set(updated_book.category_id),
                 path: sea_orm::Set(updated_book.path.clone()),
@@ -743,8 +1261,30 @@ impl DatabaseService {
                 is_favorite: sea_orm::Set(updated_book.is_favorite),
                 cover_path: sea_orm::Set(updated_book.cover_path.clone()),
                 created_at: sea_orm::Set(updated_book.created_at.clone()),
-            };
-            active_model.update(&txn).await?;
+            })
+            .collect();
+        for chunk in owned_batches(updated_book_models) {
+            book_files::Entity::insert_many(chunk)
+                .on_conflict(
+                    OnConflict::column(book_files::Column::Id)
+                        .update_columns([
+                            book_files::Column::Title,
+                            book_files::Column::Kind,
+                            book_files::Column::Size,
+                            book_files::Column::Mtime,
+                            book_files::Column::PageCount,
+                            book_files::Column::PagesJson,
+                            book_files::Column::ContentSignature,
+                            book_files::Column::IsOversized,
+                            book_files::Column::AvgPagePixels,
+                        ])
+                        .to_owned(),
+                )
+                .exec_without_returning(&txn)
+                .await?;
+        }
+
+        for updated_book in &diff.updated_book_files {
             report.updated_book_files += 1;
             report.updated_book_file_details.push(BookChangeDetail {
                 path: updated_book.path.clone(),
@@ -781,11 +1321,14 @@ impl DatabaseService {
                     }),
                 });
             }
-            book_files::Entity::delete_by_id(*book_id)
+        }
+        for chunk in padded_id_chunks(&diff.deleted_book_file_ids) {
+            book_files::Entity::delete_many()
+                .filter(book_files::Column::Id.is_in(chunk))
                 .exec(&txn)
                 .await?;
-            report.deleted_book_files += 1;
         }
+        report.deleted_book_files += diff.deleted_book_file_ids.len();
 
         for category_id in &diff.deleted_category_ids {
             if let Some(category) = db_category_by_id.get(category_id) {
@@ -800,15 +1343,17 @@ impl DatabaseService {
                     }),
                 });
             }
-            book_files::Entity::delete_many()
-                .filter(book_files::Column::CategoryId.eq(*category_id))
-                .exec(&txn)
-                .await?;
-            categories::Entity::delete_by_id(*category_id)
+        }
+        // 配下の書籍は book_files.category_id の ON DELETE CASCADE で同じ文の中で消えるため、
+        // 書籍を先に個別に DELETE する必要はない（foreign_keys は接続設定で有効）。
+        // 子カテゴリが先に並んでいるため、チャンク単位でも Bottom-Up の順序は保たれる
+        for chunk in padded_id_chunks(&diff.deleted_category_ids) {
+            categories::Entity::delete_many()
+                .filter(categories::Column::Id.is_in(chunk))
                 .exec(&txn)
                 .await?;
-            report.deleted_categories += 1;
         }
+        report.deleted_categories += diff.deleted_category_ids.len();
 
         for library_id in &diff.deleted_library_ids {
             if let Some(library) = db_library_by_id.get(library_id) {
@@ -817,13 +1362,17 @@ impl DatabaseService {
                     name: library.name.clone(),
                 });
             }
-            libraries::Entity::delete_by_id(*library_id)
+        }
+        for chunk in padded_id_chunks(&diff.deleted_library_ids) {
+            libraries::Entity::delete_many()
+                .filter(libraries::Column::Id.is_in(chunk))
                 .exec(&txn)
                 .await?;
-            report.deleted_libraries += 1;
         }
+        report.deleted_libraries += diff.deleted_library_ids.len();
 
         txn.commit().await?;
+        self.invalidate_read_cache();
 
         Ok(report)
     }
@@ -833,37 +1382,153 @@ impl DatabaseService {
     where
         C: ConnectionTrait,
     {
-        let existing = libraries::Entity::find()
-            .filter(libraries::Column::RootPath.eq(root_path))
-            .one(db)
-            .await?;
-
-        if let Some(lib) = existing {
-            return Ok(lib.id);
-        }
-
         let name = Path::new(root_path)
             .file_name()
             .and_then(|n| n.to_str())
             .unwrap_or("Unnamed")
             .to_string();
 
-        let now = match std::time::SystemTime::now().duration_since(std::time::UNIX_EPOCH) {
-            Ok(duration) => duration.as_secs() as i64,
-            Err(err) => {
-                tracing::warn!("system clock is before UNIX_EPOCH: {}", err);
-                0
-            }
-        };
+        // 存在確認の SELECT も衝突後の再検索もせず、UPSERT + RETURNING の 1 文で ID を得る。
+        // 既存行と衝突した場合（diff 後に別経路で登録済み）は last_scanned_at だけ更新する
+        let row = db
+            .query_one(Statement::from_sql_and_values(
+                db.get_database_backend(),
+                UPSERT_LIBRARY_SQL,
+                [name.into(), root_path.into(), unix_now_secs().into()],
+            ))
+            .await?
+            .ok_or_else(|| DbErr::RecordNotFound(format!("library {root_path}")))?;
+        row.try_get::<i64>("", "id")
+    }
+}
 
-        let active_model = libraries::ActiveModel {
-            name: sea_orm::Set(name),
-            root_path: sea_orm::Set(root_path.to_string()),
-            last_scanned_at: sea_orm::Set(now),
-            ..Default::default()
-        };
+/// 書き込み用・読み取り用プールに共通する接続設定
+fn pool_options(file_url: &str, max_connections: u32, min_connections: u32) -> ConnectOptions {
+    let mut options = ConnectOptions::new(file_url);
+    options
+        .max_connections(max_connections)
+        .min_connections(min_connections)
+        .connect_timeout(Duration::from_secs(5))
+        // ローカルファイルなので切断は起こらない。取得のたびに ping する往復を省く
+        .test_before_acquire(false)
+        .sqlx_logging(false);
+    options
+}
+
+/// 読み取り専用接続の設定。ジャーナルモードはライター側で WAL に設定済み
+fn tune_sqlite_reader_connection(options: SqliteConnectOptions) -> SqliteConnectOptions {
+    options
+        .read_only(true)
+        .busy_timeout(SQLITE_BUSY_TIMEOUT)
+        .pragma("temp_store", "MEMORY")
+        .pragma("mmap_size", "268435456")
+        .pragma("cache_size", "-8192")
+}
+
+/// 書き込み用接続に適用する PRAGMA
+///
+/// DB はファイルシステムから再構築できるキャッシュなので、WAL + synchronous=NORMAL で
+/// コミットごとの fsync を避ける。
+/// カテゴリ・書籍の削除は ON DELETE CASCADE に依存するので foreign_keys も明示的に有効化する。
+/// ライターは 1 接続だけなので、同期の一括書き込みに効くようページキャッシュを
+/// 読み取り用（接続ごと 8 MiB、接続数分確保される）より大きい 64 MiB にする。
+fn tune_sqlite_connection(options: SqliteConnectOptions) -> SqliteConnectOptions {
+    options
+        .foreign_keys(true)
+        .journal_mode(SqliteJournalMode::Wal)
+        .synchronous(SqliteSynchronous::Normal)
+        .busy_timeout(SQLITE_BUSY_TIMEOUT)
+        .pragma("temp_store", "MEMORY")
+        .pragma("mmap_size", "268435456")
+        .pragma("cache_size", "-65536")
+}
+
+/// 所有した要素を `SYNC_BATCH_SIZE` 件ずつのバッチに分けて渡す
+///
+/// `chunks()` + `to_vec()` と違い、pages_json などの文字列を複製せずにそのまま移す。
+fn owned_batches<T>(items: Vec<T>) -> impl Iterator<Item = Vec<T>> {
+    let mut items = items.into_iter();
+    std::iter::from_fn(move || {
+        let batch: Vec<T> = items.by_ref().take(SYNC_BATCH_SIZE).collect();
+        (!batch.is_empty()).then_some(batch)
+    })
+}
 
-        Ok(active_model.insert(db).await?.id)
+/// `IN (...)` 用に id を `SYNC_BATCH_SIZE` ごとに分割し、各チャンクを 2 の冪の長さまで
+/// 末尾の id で埋める。
+///
+/// sqlx は接続ごとにプリペアドステートメントをキャッシュするが、プレースホルダ数が
+/// 異なると別の SQL になる。長さをそろえておけば SQL の種類が数通りに収まり、
+/// 毎回の prepare を避けてキャッシュに当たり続ける。重複した id は `IN` の結果を変えない。
+fn padded_id_chunks(ids: &[i64]) -> impl Iterator<Item = Vec<i64>> + '_ {
+    ids.chunks(SYNC_BATCH_SIZE).map(|chunk| {
+        let padded_len = chunk.len().next_power_of_two().min(SYNC_BATCH_SIZE);
+        let mut padded = Vec::with_capacity(padded_len);
+        padded.extend_from_slice(chunk);
+        if let Some(&last) = chunk.last() {
+            padded.resize(padded_len, last);
+        }
+        padded
+    })
+}
+
+/// 一覧表示用に `BookListItem` の列だけを選ぶクエリ
+///
+/// 一覧では pages_json（全ページのパス）を使わないので読み込まない。content_signature は
+/// 短いハッシュで、表紙 URL のバージョンに使うため読み込む。
+/// `BookListItem` は列の位置で値を取り出すため、列の順序を変えてはいけない。
+fn book_list_query() -> Select<book_files::Entity> {
+    book_files::Entity::find().select_only().columns([
+        book_files::Column::Id,
+        book_files::Column::Path,
+        book_files::Column::Title,
+        book_files::Column::Kind,
+        book_files::Column::Size,
+        book_files::Column::Mtime,
+        book_files::Column::PageCount,
+        book_files::Column::IsFavorite,
+        book_files::Column::CoverPath,
+        book_files::Column::CreatedAt,
+        book_files::Column::ContentSignature,
+    ])
+}
+
+/// `order_by_created_at` の並びで `cursor` より後ろの行に絞る条件
+///
+/// SQLite では NULL が最小値として並ぶ（降順なら末尾、昇順なら先頭）。行値の比較は
+/// NULL を含むと真にならないため、NULL の行は個別の条件で拾う。
+fn keyset_after(cursor: &BookCursor, desc: bool) -> SimpleExpr {
+    let id = sea_orm::Value::from(cursor.id);
+    match (&cursor.created_at, desc) {
+        (Some(created_at), true) => Expr::cust_with_values(
+            "((created_at, id) < (?, ?) OR created_at IS NULL)",
+            [sea_orm::Value::from(created_at.clone()), id],
+        ),
+        (Some(created_at), false) => Expr::cust_with_values(
+            "(created_at, id) > (?, ?)",
+            [sea_orm::Value::from(created_at.clone()), id],
+        ),
+        (None, true) => Expr::cust_with_values("(created_at IS NULL AND id < ?)", [id]),
+        (None, false) => Expr::cust_with_values("(created_at IS NOT NULL OR id > ?)", [id]),
+    }
+}
+
+/// created_at 順に並べ、同じ秒に登録された書籍は id で順序を固定する
+///
+/// 一括登録では created_at が同じ行が多数並ぶため、id がないとページ間で行が重複・欠落しうる。
+/// id は rowid なので created_at の索引の末尾に含まれており、並べ替えの追加コストはない。
+fn order_by_created_at(
+    query: Select<book_files::Entity>,
+    desc: bool,
+) -> Select<book_files::Entity> {
+    if desc {
+        query
+            .order_by_desc(book_files::Column::CreatedAt)
+            .order_by_desc(book_files::Column::Id)
+    } else {
+        query
+            .order_by_asc(book_files::Column::CreatedAt)
+            .order_by_asc(book_files::Column::Id)
     }
 }
 
@@ -891,6 +1556,16 @@ fn ensure_database_file(path: &str) -> Result<(), DbErr> {
     Ok(())
 }
 
+fn unix_now_secs() -> i64 {
+    match std::time::SystemTime::now().duration_since(std::time::UNIX_EPOCH) {
+        Ok(duration) => duration.as_secs() as i64,
+        Err(err) => {
+            tracing::warn!("system clock is before UNIX_EPOCH: {}", err);
+            0
+        }
+    }
+}
+
 fn path_name(path: &str) -> String {
     Path::new(path)
         .file_name()
@@ -920,32 +1595,65 @@ fn book_requires_update(
         || db_book.avg_page_pixels != scanned_book.avg_page_pixels
 }
 
-fn resolve_library_path(
-    category_path: &str,
-    library_id_map: &HashMap<String, i64>,
-    libraries: &[libraries::Model],
-) -> String {
-    library_id_map
-        .keys()
-        .filter(|root_path| category_path.starts_with(root_path.as_str()))
-        .max_by_key(|root_path| root_path.len())
-        .cloned()
-        .or_else(|| {
-            libraries
-                .iter()
-                .filter(|library| category_path.starts_with(&library.root_path))
-                .max_by_key(|library| library.root_path.len())
-                .map(|library| library.root_path.clone())
-        })
-        .unwrap_or_default()
+/// スキャン結果で既存の書籍行を更新したモデルを作る
+///
+/// id・お気に入り・登録日時などは既存の行から引き継ぐ。cover_path も原則として引き継ぐが、
+/// 内容署名が変わった画像書籍（ページの追加・削除・並べ替え）はスキャンで求めた新しい
+/// 先頭ページに合わせる。署名は並び順を含むため、自然順ソートを導入した直後の再スキャンでは
+/// ページ順が変わった画像書籍がすべて更新扱いになり、表紙もここで一度だけ新しい先頭ページに
+/// 揃う（表紙キャッシュは更新された書籍ごと削除される）。
+fn updated_book_model(
+    db_book: &book_files::Model,
+    scanned_book: &crate::scanner::types::ScannedBookFile,
+) -> book_files::Model {
+    let cover_path = if db_book.content_signature != scanned_book.content_signature {
+        scanned_book.cover_path.clone()
+    } else {
+        db_book.cover_path.clone()
+    };
+    book_files::Model {
+        id: db_book.id,
+        category_id: db_book.category_id,
+        path: scanned_book.path.clone(),
+        title: scanned_book.title.clone().or(db_book.title.clone()),
+        kind: scanned_book.kind.clone(),
+        size: scanned_book.size,
+        mtime: scanned_book.mtime,
+        page_count: scanned_book.page_count,
+        pages_json: scanned_book.pages_json.clone(),
+        content_signature: scanned_book.content_signature.clone(),
+        is_oversized: scanned_book.is_oversized,
+        avg_page_pixels: scanned_book.avg_page_pixels,
+        is_favorite: db_book.is_favorite,
+        cover_path,
+        created_at: db_book.created_at.clone(),
+    }
+}
+
+fn ordered_library_roots<'a>(
+    library_id_map: &'a HashMap<String, i64>,
+    libraries: &'a [libraries::Model],
+) -> Vec<(&'a str, i64)> {
+    let mut new_roots: Vec<(&str, i64)> = library_id_map
+        .iter()
+        .map(|(root_path, id)| (root_path.as_str(), *id))
+        .collect();
+    new_roots.sort_by_key(|(root_path, _)| std::cmp::Reverse(root_path.len()));
+    let mut existing_roots: Vec<(&str, i64)> = libraries
+        .iter()
+        .map(|library| (library.root_path.as_str(), library.id))
+        .collect();
+    existing_roots.sort_by_key(|(root_path, _)| std::cmp::Reverse(root_path.len()));
+    new_roots.extend(existing_roots);
+    new_roots
 }
 
 fn resolve_book_category_path(
     book_path: &str,
     category_id_map: &HashMap<String, i64>,
-    categories: &[categories::Model],
+    db_category_id_by_path: &HashMap<&str, i64>,
 ) -> Option<String> {
-    if category_id_map.contains_key(book_path) || categories.iter().any(|c| c.path == book_path) {
+    if category_id_map.contains_key(book_path) || db_category_id_by_path.contains_key(book_path) {
         return Some(book_path.to_string());
     }
 
@@ -966,58 +1674,71 @@ fn resolve_category_path(
 
 fn build_category_tree(
     categories: &[categories::Model],
-    books: &[book_files::Model],
+    books_by_category: &HashMap<i64, usize>,
 ) -> Vec<CategoryNode> {
-    let mut books_by_category: HashMap<i64, usize> = HashMap::new();
-    for book in books {
-        *books_by_category.entry(book.category_id).or_insert(0) += 1;
-    }
+    let by_parent = index_categories_by_parent(categories);
 
     fn build_node(
         category: &categories::Model,
-        categories: &[categories::Model],
+        by_parent: &[&categories::Model],
         books_by_category: &HashMap<i64, usize>,
     ) -> CategoryNode {
-        let children = categories
+        let book_count = books_by_category.get(&category.id).copied().unwrap_or(0);
+        let sub_categories: Vec<CategoryNode> = category_children(by_parent, Some(category.id))
             .iter()
-            .filter(|candidate| candidate.parent_id == Some(category.id))
-            .map(|child| build_node(child, categories, books_by_category))
+            .map(|child| build_node(child, by_parent, books_by_category))
             .collect();
-
         CategoryNode {
             id: category.id,
             name: category.name.clone(),
             path: category.path.clone(),
-            book_count: books_by_category.get(&category.id).copied().unwrap_or(0),
-            sub_categories: children,
+            book_count,
+            total_book_count: book_count
+                + sub_categories
+                    .iter()
+                    .map(|sub| sub.total_book_count)
+                    .sum::<usize>(),
+            sub_categories,
         }
     }
 
-    categories
+    category_children(&by_parent, None)
         .iter()
-        .filter(|category| category.parent_id.is_none())
-        .map(|category| build_node(category, categories, &books_by_category))
+        .map(|category| build_node(category, &by_parent, books_by_category))
         .collect()
 }
 
-fn collect_descendant_category_ids(category_id: i64, categories: &[categories::Model]) -> Vec<i64> {
-    let mut result = vec![category_id];
-    let mut index = 0;
+/// スキャンパスが入れ子・重複している場合の二重登録を除去する（先に出たものを残す）
+///
+/// 同じパスが 2 回 INSERT されると UNIQUE 制約違反で同期全体が失敗するため、diff の前に取り除く。
+fn dedupe_scan_result(result: &mut ScanResult) {
+    let mut seen = HashSet::with_capacity(result.categories.len());
+    result
+        .categories
+        .retain(|category| seen.insert(category.path.clone()));
+    seen.clear();
+    result
+        .book_files
+        .retain(|book| seen.insert(book.path.clone()));
+}
 
-    while index < result.len() {
-        let current_id = result[index];
-        for category in categories
-            .iter()
-            .filter(|category| category.parent_id == Some(current_id))
-        {
-            if !result.contains(&category.id) {
-                result.push(category.id);
-            }
-        }
-        index += 1;
-    }
+/// 親 ID でソートしたカテゴリ参照の配列を作る。親ごとの Vec を持たない 1 本の索引で、
+/// 兄弟の並びは安定ソートなので元の順序のまま残る
+fn index_categories_by_parent(categories: &[categories::Model]) -> Vec<&categories::Model> {
+    let mut by_parent: Vec<&categories::Model> = categories.iter().collect();
+    by_parent.sort_by_key(|category| category.parent_id);
+    by_parent
+}
 
-    result
+/// `index_categories_by_parent` の索引から、指定した親の直下のカテゴリを二分探索で切り出す
+fn category_children<'a>(
+    by_parent: &'a [&'a categories::Model],
+    parent_id: Option<i64>,
+) -> &'a [&'a categories::Model] {
+    let start = by_parent.partition_point(|category| category.parent_id < parent_id);
+    let end =
+        start + by_parent[start..].partition_point(|category| category.parent_id == parent_id);
+    &by_parent[start..end]
 }
 
 #[cfg(test)]
@@ -1025,6 +1746,24 @@ mod tests {
     use super::*;
     use crate::scanner::types::ScannedBookFile;
 
+    #[test]
+    fn book_cursor_round_trips_through_encode() {
+        let cursor = BookCursor {
+            created_at: Some("2024-05-01 12:34:56".to_string()),
+            id: 42,
+        };
+        let encoded = cursor.encode();
+        assert!(encoded.bytes().all(|byte| byte.is_ascii_hexdigit()));
+        assert_eq!(BookCursor::decode(&encoded), Some(cursor));
+        let null_cursor = BookCursor {
+            created_at: None,
+            id: 7,
+        };
+        assert_eq!(BookCursor::decode(&null_cursor.encode()), Some(null_cursor));
+        assert_eq!(BookCursor::decode("zz"), None);
+        assert_eq!(BookCursor::decode("abc"), None);
+    }
+
     #[test]
     fn book_requires_update_detects_content_signature_change() {
         let db_book = book_files::Model {
@@ -1062,6 +1801,50 @@ mod tests {
         assert!(book_requires_update(&db_book, &scanned_book));
     }
 
+    #[test]
+    fn updated_book_model_moves_cover_to_new_first_page_after_reorder() {
+        let db_book = book_files::Model {
+            id: 1,
+            category_id: 1,
+            path: "/library/book".to_string(),
+            title: Some("book".to_string()),
+            kind: "image_folder".to_string(),
+            size: 100,
+            mtime: 10,
+            page_count: 3,
+            pages_json: Some("[\"10.png\",\"1.png\",\"2.png\"]".to_string()),
+            content_signature: Some("old-signature".to_string()),
+            is_oversized: false,
+            avg_page_pixels: 123,
+            is_favorite: true,
+            cover_path: Some("/library/book/10.png".to_string()),
+            created_at: Some("2024-01-01 00:00:00".to_string()),
+        };
+        let mut scanned_book = ScannedBookFile {
+            path: db_book.path.clone(),
+            title: db_book.title.clone(),
+            kind: db_book.kind.clone(),
+            size: db_book.size,
+            mtime: db_book.mtime,
+            page_count: db_book.page_count,
+            pages_json: Some("[\"1.png\",\"2.png\",\"10.png\"]".to_string()),
+            content_signature: Some("new-signature".to_string()),
+            is_oversized: db_book.is_oversized,
+            avg_page_pixels: db_book.avg_page_pixels,
+            cover_path: Some("/library/book/1.png".to_string()),
+        };
+
+        let updated = updated_book_model(&db_book, &scanned_book);
+        assert_eq!(updated.cover_path.as_deref(), Some("/library/book/1.png"));
+        assert!(updated.is_favorite);
+        assert_eq!(updated.created_at, db_book.created_at);
+
+        // 署名が同じなら既存の表紙を引き継ぐ
+        scanned_book.content_signature = db_book.content_signature.clone();
+        let updated = updated_book_model(&db_book, &scanned_book);
+        assert_eq!(updated.cover_path, db_book.cover_path);
+    }
+
     #[test]
     fn book_requires_update_ignores_identical_scanned_book() {
         let db_book = book_files::Model {
@@ -1098,4 +1881,95 @@ mod tests {
 
         assert!(!book_requires_update(&db_book, &scanned_book));
     }
+
+    #[test]
+    fn dedupe_scan_result_keeps_first_entry_per_path() {
+        let category = |path: &str| crate::scanner::types::ScannedCategory {
+            name: path_name(path),
+            path: path.to_string(),
+            mtime: 0,
+        };
+        let book = |path: &str, size: i64| ScannedBookFile {
+            path: path.to_string(),
+            title: None,
+            kind: "pdf".to_string(),
+            size,
+            mtime: 0,
+            page_count: 1,
+            pages_json: None,
+            content_signature: None,
+            is_oversized: false,
+            avg_page_pixels: 0,
+            cover_path: None,
+        };
+        let mut result = ScanResult {
+            categories: vec![category("/lib"), category("/lib/sub"), category("/lib/sub")],
+            book_files: vec![
+                book("/lib/sub/a.pdf", 1),
+                book("/lib/b.pdf", 2),
+                book("/lib/sub/a.pdf", 3),
+            ],
+        };
+
+        dedupe_scan_result(&mut result);
+
+        let category_paths: Vec<&str> = result.categories.iter().map(|c| c.path.as_str()).collect();
+        assert_eq!(category_paths, ["/lib", "/lib/sub"]);
+        let books: Vec<(&str, i64)> = result
+            .book_files
+            .iter()
+            .map(|b| (b.path.as_str(), b.size))
+            .collect();
+        assert_eq!(books, [("/lib/sub/a.pdf", 1), ("/lib/b.pdf", 2)]);
+    }
+
+    #[test]
+    fn padded_id_chunks_use_power_of_two_lengths() {
+        let ids: Vec<i64> = (1..=(SYNC_BATCH_SIZE as i64 + 3)).collect();
+        let chunks: Vec<Vec<i64>> = padded_id_chunks(&ids).collect();
+
+        assert_eq!(chunks.len(), 2);
+        assert_eq!(chunks[0].len(), SYNC_BATCH_SIZE);
+        let last = SYNC_BATCH_SIZE as i64 + 3;
+        assert_eq!(chunks[1], [last - 2, last - 1, last, last]);
+        assert_eq!(padded_id_chunks(&[]).count(), 0);
+    }
+
+    #[test]
+    fn build_category_tree_keeps_sibling_order() {
+        let category = |id: i64, parent_id: Option<i64>| categories::Model {
+            id,
+            library_id: 1,
+            parent_id,
+            name: format!("c{id}"),
+            path: format!("/lib/c{id}"),
+            mtime: 0,
+        };
+        let categories = vec![
+            category(3, Some(1)),
+            category(1, None),
+            category(2, Some(1)),
+            category(4, None),
+            category(5, Some(2)),
+        ];
+        let books_by_category = HashMap::from([(2, 7)]);
+
+        let tree = build_category_tree(&categories, &books_by_category);
+
+        let root_ids: Vec<i64> = tree.iter().map(|node| node.id).collect();
+        assert_eq!(root_ids, [1, 4]);
+        let child_ids: Vec<i64> = tree[0].sub_categories.iter().map(|node| node.id).collect();
+        assert_eq!(child_ids, [3, 2]);
+        assert_eq!(tree[0].sub_categories[1].book_count, 7);
+        assert_eq!(tree[0].total_book_count, 7);
+        assert_eq!(tree[0].sub_categories[1].sub_categories[0].id, 5);
+    }
+
+    #[test]
+    fn owned_batches_split_without_losing_items() {
+        let items: Vec<usize> = (0..SYNC_BATCH_SIZE * 2 + 1).collect();
+        let sizes: Vec<usize> = owned_batches(items).map(|batch| batch.len()).collect();
+        assert_eq!(sizes, [SYNC_BATCH_SIZE, SYNC_BATCH_SIZE, 1]);
+        assert_eq!(owned_batches(Vec::<usize>::new()).count(), 0);
+    }
 }
@@ -27,6 +27,8 @@ fn restart_current_process() -> std::io::Result<()> {
     {
         use std::os::unix::process::CommandExt;
 
+        // exec 会直接替换进程映像，先把排队中的日志写完
+        crate::logging::flush();
         let err = std::process::Command::new(&current_exe).args(&args).exec();
         Err(err)
     }
@@ -36,6 +38,7 @@ fn restart_current_process() -> std::io::Result<()> {
         std::process::Command::new(&current_exe)
             .args(&args)
             .spawn()?;
+        crate::logging::flush();
         std::process::exit(0);
     }
 }